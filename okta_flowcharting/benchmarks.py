@@ -0,0 +1,133 @@
+"""Phase-by-phase timings of a full run, against a live org or a synthetic one."""
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import io
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+from .authentication_policy import get_apps_by_auth_policy
+from .cli import ACCESS_POLICY, SIGNON_POLICY, fetch, get_policies, okta_session, translate_policies
+from .fake_okta import FakeOktaClient
+from .flowchart_emit import EMITTERS, emit
+from .flowchart_graph import DirectoryNames, access_rule_labels, build_access_graph, build_signon_graph, signon_rule_labels, signon_tail
+from .okta_data import OktaCache
+from .simulation import simulate_org
+from .synthetic_org import SCALES, generate_org
+
+
+@dataclass
+class BenchReport:
+    """Seconds spent in each phase, plus the size of what was processed."""
+
+    timings: Dict[str, float] = field(default_factory=dict)
+    counts: Dict[str, int] = field(default_factory=dict)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - started
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"timings": self.timings, "counts": self.counts}
+
+
+async def _load_everything(cache: OktaCache) -> int:
+    await asyncio.gather(cache.prefetch(), cache.get_apps(), cache.get_group_members())
+    # Views are lazy, so read every record back to time a real load.
+    return sum(
+        sum(1 for _ in collection.values())
+        for collection in (cache.groups, cache.networks, cache.users, cache.user_types, cache.apps, cache.group_members)
+    )
+
+
+async def run_benchmarks(cache: OktaCache, svg: bool = True, processes: Optional[int] = None) -> BenchReport:
+    """Time every phase of fetching, charting and simulating ``cache``'s org.
+
+    ``fetch`` fills ``cache`` (a no-op for collections it already holds);
+    ``cache_load`` then reads everything back through a second cache on the
+    same directory. ``render_svg`` is skipped when ``svg`` is false or
+    schemdraw isn't installed.
+    """
+    report = BenchReport()
+    with report.phase("fetch"):
+        counts = await fetch(cache)
+        await cache.get_group_members()
+    report.counts.update(counts)
+
+    reloaded = OktaCache(cache.client, cache_dir=cache.cache_dir, ttl=None)
+    try:
+        with report.phase("cache_load"):
+            report.counts["records"] = await _load_everything(reloaded)
+    finally:
+        reloaded.store.close()
+
+    access, signon = await asyncio.gather(get_policies(cache, ACCESS_POLICY), get_policies(cache, SIGNON_POLICY))
+    report.counts["rules"] = sum(len(bundle.rules) for bundles in (access, signon) for bundle in bundles.values())
+    with report.phase("extract"):
+        names = await DirectoryNames.from_cache(cache)
+        for bundle in access.values():
+            for rule in bundle.rules:
+                access_rule_labels(rule, names, skip_defaults=True)
+        for bundle in signon.values():
+            for rule in bundle.rules:
+                signon_rule_labels(rule, names, skip_defaults=True)
+
+    apps = await cache.get_apps()
+    with report.phase("layout"):
+        graphs = [
+            build_access_graph(access, get_apps_by_auth_policy(apps), apps, names),
+            build_signon_graph(signon, names),
+        ]
+
+    for fmt in EMITTERS:
+        with report.phase(f"render_{fmt}"):
+            for graph in graphs:
+                tail = signon_tail if graph.kind == "signon" else None
+                emit(fmt, io.StringIO(), graph.kind, graph.sections, tail=tail)
+
+    if svg and importlib.util.find_spec("schemdraw") is not None:
+        import schemdraw
+        from schemdraw import flow
+
+        from .flowchart_render import render_graph
+
+        with report.phase("render_svg"):
+            for graph in graphs:
+                d = schemdraw.Drawing(unit=graph.unit)
+                d.add(flow.Start().label('Start Login'))
+                render_graph(d, graph)
+                d.get_imagedata("svg")
+
+    with report.phase("translate"):
+        policies = await translate_policies(cache)
+    with report.phase("evaluate"):
+        journeys = await simulate_org(cache, policies, processes)
+    report.counts["journeys"] = len(journeys.counts)
+    return report
+
+
+async def bench_synthetic(
+    scale: str = "small",
+    seed: int = 0,
+    latency: float = 0.0,
+    svg: bool = True,
+    processes: Optional[int] = None,
+) -> BenchReport:
+    """Benchmark a generated org served by :class:`FakeOktaClient` into a fresh cache.
+
+    ``latency`` is added to every fake request, to model the API round trip.
+    """
+    client = FakeOktaClient(generate_org(SCALES[scale], seed), latency=latency)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        async with okta_session(cache_dir, client=client) as cache:
+            report = await run_benchmarks(cache, svg, processes)
+    report.counts["requests"] = sum(client.requests.values())
+    return report
@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import glob
+import os
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from functools import partial
+from types import SimpleNamespace
+from typing import Callable, List, Optional, Sequence, Set, Tuple
+
+import schemdraw
+from schemdraw import flow
+from schemdraw.backends.svg import PT_PER_IN
+from schemdraw.util import Point
+
+from .content_hash import content_hash
+from .flowchart_graph import FlowGraph
+from .flowchart_render import draw_edges
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+DEFAULT_FRAGMENT_DIR = ".chart_fragments"
+START_LABEL = "Start Login"
+
+
+@dataclass
+class Fragment:
+    """A rendered piece of a chart, drawn with its origin at (0, 0).
+
+    ``advance`` is where the next fragment's origin goes, in SVG points
+    relative to this one's, so fragments stack without re-rendering.
+    """
+
+    svg: ET.Element
+    advance: Tuple[float, float]
+
+    @property
+    def viewbox(self) -> Tuple[float, ...]:
+        return tuple(float(value) for value in self.svg.get("viewBox").split())
+
+    def to_bytes(self) -> bytes:
+        self.svg.set("data-advance", f"{self.advance[0]} {self.advance[1]}")
+        return ET.tostring(self.svg)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Fragment":
+        svg = ET.fromstring(data)
+        x, y = (float(value) for value in svg.get("data-advance").split())
+        return cls(svg, (x, y))
+
+
+@dataclass
+class ChartStats:
+    rendered: int = 0
+    reused: int = 0
+
+
+class FragmentCache:
+    """Directory of rendered fragments, one SVG file per content hash."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.svg")
+
+    def get(self, digest: str) -> Optional[Fragment]:
+        try:
+            with open(self.path(digest), "rb") as fh:
+                return Fragment.from_bytes(fh.read())
+        except FileNotFoundError:
+            return None
+
+    def put(self, digest: str, fragment: Fragment) -> None:
+        _write_atomic(self.path(digest), fragment.to_bytes())
+
+    def prune(self, keep: Set[str]) -> None:
+        """Delete fragments whose hash is not in ``keep``."""
+        for path in glob.glob(os.path.join(self.directory, "*.svg")):
+            if os.path.basename(path)[:-4] not in keep:
+                os.remove(path)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _fragment(d: schemdraw.Drawing, advance: Point) -> Fragment:
+    scale = PT_PER_IN * d.dwgparams.get("inches_per_unit", 0.5)
+    svg = ET.fromstring(d.get_imagedata("svg"))
+    return Fragment(svg, (advance.x * scale, -advance.y * scale))
+
+
+def render_start(label: str = START_LABEL) -> Fragment:
+    d = schemdraw.Drawing()
+    d.add(flow.Start().label(label))
+    return _fragment(d, d.here)
+
+
+def render_section(graph: FlowGraph, index: int) -> Fragment:
+    """Render one policy section, from its entry arrow down to its last row.
+
+    Wires that fall through to the next policy end where that policy's
+    decision will sit once the fragments are stacked. The last section also
+    draws the graph's tail.
+    """
+    section = graph.sections[index]
+    d = schemdraw.Drawing(unit=graph.unit)
+    nodes = {node.id: node for node in section.nodes}
+    placed = {}
+    edges = section.edges
+    draw_edges(d, edges[:1], nodes, placed)
+    advance = placed[section.node.id].S
+    if index + 1 < len(graph.sections):
+        following = graph.sections[index + 1]
+        placed[following.node.id] = SimpleNamespace(N=Point((advance.x, advance.y - following.offset)))
+    else:
+        nodes.update((node.id, node) for node in graph.tail_nodes)
+        edges = edges + graph.tail
+    draw_edges(d, edges[1:], nodes, placed)
+    return _fragment(d, advance)
+
+
+def section_digest(graph: FlowGraph, index: int) -> str:
+    """Content hash of everything that decides how section ``index`` is drawn.
+
+    The section's labels already carry the policy, its rules and the
+    directory names they reference.
+    """
+    following = graph.sections[index + 1].offset if index + 1 < len(graph.sections) else None
+    tail = (graph.tail, graph.tail_nodes) if following is None else None
+    return content_hash("section", graph.kind, graph.unit, graph.sections[index], following, tail)
+
+
+def compose(fragments: Sequence[Fragment]) -> ET.Element:
+    """Stack fragments vertically into one SVG document."""
+    root = ET.Element(f"{{{SVG_NS}}}svg", {"xml:lang": "en"})
+    x = y = 0.0
+    xmin = ymin = float("inf")
+    xmax = ymax = float("-inf")
+    for fragment in fragments:
+        vx, vy, width, height = fragment.viewbox
+        xmin, ymin = min(xmin, vx + x), min(ymin, vy + y)
+        xmax, ymax = max(xmax, vx + width + x), max(ymax, vy + height + y)
+        group = ET.SubElement(root, f"{{{SVG_NS}}}g", {"transform": f"translate({x},{y})"})
+        group.extend(list(fragment.svg))
+        x, y = x + fragment.advance[0], y + fragment.advance[1]
+    if fragments:
+        root.set("width", f"{xmax - xmin}pt")
+        root.set("height", f"{ymax - ymin}pt")
+        root.set("viewBox", f"{xmin} {ymin} {xmax - xmin} {ymax - ymin}")
+    return root
+
+
+def save_incremental(
+    graph: FlowGraph,
+    path: str,
+    cache_dir: str = DEFAULT_FRAGMENT_DIR,
+    start_label: str = START_LABEL,
+) -> ChartStats:
+    """Write ``graph`` to ``path``, re-rendering only sections whose content changed.
+
+    Each section is rendered on its own and cached under its content hash
+    in ``cache_dir``. Unchanged sections are read back from the cache and
+    the chart is spliced together from the fragments; fragments no longer
+    used by this chart are deleted.
+    """
+    cache = FragmentCache(os.path.join(cache_dir, graph.kind))
+    jobs: List[Tuple[str, Callable[[], Fragment]]] = [(content_hash("start", start_label), partial(render_start, start_label))]
+    jobs += [(section_digest(graph, index), partial(render_section, graph, index)) for index in range(len(graph.sections))]
+
+    stats = ChartStats()
+    fragments = []
+    for digest, render in jobs:
+        fragment = cache.get(digest)
+        if fragment is None:
+            fragment = render()
+            cache.put(digest, fragment)
+            stats.rendered += 1
+        else:
+            stats.reused += 1
+        fragments.append(fragment)
+    cache.prune({digest for digest, _ in jobs})
+    _write_atomic(path, ET.tostring(compose(fragments)))
+    return stats
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import html
+import os
+import re
+from typing import List, Optional
+
+from .flowchart_graph import FlowGraph, page_graph
+from .parallel import process_pool
+
+START_LABEL = "Start Login"
+INDEX_FILE = "index.html"
+
+# The laid-out chart, set once per worker.
+_graph: Optional[FlowGraph] = None
+
+
+def _init_worker(graph: FlowGraph) -> None:
+    global _graph
+    _graph = graph
+
+
+def page_filename(graph: FlowGraph, index: int) -> str:
+    """File name of section ``index``'s page: its position, then its policy name."""
+    slug = re.sub(r"[^a-z0-9]+", "-", graph.sections[index].name.lower()).strip("-")
+    return f"{index + 1:03d}-{slug or graph.sections[index].policy_id}.svg"
+
+
+def render_page(graph: FlowGraph, index: int, path: str) -> str:
+    """Draw section ``index`` of ``graph`` on its own and save it to ``path``."""
+    import schemdraw
+    from schemdraw import flow
+
+    from .flowchart_render import render_graph
+
+    d = schemdraw.Drawing(unit=graph.unit)
+    d.add(flow.Start().label(START_LABEL))
+    render_graph(d, page_graph(graph, index))
+    d.save(path)
+    return path
+
+
+def _render_page(index: int, path: str) -> str:
+    return render_page(_graph, index, path)
+
+
+def write_index(graph: FlowGraph, directory: str, filenames: List[str]) -> str:
+    """Write an HTML page linking every policy's chart, in policy order."""
+    title = "Access policies" if graph.kind == "access" else "Global session policies"
+    items = "\n".join(
+        f'  <li><a href="{html.escape(filename)}">{html.escape(section.name)}</a></li>'
+        for section, filename in zip(graph.sections, filenames)
+    )
+    path = os.path.join(directory, INDEX_FILE)
+    with open(path, "w") as fh:
+        fh.write(f"<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\"><title>{title}</title></head>\n<body>\n")
+        fh.write(f"<h1>{title}</h1>\n<ol>\n{items}\n</ol>\n</body>\n</html>\n")
+    return path
+
+
+def render_pages(graph: FlowGraph, directory: str, processes: Optional[int] = None) -> str:
+    """Render every policy of ``graph`` into its own SVG in ``directory``, in parallel.
+
+    The graph is laid out up front from the resolved policies and directory
+    names, so workers need nothing from Okta: each one receives the graph
+    once when it starts and is then handed section indexes to draw. Returns
+    the path of the index page linking the charts.
+    """
+    os.makedirs(directory, exist_ok=True)
+    processes = max(1, min(processes or os.cpu_count() or 1, len(graph.sections)))
+    filenames = [page_filename(graph, index) for index in range(len(graph.sections))]
+    with process_pool(processes, _init_worker, (graph,)) as pool:
+        futures = [
+            pool.submit(_render_page, index, os.path.join(directory, filename))
+            for index, filename in enumerate(filenames)
+        ]
+        for future in futures:
+            future.result()
+    return write_index(graph, directory, filenames)
@@ -0,0 +1,292 @@
+"""Command line entry point: ``python -m okta_flowcharting <command>``.
+
+Every command runs on one event loop, with one Okta client session and one
+``OktaCache``, so collections fetched for one chart are reused by the next.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Collection, Dict, List, Optional, Sequence
+
+from . import authentication_policy, global_session_policy, metrics
+from .flowchart_emit import EMITTERS
+from .okta_data import DEFAULT_CACHE_TTL, OktaCache, PolicyBundle, get_okta_client, get_okta_policies, load_policy_snapshot
+from .policy_index import REFERENCE_KINDS, PolicyIndex
+from .synthetic_org import SCALES
+
+ACCESS_POLICY = "ACCESS_POLICY"
+SIGNON_POLICY = "OKTA_SIGN_ON"
+
+FORMATS = ("svg",) + tuple(EMITTERS)
+
+# Script module and default output path (without extension) for each chart.
+CHARTS = {
+    "access": (authentication_policy, ACCESS_POLICY, "auth-flowchart"),
+    "signon": (global_session_policy, SIGNON_POLICY, "out"),
+}
+
+
+@asynccontextmanager
+async def okta_session(cache_dir: str = ".", ttl: Optional[float] = DEFAULT_CACHE_TTL, client: Any = None) -> AsyncIterator[OktaCache]:
+    """Open one Okta client session and yield the cache every command shares."""
+    client = client if client is not None else get_okta_client()
+    metrics.instrument_client(client)
+    # Entering the client gives every request in the run one pooled HTTP session.
+    async with client:
+        cache = OktaCache(client, cache_dir=cache_dir, ttl=ttl)
+        try:
+            yield cache
+        finally:
+            if cache._store is not None:
+                cache._store.close()
+
+
+async def get_policies(cache: OktaCache, policy_type: str) -> Dict[str, PolicyBundle]:
+    return await get_okta_policies(cache.client, policy_type, ttl=cache.ttl, cache_dir=cache.cache_dir)
+
+
+async def fetch(cache: OktaCache) -> Dict[str, int]:
+    """Warm every collection and both policy snapshots concurrently."""
+    _, _, access, signon = await asyncio.gather(
+        cache.prefetch(),
+        cache.get_apps(),
+        get_policies(cache, ACCESS_POLICY),
+        get_policies(cache, SIGNON_POLICY),
+    )
+    return {
+        "groups": len(cache.groups),
+        "networks": len(cache.networks),
+        "users": len(cache.users),
+        "user_types": len(cache.user_types),
+        "apps": len(cache.apps),
+        "access_policies": len(access),
+        "signon_policies": len(signon),
+    }
+
+
+async def render_chart(
+    cache: OktaCache,
+    chart: str,
+    fmt: str = "svg",
+    output: Optional[str] = None,
+    fragment_dir: Optional[str] = None,
+    pages_dir: Optional[str] = None,
+    processes: Optional[int] = None,
+    policy_ids: Optional[Collection[str]] = None,
+) -> str:
+    """Draw ``chart`` (``access`` or ``signon``) from ``cache`` and return where it went.
+
+    ``policy_ids`` limits the chart to those policies.
+    """
+    module, policy_type, stem = CHARTS[chart]
+    with metrics.span(f"{chart}.policies"):
+        bundles = await get_policies(cache, policy_type)
+    if policy_ids is not None:
+        bundles = {policy_id: bundle for policy_id, bundle in bundles.items() if policy_id in policy_ids}
+    if fmt != "svg":
+        output = output or f"{stem}.{EMITTERS[fmt].extension}"
+        with metrics.span(f"{chart}.emit"), open(output, "w") as out:
+            await module.emit_policies(out, fmt, bundles, cache)
+        return output
+
+    graph = await module.layout_policies(bundles, cache)
+    if pages_dir is not None:
+        from .chart_pages import render_pages
+
+        with metrics.span(f"{chart}.pages"):
+            return render_pages(graph, pages_dir, processes)
+    output = output or f"{stem}.svg"
+    if fragment_dir is not None:
+        from .chart_cache import save_incremental
+
+        with metrics.span(f"{chart}.incremental"):
+            save_incremental(graph, output, fragment_dir)
+        return output
+
+    import schemdraw
+    from schemdraw import flow
+
+    from .flowchart_render import render_graph
+
+    d = schemdraw.Drawing(unit=graph.unit)
+    d.add(flow.Start().label('Start Login'))
+    with metrics.span(f"{chart}.render"):
+        render_graph(d, graph)
+    with metrics.span(f"{chart}.save"):
+        d.save(output)
+    return output
+
+
+async def translate_policies(cache: OktaCache) -> List[Any]:
+    """Model the global session policies followed by the access policies, in evaluation order.
+
+    Only a user's first assigned global session policy applies, so those
+    are grouped into one :class:`~okta_flowcharting.simulation.FirstAssigned`.
+    """
+    from .policy_translation import PolicyTranslator
+    from .simulation import FirstAssigned
+
+    signon, access = await asyncio.gather(get_policies(cache, SIGNON_POLICY), get_policies(cache, ACCESS_POLICY))
+    translator = PolicyTranslator()
+    signon_policies = FirstAssigned("Global session policies", list(translator.translate(signon).values()))
+    return [signon_policies] + list(translator.translate(access).values())
+
+
+async def build_index(cache: OktaCache) -> PolicyIndex:
+    """Index which access and global session policy rules reference each object."""
+    access, signon = await asyncio.gather(get_policies(cache, ACCESS_POLICY), get_policies(cache, SIGNON_POLICY))
+    return PolicyIndex.build({ACCESS_POLICY: access, SIGNON_POLICY: signon})
+
+
+async def find_references(cache: OktaCache, kind: str, object_ids: Sequence[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """The policies and rules that reference each of ``object_ids``, by id."""
+    index = await build_index(cache)
+    return {object_id: [asdict(reference) for reference in index.references(kind, object_id)] for object_id in object_ids}
+
+
+async def diff(
+    cache: OktaCache,
+    old_dir: str,
+    chart: Optional[str] = None,
+    fmt: str = "svg",
+    output: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Compare the policy snapshots cached in ``old_dir`` with the current ones.
+
+    With ``chart``, also draws that chart with only the added and changed
+    policies in it.
+    """
+    from .policy_diff import diff_snapshots, merge
+
+    change_sets = []
+    for policy_type in (SIGNON_POLICY, ACCESS_POLICY):
+        old = load_policy_snapshot(old_dir, policy_type)
+        if old is None:
+            raise FileNotFoundError(f"No {policy_type} snapshot cached in {old_dir}")
+        change_sets.append(diff_snapshots(old, await get_policies(cache, policy_type), policy_type))
+    changes = merge(*change_sets)
+    result = changes.to_dict()
+    if chart is not None:
+        affected = changes.affected(CHARTS[chart][1])
+        result["chart"] = await render_chart(cache, chart, fmt, output, policy_ids=affected)
+    return result
+
+
+async def simulate(cache: OktaCache, processes: Optional[int] = None, journeys: Optional[str] = None) -> Dict[str, Any]:
+    from .simulation import simulate_org
+
+    policies = await translate_policies(cache)
+    if journeys is None:
+        report = await simulate_org(cache, policies, processes)
+    else:
+        with open(journeys, "w") as out:
+            report = await simulate_org(cache, policies, processes, out=out)
+    return report.to_dict()
+
+
+async def run(args: argparse.Namespace, client: Any = None) -> Any:
+    """Run the parsed command (and any charts it implies) in one Okta session."""
+    if args.command == "bench" and args.synthetic:
+        from .benchmarks import bench_synthetic
+
+        report = await bench_synthetic(args.synthetic, args.seed, args.latency, args.svg, args.processes)
+        return report.to_dict()
+    async with okta_session(args.cache_dir, args.ttl, client) as cache:
+        if args.command == "fetch":
+            return await fetch(cache)
+        if args.command == "simulate":
+            return await simulate(cache, args.processes, args.journeys)
+        if args.command == "diff":
+            return await diff(cache, args.old_dir, args.chart, args.format, args.output)
+        if args.command == "references":
+            return await find_references(cache, args.kind, args.ids)
+        if args.command == "bench":
+            from .benchmarks import run_benchmarks
+
+            return (await run_benchmarks(cache, args.svg, args.processes)).to_dict()
+        charts = ["access", "signon"] if args.command == "render" else [args.command[len("render-"):]]
+        outputs = {}
+        for chart in charts:
+            outputs[chart] = await render_chart(
+                cache, chart, args.format, getattr(args, "output", None),
+                args.fragments, _pages_dir(args.pages, chart, len(charts)), args.processes,
+            )
+        return outputs
+
+
+def _pages_dir(pages: Optional[str], chart: str, charts: int) -> Optional[str]:
+    # Both charts at once get a subdirectory each.
+    if pages is None or charts == 1:
+        return pages
+    return f"{pages}/{chart}"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="okta_flowcharting", description=__doc__.splitlines()[0])
+    parser.add_argument("--cache-dir", default=".", help="directory holding okta_cache.sqlite3")
+    parser.add_argument("--metrics", metavar="FILE", help="collect request, cache and timing metrics and write them to FILE")
+    parser.add_argument("--metrics-format", choices=("json", "prometheus"), default="json")
+    parser.add_argument(
+        "--ttl", type=float, default=DEFAULT_CACHE_TTL,
+        help="refresh cached collections older than this many seconds (default: %(default)s)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("fetch", help="fetch and cache every collection and policy")
+    for name, help_text in (
+        ("render", "draw both charts from one fetch"),
+        ("render-access", "draw the access policy chart"),
+        ("render-signon", "draw the global session policy chart"),
+    ):
+        render = commands.add_parser(name, help=help_text)
+        render.add_argument("--format", choices=FORMATS, default="svg")
+        if name != "render":
+            render.add_argument("-o", "--output", help="output file (default: per chart)")
+        render.add_argument("--fragments", metavar="DIR", help="re-render only changed policies, caching fragments in DIR")
+        render.add_argument("--pages", metavar="DIR", help="write one SVG per policy and an index.html to DIR")
+        render.add_argument("--processes", type=int, help="worker processes for --pages")
+
+    simulate_parser = commands.add_parser("simulate", help="count the journeys every user gets")
+    simulate_parser.add_argument("--processes", type=int)
+    simulate_parser.add_argument("--journeys", metavar="FILE", help="also write each user's journey as JSON lines")
+
+    diff_parser = commands.add_parser("diff", help="list policy and rule changes since an older cache directory")
+    diff_parser.add_argument("old_dir", metavar="OLD_DIR", help="cache directory holding the older policy snapshots")
+    diff_parser.add_argument("--chart", choices=sorted(CHARTS), help="also draw this chart with only the changed policies")
+    diff_parser.add_argument("--format", choices=FORMATS, default="svg")
+    diff_parser.add_argument("-o", "--output", help="chart output file (default: per chart)")
+
+    references = commands.add_parser("references", help="list the policies and rules that reference objects")
+    references.add_argument("kind", choices=REFERENCE_KINDS)
+    references.add_argument("ids", nargs="+", metavar="ID", help="object id (or platform name, e.g. IOS)")
+
+    bench_parser = commands.add_parser("bench", help="time fetch, cache load, layout, rendering and evaluation")
+    bench_parser.add_argument("--processes", type=int)
+    bench_parser.add_argument("--no-svg", dest="svg", action="store_false", help="skip the schemdraw rendering phase")
+    bench_parser.add_argument(
+        "--synthetic", choices=sorted(SCALES), metavar="SCALE",
+        help="benchmark a generated org served offline instead of the live tenant (%(choices)s)",
+    )
+    bench_parser.add_argument("--seed", type=int, default=0, help="seed for --synthetic")
+    bench_parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each --synthetic request")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        if args.metrics:
+            metrics.write(args.metrics, args.metrics_format)
+            metrics.disable()
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 0
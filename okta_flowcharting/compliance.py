@@ -0,0 +1,288 @@
+"""Check every rule of every policy against every assurance level in one pass.
+
+:class:`ComplianceChecker` produces a :class:`ComplianceMatrix` of rules by
+:class:`~okta_flowcharting.policy_models.AssuranceLevel`. It runs each
+requirement's tests cheapest-and-most-often-failing first, so a failing
+rule is usually rejected by its first test, remembers results by rule
+content hash, so unchanged rules are never rechecked, and spreads new
+rules across a process pool.
+
+Tests must be pure functions of the rule: reordering them, and reusing a
+result for a rule with the same content, relies on it.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from types import CodeType
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .content_hash import canonical, content_hash
+from .parallel import process_pool
+from .policy_models import AssuranceLevel, AuthenticationPolicyModel, PolicyRuleModel
+
+DEFAULT_CHUNK_SIZE = 500
+# Rules checked between re-rankings of a level's tests.
+REORDER_EVERY = 64
+
+# (level key, test index within its requirement)
+CheckKey = Tuple[str, int]
+
+
+def rule_hash(rule: PolicyRuleModel) -> str:
+    """Content hash of a rule's conditions, action and steps (not its name)."""
+    return content_hash(rule.conditions, rule.action, rule.steps)
+
+
+def _code_identity(code: CodeType) -> List[Any]:
+    consts = [_code_identity(const) if isinstance(const, CodeType) else canonical(const) for const in code.co_consts]
+    return [code.co_code.hex(), list(code.co_names), consts]
+
+
+def _test_identity(test: Callable[[PolicyRuleModel], bool]) -> List[Any]:
+    """What a test does: its bytecode, constants and names, and the values it closes over."""
+    code = getattr(test, "__code__", None)
+    if code is None:  # a callable object; its state is what it checks
+        return [type(test).__qualname__, canonical(test)]
+    cells = []
+    for cell in test.__closure__ or ():
+        try:
+            cells.append(canonical(cell.cell_contents))
+        except ValueError:  # cell not filled yet
+            cells.append(None)
+    return [test.__qualname__, _code_identity(code), canonical(test.__defaults__), cells]
+
+
+def level_key(level: AssuranceLevel) -> str:
+    """Identify a level by its name and what its tests do, so editing a requirement invalidates old results.
+
+    Tests are told apart by their code, not their names: every lambda is
+    ``<lambda>``, and editing a test's body keeps its name.
+    """
+    tests = [_test_identity(test) for test in level.requirement.tests]
+    return content_hash(level.name, level.requirement.name, tests)
+
+
+@dataclass
+class CheckStats:
+    """Measured cost and failure rate of one requirement test."""
+
+    calls: int = 0
+    failures: int = 0
+    seconds: float = 0.0
+
+    def merge(self, other: "CheckStats") -> None:
+        self.calls += other.calls
+        self.failures += other.failures
+        self.seconds += other.seconds
+
+    def rank(self) -> float:
+        """Expected cost per rejection; lower runs first. Unmeasured tests rank first."""
+        if not self.calls:
+            return 0.0
+        # Smoothed, so a test that has never failed still ranks by its cost.
+        fail_rate = (self.failures + 1) / (self.calls + 2)
+        return (self.seconds / self.calls) / fail_rate
+
+
+@dataclass
+class ComplianceRow:
+    policy: str
+    rule_id: str
+    rule_name: str
+    rule_hash: str
+    results: Dict[str, bool] = field(default_factory=dict)
+
+
+@dataclass
+class ComplianceMatrix:
+    """Which rules meet which assurance levels.
+
+    ``levels`` maps each level's name to its :func:`level_key`; row
+    ``results`` are keyed by level name.
+    """
+
+    levels: Dict[str, str] = field(default_factory=dict)
+    rows: List[ComplianceRow] = field(default_factory=list)
+
+    def failing(self, level: str) -> List[ComplianceRow]:
+        return [row for row in self.rows if not row.results.get(level, False)]
+
+    def summary(self) -> Dict[str, int]:
+        """Number of compliant rules per level."""
+        return {level: sum(row.results.get(level, False) for row in self.rows) for level in self.levels}
+
+    def results_by_hash(self) -> Dict[Tuple[str, str], bool]:
+        """``(rule hash, level key) -> result`` for every cell, to seed a later run."""
+        return {
+            (row.rule_hash, self.levels[level]): result
+            for row in self.rows for level, result in row.results.items() if level in self.levels
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"levels": self.levels, "summary": self.summary(), "rows": [asdict(row) for row in self.rows]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ComplianceMatrix":
+        return cls(levels=dict(data["levels"]), rows=[ComplianceRow(**row) for row in data["rows"]])
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ComplianceMatrix"]:
+        """The matrix saved at ``path``, or None when there is none yet."""
+        if not os.path.exists(path):
+            return None
+        with open(path) as fh:
+            return cls.from_dict(json.load(fh))
+
+
+# Levels and the rules to check in each worker, set once per process by
+# _init_worker. Forked workers inherit them, so rules with lambda conditions
+# never need pickling; tasks only name a slice of ``_rules``.
+_levels: Dict[str, AssuranceLevel] = {}
+_rules: List[PolicyRuleModel] = []
+
+
+def _init_worker(levels: Dict[str, AssuranceLevel], rules: List[PolicyRuleModel]) -> None:
+    global _levels, _rules
+    _levels = levels
+    _rules = rules
+
+
+def _check_rule(
+    rule: PolicyRuleModel,
+    key: str,
+    tests: Sequence[Tuple[int, Callable[[PolicyRuleModel], bool]]],
+    stats: Dict[CheckKey, CheckStats],
+) -> bool:
+    """Run ``tests`` in order until one fails, timing each into ``stats``."""
+    for index, test in tests:
+        started = time.perf_counter()
+        passed = bool(test(rule))
+        measured = stats.setdefault((key, index), CheckStats())
+        measured.calls += 1
+        measured.seconds += time.perf_counter() - started
+        if not passed:
+            measured.failures += 1
+            return False
+    return True
+
+
+def _order(key: str, count: int, *sources: Dict[CheckKey, CheckStats]) -> List[int]:
+    """Indexes of a level's ``count`` tests, best first: cheap ones that often fail."""
+    def rank(index: int) -> Tuple[float, int]:
+        total = CheckStats()
+        for stats in sources:
+            if (key, index) in stats:
+                total.merge(stats[(key, index)])
+        return total.rank(), index
+
+    return sorted(range(count), key=rank)
+
+
+def _check_chunk(
+    start: int,
+    stop: int,
+    known: Dict[CheckKey, CheckStats],
+) -> Tuple[List[Dict[str, bool]], Dict[CheckKey, CheckStats]]:
+    """Check ``_rules[start:stop]`` against every level, returning results and what was measured.
+
+    Tests are ordered by ``known`` statistics plus those measured so far in
+    this chunk, re-ranked every ``REORDER_EVERY`` rules.
+    """
+    rules = _rules[start:stop]
+    measured: Dict[CheckKey, CheckStats] = {}
+    results: List[Dict[str, bool]] = [{} for _ in rules]
+    for key, level in _levels.items():
+        tests = level.requirement.tests
+        for block in range(0, len(rules), REORDER_EVERY):
+            ordered = [(index, tests[index]) for index in _order(key, len(tests), known, measured)]
+            for position in range(block, min(block + REORDER_EVERY, len(rules))):
+                results[position][key] = _check_rule(rules[position], key, ordered, measured)
+    return results, measured
+
+
+class ComplianceChecker:
+    """Build compliance matrices for a fixed set of assurance levels.
+
+    Results are memoised per ``(rule hash, level key)`` for the life of the
+    checker, and can be seeded from a previous run's matrix, so a refresh
+    only checks rules whose content changed. Test statistics also persist
+    across calls, so later runs order tests by what earlier runs measured.
+    """
+
+    def __init__(
+        self,
+        levels: Iterable[AssuranceLevel],
+        processes: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        self.levels = list(levels)
+        self.keys = {level.name: level_key(level) for level in self.levels}
+        self.processes = processes
+        self.chunk_size = max(1, chunk_size)
+        self.memo: Dict[Tuple[str, str], bool] = {}
+        self.stats: Dict[CheckKey, CheckStats] = {}
+        self.checked = 0
+
+    def seed(self, matrix: ComplianceMatrix) -> None:
+        """Reuse the results of a previous run for rules that haven't changed."""
+        self.memo.update(matrix.results_by_hash())
+
+    def order(self, level: AssuranceLevel) -> List[int]:
+        """Indexes of ``level``'s tests in the order the next check runs them."""
+        return _order(self.keys[level.name], len(level.requirement.tests), self.stats)
+
+    def check(self, policies: Sequence[AuthenticationPolicyModel]) -> ComplianceMatrix:
+        """Check every rule of ``policies`` against every level."""
+        matrix = ComplianceMatrix(levels=dict(self.keys))
+        pending: Dict[str, PolicyRuleModel] = {}
+        for policy in policies:
+            for rule in policy.rules:
+                digest = rule_hash(rule)
+                matrix.rows.append(ComplianceRow(policy.name, rule.id, rule.name, digest))
+                if any((digest, key) not in self.memo for key in self.keys.values()):
+                    pending.setdefault(digest, rule)
+        if pending:
+            self._check_pending(pending)
+        for row in matrix.rows:
+            row.results = {name: self.memo[(row.rule_hash, key)] for name, key in self.keys.items()}
+        return matrix
+
+    def _check_pending(self, pending: Dict[str, PolicyRuleModel]) -> None:
+        digests = list(pending)
+        rules = [pending[digest] for digest in digests]
+        bounds = [(start, min(start + self.chunk_size, len(digests))) for start in range(0, len(digests), self.chunk_size)]
+        by_key = {self.keys[level.name]: level for level in self.levels}
+        processes = min(self.processes or os.cpu_count() or 1, len(bounds))
+        with process_pool(processes, _init_worker, (by_key, rules)) as pool:
+            futures = [pool.submit(_check_chunk, start, stop, self.stats) for start, stop in bounds]
+            for (start, stop), future in zip(bounds, futures):
+                results, stats = future.result()
+                for digest, result in zip(digests[start:stop], results):
+                    for key, passed in result.items():
+                        self.memo[(digest, key)] = passed
+                for test_key, measured in stats.items():
+                    self.stats.setdefault(test_key, CheckStats()).merge(measured)
+        self.checked += len(digests)
+
+
+def refresh_matrix(
+    path: str,
+    policies: Sequence[AuthenticationPolicyModel],
+    levels: Iterable[AssuranceLevel],
+    processes: Optional[int] = None,
+) -> ComplianceMatrix:
+    """Update the matrix saved at ``path`` for ``policies``, rechecking only changed rules."""
+    checker = ComplianceChecker(levels, processes)
+    previous = ComplianceMatrix.load(path)
+    if previous is not None:
+        checker.seed(previous)
+    matrix = checker.check(policies)
+    matrix.save(path)
+    return matrix
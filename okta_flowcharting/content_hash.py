@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+from collections.abc import Mapping
+from typing import Any
+
+
+def canonical(obj: Any) -> Any:
+    """Reduce ``obj`` to JSON-compatible data that doesn't depend on dict order.
+
+    Dataclasses, Okta SDK models (via ``as_dict``) and plain objects are
+    reduced to their fields; mappings are sorted by key and sets by value.
+    """
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, Mapping):
+        return {str(key): canonical(value) for key, value in sorted(obj.items(), key=lambda item: str(item[0]))}
+    if isinstance(obj, (list, tuple)):
+        return [canonical(item) for item in obj]
+    if isinstance(obj, (set, frozenset)):
+        return sorted((canonical(item) for item in obj), key=json.dumps)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        fields = {f.name: getattr(obj, f.name) for f in dataclasses.fields(obj) if f.compare}
+        return {"__type__": type(obj).__name__, **canonical(fields)}
+    as_dict = getattr(obj, "as_dict", None)
+    if callable(as_dict):
+        return canonical(as_dict())
+    if hasattr(obj, "__dict__"):
+        return canonical(vars(obj))
+    return str(obj)
+
+
+def content_hash(*parts: Any) -> str:
+    """Hex SHA-256 of the canonical form of ``parts``."""
+    data = json.dumps(canonical(parts), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
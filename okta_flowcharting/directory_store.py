@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import os
+import pickle
+import sqlite3
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+DEFAULT_FILENAME = "okta_cache.sqlite3"
+
+# SQLite caps the number of bound parameters per statement; stay well below it.
+_BATCH_SIZE = 500
+_PENDING = "\0pending"
+# Marks when a collection was last replaced in full, rather than patched by upserts.
+_REPLACED = "\0replaced"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data BLOB NOT NULL,
+    UNIQUE (collection, id)
+);
+CREATE TABLE IF NOT EXISTS collections (
+    collection TEXT PRIMARY KEY,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+def object_id(item: Any) -> str:
+    """Return the Okta id of an SDK model or a raw JSON dict."""
+    return item["id"] if isinstance(item, dict) else item.id
+
+
+class DirectoryStore:
+    """On-disk store of Okta objects keyed by collection and object id.
+
+    Each object is pickled individually, so point lookups and ``get_many``
+    only unpickle the records asked for. Collections keep their insertion
+    order, and every write happens inside a transaction so a crash can never
+    leave a half-written collection behind.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def in_dir(cls, cache_dir: str) -> "DirectoryStore":
+        return cls(os.path.join(cache_dir, DEFAULT_FILENAME))
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "DirectoryStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def fetched_at(self, collection: str) -> Optional[float]:
+        row = self._conn.execute("SELECT fetched_at FROM collections WHERE collection = ?", (collection,)).fetchone()
+        return row[0] if row else None
+
+    def mark_fetched(self, collection: str, fetched_at: Optional[float] = None) -> None:
+        with self._conn:
+            self._mark_fetched(collection, time.time() if fetched_at is None else fetched_at)
+
+    def _mark_fetched(self, collection: str, fetched_at: float) -> None:
+        self._conn.execute(
+            "INSERT INTO collections (collection, fetched_at) VALUES (?, ?) "
+            "ON CONFLICT (collection) DO UPDATE SET fetched_at = excluded.fetched_at",
+            (collection, fetched_at),
+        )
+
+    def replaced_at(self, collection: str) -> Optional[float]:
+        """When ``collection`` was last swapped in by ``replace``; upserts don't move it."""
+        return self.fetched_at(collection + _REPLACED)
+
+    def get(self, collection: str, oid: str) -> Any:
+        row = self._conn.execute(
+            "SELECT data FROM objects WHERE collection = ? AND id = ?", (collection, oid)
+        ).fetchone()
+        if row is None:
+            raise KeyError(oid)
+        return pickle.loads(row[0])
+
+    def get_many(self, collection: str, ids: Iterable[str]) -> Dict[str, Any]:
+        """Look up several ids at once; ids that aren't stored are left out."""
+        wanted = list(dict.fromkeys(ids))
+        found: Dict[str, Any] = {}
+        for start in range(0, len(wanted), _BATCH_SIZE):
+            batch = wanted[start:start + _BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT id, data FROM objects WHERE collection = ? AND id IN ({placeholders})", (collection, *batch)
+            )
+            found.update((oid, pickle.loads(data)) for oid, data in rows)
+        return {oid: found[oid] for oid in wanted if oid in found}
+
+    def contains(self, collection: str, oid: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM objects WHERE collection = ? AND id = ?", (collection, oid)
+        ).fetchone()
+        return row is not None
+
+    def count(self, collection: str) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM objects WHERE collection = ?", (collection,)).fetchone()[0]
+
+    def ids(self, collection: str) -> List[str]:
+        rows = self._conn.execute("SELECT id FROM objects WHERE collection = ? ORDER BY rowid", (collection,))
+        return [oid for (oid,) in rows]
+
+    def iter_pages(self, collection: str, page_size: int = _BATCH_SIZE) -> Iterator[List[Any]]:
+        """Yield a collection in insertion order, one page of objects at a time.
+
+        Each page is read with its own query, so no cursor stays open while
+        the caller works on (or awaits between) pages.
+        """
+        last_rowid = 0
+        while True:
+            rows = self._conn.execute(
+                "SELECT rowid, data FROM objects WHERE collection = ? AND rowid > ? ORDER BY rowid LIMIT ?",
+                (collection, last_rowid, page_size),
+            ).fetchall()
+            if not rows:
+                return
+            last_rowid = rows[-1][0]
+            yield [pickle.loads(data) for _, data in rows]
+
+    def upsert(
+        self,
+        collection: str,
+        items: Iterable[Any],
+        deleted: Iterable[str] = (),
+        key: Callable[[Any], str] = object_id,
+    ) -> None:
+        """Insert or update ``items`` and remove ``deleted`` ids in one transaction."""
+        with self._conn:
+            self._insert(collection, items, key)
+            self._conn.executemany(
+                "DELETE FROM objects WHERE collection = ? AND id = ?", ((collection, oid) for oid in deleted)
+            )
+
+    def _insert(self, collection: str, items: Iterable[Any], key: Callable[[Any], str]) -> None:
+        self._conn.executemany(
+            "INSERT INTO objects (collection, id, data) VALUES (?, ?, ?) "
+            "ON CONFLICT (collection, id) DO UPDATE SET data = excluded.data",
+            ((collection, key(item), pickle.dumps(item)) for item in items),
+        )
+
+    def replace(self, collection: str, fetched_at: Optional[float] = None, key: Callable[[Any], str] = object_id) -> "CollectionWriter":
+        return CollectionWriter(self, collection, time.time() if fetched_at is None else fetched_at, key)
+
+    def view(self, collection: str) -> "StoreView":
+        return StoreView(self, collection)
+
+
+class CollectionWriter:
+    """Stage a full replacement of a collection and swap it in atomically.
+
+    Pages are written to a pending copy, private to this writer, as they
+    arrive. Leaving the ``with`` block normally swaps the copy in and records
+    ``fetched_at``; leaving it with an exception (including an abandoned async
+    generator) discards it. Of overlapping replaces, the last to finish wins.
+    """
+
+    def __init__(self, store: DirectoryStore, collection: str, fetched_at: float, key: Callable[[Any], str]):
+        self.store = store
+        self.collection = collection
+        self.fetched_at = fetched_at
+        self.key = key
+        # Each writer stages under its own name, so overlapping replaces never mix pages.
+        self._pending = f"{collection}{_PENDING}-{uuid.uuid4().hex}"
+
+    def __enter__(self) -> "CollectionWriter":
+        self._discard()
+        return self
+
+    def write(self, items: Iterable[Any]) -> None:
+        with self.store._conn:
+            self.store._insert(self._pending, items, self.key)
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        if exc_type is not None:
+            self._discard()
+            return
+        conn = self.store._conn
+        with conn:
+            conn.execute("DELETE FROM objects WHERE collection = ?", (self.collection,))
+            conn.execute("UPDATE objects SET collection = ? WHERE collection = ?", (self.collection, self._pending))
+            self.store._mark_fetched(self.collection, self.fetched_at)
+            self.store._mark_fetched(self.collection + _REPLACED, self.fetched_at)
+
+    def _discard(self) -> None:
+        with self.store._conn:
+            self.store._conn.execute("DELETE FROM objects WHERE collection = ?", (self._pending,))
+
+
+class StoreView(Mapping[str, Any]):
+    """Read-only mapping over one stored collection, loaded lazily per id."""
+
+    def __init__(self, store: DirectoryStore, collection: str):
+        self.store = store
+        self.collection = collection
+
+    def __getitem__(self, oid: str) -> Any:
+        return self.store.get(self.collection, oid)
+
+    def __contains__(self, oid: object) -> bool:
+        return isinstance(oid, str) and self.store.contains(self.collection, oid)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.store.ids(self.collection))
+
+    def __len__(self) -> int:
+        return self.store.count(self.collection)
+
+    def get_many(self, ids: Iterable[str]) -> Dict[str, Any]:
+        return self.store.get_many(self.collection, ids)
+
+    def iter_pages(self, page_size: int = _BATCH_SIZE) -> Iterator[List[Any]]:
+        return self.store.iter_pages(self.collection, page_size)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:  # type: ignore[override]
+        """Stream ``(id, object)`` pairs page by page instead of one query per id."""
+        for page in self.iter_pages():
+            for item in page:
+                yield object_id(item), item
+
+    def values(self) -> Iterator[Any]:  # type: ignore[override]
+        for page in self.iter_pages():
+            yield from page
+
+    def __repr__(self) -> str:
+        return f"StoreView({self.collection!r}, {len(self)} objects)"
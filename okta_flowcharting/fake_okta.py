@@ -0,0 +1,183 @@
+"""In-process stand-in for the parts of the Okta API this package calls.
+
+:class:`FakeOktaClient` serves a :class:`FakeOrg` through the same methods
+and ``(items, resp, err)`` pagination as the Okta SDK client, so
+:class:`~okta_flowcharting.okta_data.OktaCache`, ``get_okta_policies`` and
+the CLI run against it unchanged, without network access or a live tenant.
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from . import metrics
+
+# Largest ``limit`` each endpoint family honours; bigger requests are capped like Okta does.
+MAX_PAGE_SIZE = {
+    "users": 200,
+    "groups": 10000,
+    "groups/users": 1000,
+    "apps": 200,
+    "zones": 100,
+    "meta/types/user": 100,
+}
+
+_LAST_UPDATED = re.compile(r'lastUpdated gt "([^"]+)"')
+_STATUS = re.compile(r'status eq "([^"]+)"')
+
+
+@dataclass
+class FakeOrg:
+    """Everything a :class:`FakeOktaClient` serves.
+
+    Users, groups, zones, user types, policies and rules are SDK-like
+    objects; apps are raw JSON dicts, as the apps endpoint is read raw.
+    ``policies`` maps a policy type to its policies, ``rules`` a policy id to
+    its rules and ``memberships`` a group id to its member user ids.
+    """
+
+    users: List[Any] = field(default_factory=list)
+    groups: List[Any] = field(default_factory=list)
+    memberships: Dict[str, List[str]] = field(default_factory=dict)
+    zones: List[Any] = field(default_factory=list)
+    user_types: List[Any] = field(default_factory=list)
+    apps: List[Dict[str, Any]] = field(default_factory=list)
+    policies: Dict[str, List[Any]] = field(default_factory=dict)
+    rules: Dict[str, List[Any]] = field(default_factory=dict)
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            "users": len(self.users),
+            "groups": len(self.groups),
+            "zones": len(self.zones),
+            "user_types": len(self.user_types),
+            "apps": len(self.apps),
+            "policies": sum(len(policies) for policies in self.policies.values()),
+            "rules": sum(len(rules) for rules in self.rules.values()),
+        }
+
+
+class FakeResponse:
+    """The remaining pages of one list call, like ``OktaAPIResponse``."""
+
+    def __init__(self, client: "FakeOktaClient", endpoint: str, pages: List[List[Any]]):
+        self._client = client
+        self._endpoint = endpoint
+        self._pages = pages
+        self._body: List[Any] = []
+
+    def has_next(self) -> bool:
+        return bool(self._pages)
+
+    async def next(self) -> Tuple[List[Any], None]:
+        await self._client._request(self._endpoint)
+        self._body = self._pages.pop(0)
+        return self._body, None
+
+    def get_body(self) -> List[Any]:
+        return self._body
+
+
+class FakeRequestExecutor:
+    """Serves raw GETs of ``/api/v1/apps`` for :func:`~okta_flowcharting.okta_data.list_raw`."""
+
+    def __init__(self, client: "FakeOktaClient"):
+        self._client = client
+
+    async def create_request(self, method: str, url: str, body: Any, headers: Any, oauth: bool) -> Tuple[Dict[str, str], None]:
+        return {"method": method, "url": url}, None
+
+    async def execute(self, request: Dict[str, str]) -> Tuple[FakeResponse, Optional[str]]:
+        url = urlparse(request["url"])
+        if url.path != "/api/v1/apps":
+            return None, f"not found: {url.path}"
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        status = _STATUS.search(query.get("filter", ""))
+        apps = [app for app in self._client.org.apps if status is None or app.get("status") == status.group(1)]
+        items, response, _ = await self._client._paged("apps", apps, query)
+        response._body = items
+        return response, None
+
+
+class FakeOktaClient:
+    """Okta client serving a :class:`FakeOrg` from memory.
+
+    Each call, and each further page, counts one request against
+    ``requests`` (keyed by endpoint family, as in :mod:`~okta_flowcharting.metrics`)
+    and sleeps ``latency`` seconds first, so fetch timings scale with page
+    counts the way they do against the real API. Users and groups honour
+    ``lastUpdated gt`` filters for delta refreshes.
+    """
+
+    def __init__(self, org: FakeOrg, latency: float = 0.0, page_sizes: Optional[Dict[str, int]] = None):
+        self.org = org
+        self.latency = latency
+        self.page_sizes = {**MAX_PAGE_SIZE, **(page_sizes or {})}
+        self.requests: Counter = Counter()
+        self._executor = FakeRequestExecutor(self)
+
+    async def __aenter__(self) -> "FakeOktaClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        return None
+
+    async def _request(self, endpoint: str) -> None:
+        self.requests[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        metrics.record_request(endpoint, self.latency)
+
+    async def _paged(self, endpoint: str, items: Sequence[Any], query: Dict[str, Any]) -> Tuple[List[Any], FakeResponse, None]:
+        await self._request(endpoint)
+        size = min(int(query.get("limit", self.page_sizes[endpoint])), self.page_sizes[endpoint])
+        pages = [list(items[i:i + size]) for i in range(0, len(items), size)] or [[]]
+        return pages[0], FakeResponse(self, endpoint, pages[1:]), None
+
+    @staticmethod
+    def _updated_since(items: Sequence[Any], query: Dict[str, Any]) -> Sequence[Any]:
+        since = _LAST_UPDATED.search(query.get("filter", ""))
+        if since is None:
+            return items
+        # Okta timestamps are fixed-width ISO 8601, so they compare as strings.
+        return [item for item in items if (getattr(item, "last_updated", None) or "") > since.group(1)]
+
+    async def list_users(self, query: Dict[str, Any]):
+        return await self._paged("users", self._updated_since(self.org.users, query), query)
+
+    async def list_groups(self, query: Dict[str, Any]):
+        return await self._paged("groups", self._updated_since(self.org.groups, query), query)
+
+    async def list_group_users(self, group_id: str, query: Dict[str, Any]):
+        members = self.org.memberships.get(group_id, [])
+        return await self._paged("groups/users", [_Member(user_id) for user_id in members], query)
+
+    async def list_network_zones(self):
+        return await self._paged("zones", self.org.zones, {})
+
+    async def list_user_types(self):
+        return await self._paged("meta/types/user", self.org.user_types, {})
+
+    async def list_policies(self, query: Dict[str, Any]):
+        await self._request("policies")
+        return list(self.org.policies.get(query.get("type"), [])), FakeResponse(self, "policies", []), None
+
+    async def list_policy_rules(self, policy_id: str):
+        await self._request("policies/rules")
+        return list(self.org.rules.get(policy_id, [])), FakeResponse(self, "policies/rules", []), None
+
+    def get_request_executor(self) -> FakeRequestExecutor:
+        return self._executor
+
+
+class _Member:
+    """Group member as listed by ``list_group_users``; only the id is read."""
+
+    __slots__ = ("id",)
+
+    def __init__(self, user_id: str):
+        self.id = user_id
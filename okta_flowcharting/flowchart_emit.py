@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import IO, Callable, Dict, Iterable, List, Optional, Tuple, Type
+
+from .flowchart_graph import FlowEdge, FlowNode, PolicySection, unwrap_label
+
+START_ID = "start"
+START_LABEL = "Start Login"
+
+# Leaving a decision to the east means its condition held, to the south that it didn't.
+ANCHOR_LABELS = {"E": "YES", "S": "NO"}
+
+
+class GraphEmitter:
+    """Write a flowchart to ``out`` section by section, as it is laid out.
+
+    Nothing is buffered beyond the section being written, and no drawing
+    library is imported. Subclasses format nodes and edges; edges into a
+    policy section from above start at the previous policy's decision, or
+    at the start node for the first one.
+    """
+
+    extension = ""
+
+    def __init__(self, out: IO[str], kind: str):
+        self.out = out
+        self.kind = kind
+        self._previous: Optional[str] = None
+        self._decisions: Dict[str, bool] = {}
+
+    def begin(self) -> None:
+        pass
+
+    def section(self, section: PolicySection) -> None:
+        src = (self._previous, "S") if self._previous else None
+        self._write(section.nodes, [self._resolve(edge, src) for edge in section.edges])
+        self._previous = section.node.id
+
+    def tail(self, nodes: List[FlowNode], edges: List[FlowEdge]) -> None:
+        self._write(nodes, edges)
+
+    def end(self) -> None:
+        pass
+
+    def _resolve(self, edge: FlowEdge, src: Optional[Tuple[str, str]]) -> FlowEdge:
+        if edge.src is not None or edge.kind != "arrow":
+            return edge
+        return FlowEdge(edge.kind, src or (START_ID, ""), edge.dst, edge.direction, edge.length, edge.dst_anchor)
+
+    def _write(self, nodes: List[FlowNode], edges: List[FlowEdge]) -> None:
+        for node in nodes:
+            self._decisions[node.id] = node.kind == "decision"
+            self.node(node)
+        for edge in edges:
+            if edge.dst is not None:
+                label = ANCHOR_LABELS.get(edge.src[1]) if self._decisions.get(edge.src[0]) else None
+                self.edge(edge.src[0], edge.dst, label)
+
+    def node(self, node: FlowNode) -> None:
+        raise NotImplementedError
+
+    def edge(self, src: str, dst: str, label: Optional[str]) -> None:
+        raise NotImplementedError
+
+
+def _quote_dot(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class DotEmitter(GraphEmitter):
+    """Graphviz DOT."""
+
+    extension = "dot"
+
+    def begin(self) -> None:
+        self.out.write(f"digraph {self.kind} {{\n")
+        self.out.write(f"  {_quote_dot(START_ID)} [shape=oval, label={_quote_dot(START_LABEL)}];\n")
+
+    def node(self, node: FlowNode) -> None:
+        shape = "diamond" if node.kind == "decision" else "box"
+        self.out.write(f"  {_quote_dot(node.id)} [shape={shape}, label={_quote_dot(unwrap_label(node.label))}];\n")
+
+    def edge(self, src: str, dst: str, label: Optional[str]) -> None:
+        attrs = f" [label={_quote_dot(label)}]" if label else ""
+        self.out.write(f"  {_quote_dot(src)} -> {_quote_dot(dst)}{attrs};\n")
+
+    def end(self) -> None:
+        self.out.write("}\n")
+
+
+def _mermaid_id(node_id: str) -> str:
+    return re.sub(r"\W", "_", node_id)
+
+
+def _quote_mermaid(text: str) -> str:
+    return '"' + text.replace('"', "#quot;") + '"'
+
+
+class MermaidEmitter(GraphEmitter):
+    """Mermaid ``flowchart`` syntax."""
+
+    extension = "mmd"
+
+    def begin(self) -> None:
+        self.out.write("flowchart TD\n")
+        self.out.write(f"  {START_ID}([{_quote_mermaid(START_LABEL)}])\n")
+
+    def node(self, node: FlowNode) -> None:
+        label = _quote_mermaid(unwrap_label(node.label))
+        shape = f"{{{label}}}" if node.kind == "decision" else f"[{label}]"
+        self.out.write(f"  {_mermaid_id(node.id)}{shape}\n")
+
+    def edge(self, src: str, dst: str, label: Optional[str]) -> None:
+        arrow = f"-->|{label}|" if label else "-->"
+        self.out.write(f"  {_mermaid_id(src)} {arrow} {_mermaid_id(dst)}\n")
+
+
+class JsonEmitter(GraphEmitter):
+    """One JSON document: ``{"kind", "sections": [...], "tail"}``, written a section at a time."""
+
+    extension = "json"
+
+    def __init__(self, out: IO[str], kind: str):
+        super().__init__(out, kind)
+        self._first = True
+        self._tail: Dict[str, list] = {"nodes": [], "edges": []}
+
+    def begin(self) -> None:
+        self.out.write(f'{{"kind": {json.dumps(self.kind)}, "sections": [\n')
+
+    def section(self, section: PolicySection) -> None:
+        record = {
+            "policy_id": section.policy_id,
+            "name": section.name,
+            "offset": section.offset,
+            "nodes": [_node_dict(node) for node in section.nodes],
+            "edges": [_edge_dict(edge) for edge in section.edges],
+        }
+        self.out.write(("" if self._first else ",\n") + json.dumps(record))
+        self._first = False
+
+    def tail(self, nodes: List[FlowNode], edges: List[FlowEdge]) -> None:
+        self._tail = {"nodes": [_node_dict(node) for node in nodes], "edges": [_edge_dict(edge) for edge in edges]}
+
+    def end(self) -> None:
+        self.out.write('\n], "tail": ' + json.dumps(self._tail) + "}\n")
+
+
+def _node_dict(node: FlowNode) -> Dict[str, str]:
+    return {"id": node.id, "kind": node.kind, "label": unwrap_label(node.label)}
+
+
+def _edge_dict(edge: FlowEdge) -> Dict[str, object]:
+    record: Dict[str, object] = {"kind": edge.kind, "src": list(edge.src) if edge.src else None, "dst": edge.dst}
+    if edge.kind == "arrow":
+        record.update(direction=edge.direction, length=edge.length)
+    else:
+        record["dst_anchor"] = edge.dst_anchor
+    return record
+
+
+EMITTERS: Dict[str, Type[GraphEmitter]] = {
+    "dot": DotEmitter,
+    "mermaid": MermaidEmitter,
+    "json": JsonEmitter,
+}
+
+
+def emit(
+    fmt: str,
+    out: IO[str],
+    kind: str,
+    sections: Iterable[PolicySection],
+    tail: Optional[Callable[[PolicySection], Tuple[List[FlowNode], List[FlowEdge]]]] = None,
+) -> None:
+    """Stream ``sections`` to ``out`` in ``fmt`` (``dot``, ``mermaid`` or ``json``).
+
+    ``tail`` is called with the last section to get any closing
+    ``(nodes, edges)``, such as :func:`~okta_flowcharting.flowchart_graph.signon_tail`.
+    """
+    emitter = EMITTERS[fmt](out, kind)
+    emitter.begin()
+    last = None
+    for section in sections:
+        emitter.section(section)
+        last = section
+    if tail is not None and last is not None:
+        emitter.tail(*tail(last))
+    emitter.end()
@@ -0,0 +1,441 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field, replace
+from typing import Any, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .metrics import span
+from .sdk_models import attr_path
+
+# schemdraw's default ``Drawing.unit``; offsets are multiples of it.
+DEFAULT_UNIT = 3.0
+
+DECISION_SIZE = (5.5, 4.0)
+BOX_SIZE = (3.5, 4.0)
+
+# Anchor labels of policy decisions and of rule condition decisions.
+POLICY_ANCHORS: Tuple[Tuple[str, str], ...] = (("E", "YES"), ("S", "NO"))
+CONDITION_ANCHORS: Tuple[Tuple[str, str], ...] = (("N", ""), ("E", "YES"), ("S", "NO"))
+
+VALID_USER_LABEL = "Is the user valid in Okta?"
+ENROLLED_LABEL = "Is the user enrolled in Okta?"
+ALLOWED_LABEL = "Access is Allowed."
+DENIED_LABEL = "Access is denied."
+CONTINUE_LABEL = "Continue to {}"
+
+# (node id, anchor name) an edge starts or ends at.
+Anchor = Tuple[str, str]
+
+
+def label_format(label):
+    out = ""
+    start = 0
+    for i in range(0, len(label), 25):
+        out += label[start:i] + "-\n"
+        start = i
+    out += label[start:len(label)]
+    return out
+
+
+def unwrap_label(label: str) -> str:
+    """Undo :func:`label_format` for outputs that wrap text themselves."""
+    return label.replace("-\n", "")
+
+
+@dataclass
+class DirectoryNames:
+    """Directory lookups used to turn the ids in policy rules into labels."""
+
+    groups: Mapping[str, Any] = field(default_factory=dict)
+    networks: Mapping[str, Any] = field(default_factory=dict)
+    users: Mapping[str, Any] = field(default_factory=dict)
+    user_types: Mapping[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    async def from_cache(cls, cache: Any) -> "DirectoryNames":
+        groups, networks, users, user_types = await asyncio.gather(
+            cache.get_groups(), cache.get_networks(), cache.get_users(), cache.get_user_types()
+        )
+        return cls(groups=groups, networks=networks, users=users, user_types=user_types)
+
+
+@dataclass(frozen=True)
+class FlowNode:
+    """A decision or box on the chart; ``label`` is the final, wrapped text."""
+
+    id: str
+    kind: str
+    label: str
+    anchors: Tuple[Tuple[str, str], ...] = ()
+
+    @property
+    def size(self) -> Tuple[float, float]:
+        return DECISION_SIZE if self.kind == "decision" else BOX_SIZE
+
+
+@dataclass(frozen=True)
+class FlowEdge:
+    """An arrow or a wire between nodes.
+
+    Arrows run ``length`` in ``direction`` from ``src`` (or from wherever the
+    previous element ended when ``src`` is None) and place the node ``dst``,
+    if any, at their tip. Wires connect ``src`` to the ``dst_anchor`` of an
+    existing node.
+    """
+
+    kind: str
+    src: Optional[Anchor]
+    dst: Optional[str] = None
+    direction: Optional[str] = None
+    length: float = 0.0
+    dst_anchor: Optional[str] = None
+
+
+def _arrow(direction: str, length: float, src: Optional[Anchor], dst: Optional[str] = None) -> FlowEdge:
+    return FlowEdge("arrow", src, dst, direction, length)
+
+
+def _wire(src: Anchor, dst: str, dst_anchor: str = "N") -> FlowEdge:
+    return FlowEdge("wire", src, dst, dst_anchor=dst_anchor)
+
+
+@dataclass
+class RuleRow:
+    """One policy rule: its first decision and everything drawn to the right of it.
+
+    ``entry`` leads into ``first`` from the policy decision or the row
+    above. ``edges`` places the remaining ``nodes`` in drawing order.
+    """
+
+    rule_id: str
+    name: str
+    first: FlowNode
+    entry: FlowEdge
+    nodes: List[FlowNode] = field(default_factory=list)
+    edges: List[FlowEdge] = field(default_factory=list)
+
+
+@dataclass
+class PolicySection:
+    """A policy decision and its rule rows.
+
+    ``offset`` is the length of the arrow down from the previous policy
+    decision, precomputed from that policy's rule count.
+    """
+
+    policy_id: str
+    name: str
+    node: FlowNode
+    offset: float
+    rows: List[RuleRow] = field(default_factory=list)
+
+    @property
+    def entry(self) -> FlowEdge:
+        return _arrow("down", self.offset, None, self.node.id)
+
+    @property
+    def nodes(self) -> List[FlowNode]:
+        return [self.node] + [row.first for row in self.rows] + [node for row in self.rows for node in row.nodes]
+
+    @property
+    def edges(self) -> List[FlowEdge]:
+        return [self.entry] + [row.entry for row in self.rows] + [edge for row in self.rows for edge in row.edges]
+
+
+@dataclass
+class FlowGraph:
+    """Layout of a whole chart, independent of any drawing backend.
+
+    ``edges`` yields edges in the order the chart is drawn: every policy
+    decision down the left, then policy by policy the first decision of
+    each rule followed by the rest of each rule row, then the closing
+    ``tail``.
+    """
+
+    kind: str
+    unit: float = DEFAULT_UNIT
+    sections: List[PolicySection] = field(default_factory=list)
+    tail_nodes: List[FlowNode] = field(default_factory=list)
+    tail: List[FlowEdge] = field(default_factory=list)
+
+    def nodes(self) -> Iterator[FlowNode]:
+        for section in self.sections:
+            yield from section.nodes
+        yield from self.tail_nodes
+
+    def edges(self) -> Iterator[FlowEdge]:
+        for section in self.sections:
+            yield section.entry
+        for section in self.sections:
+            for row in section.rows:
+                yield row.entry
+            for row in section.rows:
+                yield from row.edges
+        yield from self.tail
+
+
+def _decision(node_id: str, label: str, anchors: Tuple[Tuple[str, str], ...] = CONDITION_ANCHORS) -> FlowNode:
+    return FlowNode(node_id, "decision", label, anchors)
+
+
+def _box(node_id: str, label: str) -> FlowNode:
+    return FlowNode(node_id, "box", label)
+
+
+def _rule_node_id(rule: Any) -> str:
+    return f"rule:{rule.id}"
+
+
+def _network_labels(network: Any, networks: Mapping[str, Any]) -> List[str]:
+    labels = []
+    zones = attr_path(network, "exclude")
+    if zones:
+        if zones == ["ALL_ZONES"]:
+            labels.append(label_format("Is user NOT in Any Zone"))
+        else:
+            names = [networks[zone].name for zone in zones]
+            labels.append(label_format(f"Is user NOT in Network Range {' or '.join(names)}"))
+    zones = attr_path(network, "include")
+    if zones:
+        if zones == ["ALL_ZONES"]:
+            labels.append(label_format("Is user in Any Zone"))
+        else:
+            names = [networks[zone].name for zone in zones]
+            labels.append(label_format(f"Is user in Network Range {' or '.join(names)}"))
+    return labels
+
+
+def _risk_score_label(conditions: Any, skip_defaults: bool) -> List[str]:
+    level = attr_path(conditions, "risk_score", "level")
+    if not level or (level == "ANY" and skip_defaults):
+        return []
+    return [label_format(f"Is Risk Score {level}")]
+
+
+def access_rule_labels(rule: Any, names: DirectoryNames, skip_defaults: bool = False) -> List[str]:
+    """Decision labels for an access policy rule's conditions, in drawing order."""
+    # With access policies every Auth policy has one rule that is default
+    if rule.system:
+        return [label_format("Is valid Okta user")]
+    conditions = rule.conditions
+    labels = []
+    # Only user type exclusions have ever been drawn; inclusions are skipped
+    # so existing charts stay the same.
+    type_ids = attr_path(conditions, "user_type", "exclude")
+    if type_ids:
+        type_names = [names.user_types[type_id].name for type_id in type_ids]
+        labels.append(label_format(f"Is user type is NOT {' or '.join(type_names)}"))
+    groups = attr_path(conditions, "people", "groups")
+    if groups:
+        if groups.include:
+            group_names = [names.groups[group_id].profile.name for group_id in groups.include]
+            labels.append(label_format(f"Is user in group {' or '.join(group_names)}"))
+        if groups.exclude:
+            group_names = [names.groups[group_id].profile.name for group_id in groups.exclude]
+            labels.append(label_format(f"Is user in NOT group {' or '.join(group_names)}"))
+    users = attr_path(conditions, "people", "users")
+    if users:
+        if users.include:
+            user_names = [names.users[user_id].profile.login for user_id in users.include]
+            labels.append(label_format(f"Is username {' or '.join(user_names)}"))
+        if users.exclude:
+            user_names = [names.users[user_id].profile.login for user_id in users.exclude]
+            labels.append(label_format(f"Is username NOT {' or '.join(user_names)}"))
+    device = attr_path(conditions, "device")
+    if device:
+        if device.registered:
+            labels.append(label_format("Is user device registered"))
+        if device.managed:
+            labels.append(label_format("Is user device managed"))
+    platforms = attr_path(conditions, "platform", "include")
+    if platforms:
+        platform_names = [platform.os.type for platform in platforms]
+        labels.append(label_format(f"Is user device running {' or '.join(platform_names)}"))
+    labels += _network_labels(attr_path(conditions, "network"), names.networks)
+    labels += _risk_score_label(conditions, skip_defaults)
+    if attr_path(conditions, "el_condition", "condition"):
+        labels.append(label_format("Does user pass custom expression?"))
+    return labels
+
+
+def signon_rule_labels(rule: Any, names: DirectoryNames, skip_defaults: bool = False) -> List[str]:
+    """Decision labels for a global session policy rule's conditions, in drawing order."""
+    conditions = rule.conditions
+    labels = _network_labels(attr_path(conditions, "network"), names.networks)
+    provider = attr_path(conditions, "identity_provider")
+    if provider and not (provider.provider == "ANY" and skip_defaults):
+        labels.append(label_format(f"Identity Provider is {provider.provider}"))
+    auth_context = attr_path(conditions, "auth_context")
+    if auth_context and not (auth_context.auth_type == "ANY" and skip_defaults):
+        labels.append(label_format(f"Is authentication performed via {auth_context.auth_type}"))
+    # Behavior can be None on default policies. There is no API to list
+    # behaviors, so they are shown by name.
+    behaviors = attr_path(conditions, "risk", "behaviors")
+    if behaviors:
+        labels.append(label_format(f"Is behavior {', '.join(behaviors)}"))
+    labels += _risk_score_label(conditions, skip_defaults)
+    return labels
+
+
+def signon_policy_label(policy: Any, names: DirectoryNames) -> str:
+    group_names = [names.groups[group_id].profile.name for group_id in policy.conditions.people.groups.include]
+    if group_names == ["Everyone"]:
+        return ENROLLED_LABEL
+    return label_format(f"Is user in group {' or '.join(group_names)}?")
+
+
+def _rule_rows(
+    section: PolicySection,
+    rules: Sequence[Any],
+    labels: Sequence[List[str]],
+    outcomes: Sequence[str],
+    next_policy: Optional[str],
+    unit: float,
+    signon: bool,
+) -> None:
+    """Lay out the rule rows of one policy section."""
+    for index, (rule, rule_labels, access) in enumerate(zip(rules, labels, outcomes)):
+        row_id = _rule_node_id(rule)
+        if rule.system or not rule_labels:
+            first = _decision(row_id, VALID_USER_LABEL, POLICY_ANCHORS)
+        else:
+            first = _decision(row_id, rule_labels[0])
+        if index == 0:
+            entry = _arrow("right", unit / 2, (section.node.id, "E"), first.id)
+        else:
+            entry = _arrow("down", unit / 2, (section.rows[-1].first.id, "S"), first.id)
+        row = RuleRow(rule.id, rule.name, first, entry)
+        # Failures fall through to the next rule, or past the last rule to the next policy.
+        next_row = _rule_node_id(rules[index + 1]) if index + 1 < len(rules) else None
+        current = first.id
+        if not rule_labels and signon and next_row is None and next_policy:
+            row.edges.append(_wire((first.id, "S"), next_policy))
+        for position, label in enumerate(rule_labels):
+            if position != 0:
+                node = _decision(f"{row_id}:{position}", label)
+                row.nodes.append(node)
+                row.edges.append(_arrow("right", unit / 2, (current, "E"), node.id))
+                current = node.id
+            if next_row:
+                row.edges.append(_wire((current, "S"), next_row))
+            elif next_policy and signon:
+                row.edges.append(_wire((first.id, "S"), next_policy))
+                row.edges.append(_wire((current, "S"), next_policy))
+            elif next_policy:
+                # One per condition, as the chart has always drawn it.
+                denied = _box(f"{row_id}:denied:{position}", DENIED_LABEL)
+                row.nodes.append(denied)
+                row.edges.append(_arrow("down", unit / 2, (first.id, "S"), denied.id))
+        outcome = _box(f"{row_id}:outcome", ALLOWED_LABEL if access == "ALLOW" else DENIED_LABEL)
+        row.nodes.append(outcome)
+        row.edges.append(_arrow("right", unit / 2, (current, "E"), outcome.id))
+        section.rows.append(row)
+
+
+def iter_access_sections(
+    bundles: Mapping[str, Any],
+    apps_by_policy: Mapping[str, List[str]],
+    apps_by_id: Mapping[str, Any],
+    names: DirectoryNames,
+    unit: float = DEFAULT_UNIT,
+    skip_defaults: bool = True,
+) -> Iterator[PolicySection]:
+    """Lay out the access policy chart one section at a time, for the policies in ``bundles`` that have apps.
+
+    Each rule's condition labels are extracted exactly once.
+    """
+    # Apps can point at policies left out of ``bundles``, e.g. by a diff's filter.
+    policy_ids = [policy_id for policy_id in apps_by_policy if policy_id in bundles]
+    previous_rules = 0
+    for index, policy_id in enumerate(policy_ids):
+        bundle = bundles[policy_id]
+        app_names = [apps_by_id[app_id]["name"] for app_id in apps_by_policy[policy_id]]
+        # The arrow down spans the previous policy's rows: a d.unit/2 line and
+        # a 4 high decision per rule, plus the access denied box.
+        offset = unit if index == 0 else unit / 2 * previous_rules + 4 * previous_rules + 1
+        node = _decision(f"policy:{policy_id}", label_format(f"Is the user accessing: {', '.join(app_names)}"), POLICY_ANCHORS)
+        section = PolicySection(policy_id, bundle.policy.name, node, offset)
+        next_policy = f"policy:{policy_ids[index + 1]}" if index + 1 < len(policy_ids) else None
+        with span("access.extract"):
+            labels = [access_rule_labels(rule, names, skip_defaults) for rule in bundle.rules]
+        outcomes = [attr_path(rule, "actions", "app_sign_on", "access") for rule in bundle.rules]
+        _rule_rows(section, bundle.rules, labels, outcomes, next_policy, unit, signon=False)
+        yield section
+        previous_rules = len(bundle.rules)
+
+
+def build_access_graph(
+    bundles: Mapping[str, Any],
+    apps_by_policy: Mapping[str, List[str]],
+    apps_by_id: Mapping[str, Any],
+    names: DirectoryNames,
+    unit: float = DEFAULT_UNIT,
+    skip_defaults: bool = True,
+) -> FlowGraph:
+    """Lay out the whole access policy chart; see :func:`iter_access_sections`."""
+    sections = iter_access_sections(bundles, apps_by_policy, apps_by_id, names, unit, skip_defaults)
+    return FlowGraph("access", unit, list(sections))
+
+
+def iter_signon_sections(
+    bundles: Mapping[str, Any],
+    names: DirectoryNames,
+    unit: float = DEFAULT_UNIT,
+    skip_defaults: bool = True,
+) -> Iterator[PolicySection]:
+    """Lay out the global session policy chart one section at a time.
+
+    Each rule's condition labels are extracted exactly once.
+    """
+    policy_ids = list(bundles)
+    previous_rules = 0
+    for index, policy_id in enumerate(policy_ids):
+        bundle = bundles[policy_id]
+        # The arrow down spans the previous policy's rows: n - 1 lines of
+        # d.unit/2 and a 4 high decision per rule.
+        offset = unit if index == 0 else unit / 2 * (previous_rules - 1) + 4 * previous_rules
+        node = _decision(f"policy:{policy_id}", signon_policy_label(bundle.policy, names), POLICY_ANCHORS)
+        section = PolicySection(policy_id, bundle.policy.name, node, offset)
+        next_policy = f"policy:{policy_ids[index + 1]}" if index + 1 < len(policy_ids) else None
+        with span("signon.extract"):
+            labels = [signon_rule_labels(rule, names, skip_defaults) for rule in bundle.rules]
+        outcomes = [attr_path(rule, "actions", "signon", "access") for rule in bundle.rules]
+        _rule_rows(section, bundle.rules, labels, outcomes, next_policy, unit, signon=True)
+        yield section
+        previous_rules = len(bundle.rules)
+
+
+def signon_tail(last: PolicySection, unit: float = DEFAULT_UNIT) -> Tuple[List[FlowNode], List[FlowEdge]]:
+    """The access denied box users reach when no global session policy applies."""
+    denied = _box("end:denied", DENIED_LABEL)
+    return [denied], [_arrow("down", unit / 2, (last.node.id, "S"), denied.id)]
+
+
+def build_signon_graph(
+    bundles: Mapping[str, Any],
+    names: DirectoryNames,
+    unit: float = DEFAULT_UNIT,
+    skip_defaults: bool = True,
+) -> FlowGraph:
+    """Lay out the whole global session policy chart; see :func:`iter_signon_sections`."""
+    graph = FlowGraph("signon", unit, list(iter_signon_sections(bundles, names, unit, skip_defaults)))
+    if graph.sections:
+        graph.tail_nodes, graph.tail = signon_tail(graph.sections[-1], unit)
+    return graph
+
+
+def page_graph(graph: FlowGraph, index: int) -> FlowGraph:
+    """Lay out section ``index`` of ``graph`` as a chart of its own.
+
+    The policy decision sits one unit below the start. Where the full
+    chart carries on to the next policy, a box naming it stands in its
+    place, so rules that fall through still have somewhere to go; the last
+    section keeps the graph's tail instead.
+    """
+    section = replace(graph.sections[index], offset=graph.unit)
+    if index + 1 == len(graph.sections):
+        return FlowGraph(graph.kind, graph.unit, [section], graph.tail_nodes, graph.tail)
+    following = graph.sections[index + 1]
+    node = _box(following.node.id, label_format(CONTINUE_LABEL.format(following.name)))
+    stand_in = PolicySection(following.policy_id, following.name, node, following.offset)
+    return FlowGraph(graph.kind, graph.unit, [section, stand_in])
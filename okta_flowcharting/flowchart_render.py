@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Mapping
+
+import schemdraw
+from schemdraw import flow
+
+from .flowchart_graph import FlowEdge, FlowGraph, FlowNode
+
+
+def node_element(node: FlowNode) -> Any:
+    """Build the schemdraw element for a graph node."""
+    w, h = node.size
+    if node.kind == "decision":
+        return flow.Decision(w=w, h=h, **dict(node.anchors)).label(node.label)
+    return flow.Box(w=w, h=h).label(node.label)
+
+
+def draw_edges(
+    d: schemdraw.Drawing,
+    edges: Iterable[FlowEdge],
+    nodes: Mapping[str, FlowNode],
+    placed: Dict[str, Any],
+) -> None:
+    """Draw ``edges`` in order, adding each arrow's node to ``placed``.
+
+    ``placed`` may be seeded with stand-ins for nodes drawn elsewhere; any
+    object with the anchors an edge refers to will do.
+    """
+    for edge in edges:
+        if edge.kind == "wire":
+            src = getattr(placed[edge.src[0]], edge.src[1])
+            dst = getattr(placed[edge.dst], edge.dst_anchor)
+            d.add(flow.Wire('-', arrow='->').at(src).to(dst))
+            continue
+        arrow = getattr(flow.Arrow(), edge.direction)(edge.length)
+        if edge.src is not None:
+            arrow = arrow.at(getattr(placed[edge.src[0]], edge.src[1]))
+        d.add(arrow)
+        if edge.dst is not None:
+            placed[edge.dst] = d.add(node_element(nodes[edge.dst]))
+
+
+def render_graph(d: schemdraw.Drawing, graph: FlowGraph) -> Dict[str, Any]:
+    """Draw ``graph`` onto ``d`` and return the placed element of every node."""
+    placed: Dict[str, Any] = {}
+    draw_edges(d, graph.edges(), {node.id: node for node in graph.nodes()}, placed)
+    return placed
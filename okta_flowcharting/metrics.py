@@ -0,0 +1,234 @@
+"""Counters, latencies and timed spans for a run, exported as JSON or Prometheus text.
+
+Metrics are off unless :func:`enable` is called. While they are off the
+module-level helpers return straight away, :func:`span` hands back a shared
+no-op context manager and :func:`instrument_client` leaves the client alone,
+so instrumented code pays for one global lookup per call.
+"""
+from __future__ import annotations
+
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+# Set by the Okta SDK's request executor on every retried request.
+RETRY_COUNT_HEADER = "X-Okta-Retry-Count"
+
+# (metric name, sorted (label, value) pairs)
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+_ID_SEGMENT = re.compile(r"\d")
+
+
+@dataclass
+class Summary:
+    count: int = 0
+    total: float = 0.0
+    min: float = float("inf")
+    max: float = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"count": self.count, "sum": self.total, "min": self.min if self.count else 0.0, "max": self.max}
+
+
+class Metrics:
+    """Counters and latency summaries keyed by name and labels."""
+
+    def __init__(self) -> None:
+        self.counters: Dict[MetricKey, float] = {}
+        self.summaries: Dict[MetricKey, Summary] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        summary = self.summaries.get(key)
+        if summary is None:
+            summary = self.summaries[key] = Summary()
+        summary.add(value)
+
+    def counter(self, name: str, **labels: str) -> float:
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def summary(self, name: str, **labels: str) -> Summary:
+        return self.summaries.get((name, tuple(sorted(labels.items()))), Summary())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+            "summaries": [
+                {"name": name, "labels": dict(labels), **summary.to_dict()}
+                for (name, labels), summary in sorted(self.summaries.items())
+            ],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition: counters as ``counter``, latencies as ``summary``."""
+        lines = []
+        for name, samples in _grouped(self.counters):
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f"{name}{_labels(labels)} {_number(value)}" for labels, value in samples)
+        for name, samples in _grouped(self.summaries):
+            lines.append(f"# TYPE {name} summary")
+            for labels, summary in samples:
+                lines.append(f"{name}_count{_labels(labels)} {summary.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(summary.total)}")
+        return "\n".join(lines) + "\n"
+
+
+def _grouped(samples: Dict[MetricKey, Any]) -> Iterator[Tuple[str, list]]:
+    by_name: Dict[str, list] = {}
+    for (name, labels), value in sorted(samples.items(), key=lambda item: item[0]):
+        by_name.setdefault(name, []).append((labels, value))
+    return iter(by_name.items())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_active: Optional[Metrics] = None
+
+
+def enable() -> Metrics:
+    """Start collecting into a fresh registry and return it."""
+    global _active
+    _active = Metrics()
+    return _active
+
+
+def disable() -> Optional[Metrics]:
+    """Stop collecting and return what was collected."""
+    global _active
+    collected, _active = _active, None
+    return collected
+
+
+def active() -> Optional[Metrics]:
+    return _active
+
+
+def inc(name: str, amount: float = 1, **labels: str) -> None:
+    if _active is not None:
+        _active.inc(name, amount, **labels)
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    if _active is not None:
+        _active.observe(name, value, **labels)
+
+
+class _Span:
+    __slots__ = ("registry", "name", "started")
+
+    def __init__(self, registry: Metrics, name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.registry.observe("span_seconds", time.perf_counter() - self.started, span=self.name)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str) -> Any:
+    """Time a block as ``span_seconds{span=name}``; free when metrics are off."""
+    if _active is None:
+        return _NO_SPAN
+    return _Span(_active, name)
+
+
+def endpoint_family(url: str) -> str:
+    """Okta API path with ids dropped, e.g. ``policies/rules`` for a policy's rules."""
+    path = urlparse(url).path
+    if path.startswith("/api/v1/"):
+        path = path[len("/api/v1/"):]
+    return "/".join(segment for segment in path.strip("/").split("/") if segment and not _ID_SEGMENT.search(segment))
+
+
+def instrument_client(client: Any) -> None:
+    """Count and time every HTTP attempt an Okta SDK client makes, per endpoint family.
+
+    Wraps the client's HTTP layer, below the SDK's retry loop, so each
+    retried attempt is seen and counted under ``okta_retries_total``, and
+    below any rate-limit scheduler, so waits for budget aren't timed as
+    requests. Does nothing while metrics are off or for clients without an
+    HTTP layer.
+    """
+    if _active is None:
+        return
+    http = getattr(client.get_request_executor(), "_http_client", None)
+    if http is None or getattr(http, "_metrics_instrumented", False):
+        return
+    # A rate-limit scheduler sends through _send_unpaced; instrument that instead.
+    target = "_send_unpaced" if hasattr(http, "_send_unpaced") else "send_request"
+    send = getattr(http, target)
+
+    async def send_request(request: Dict[str, Any]) -> Any:
+        started = time.perf_counter()
+        result = await send(request)
+        endpoint = endpoint_family(request["url"])
+        status = getattr(result[1], "status", None)
+        record_request(endpoint, time.perf_counter() - started, str(status) if status is not None else "error")
+        if RETRY_COUNT_HEADER in (request.get("headers") or {}):
+            inc("okta_retries_total", endpoint=endpoint)
+        return result
+
+    setattr(http, target, send_request)
+    http._metrics_instrumented = True
+
+
+def record_request(endpoint: str, seconds: float, status: str = "200") -> None:
+    """Record one API request against ``endpoint``."""
+    if _active is not None:
+        _active.inc("okta_requests_total", endpoint=endpoint, status=status)
+        _active.observe("okta_request_seconds", seconds, endpoint=endpoint)
+
+
+def write(path: str, fmt: str = "json") -> None:
+    """Write the active registry to ``path`` as ``json`` or ``prometheus`` text."""
+    registry = _active or Metrics()
+    with open(path, "w") as fh:
+        fh.write(registry.to_prometheus() if fmt == "prometheus" else registry.to_json() + "\n")
@@ -2,12 +2,48 @@ from __future__ import annotations
 
 import os
 import json
-import pickle
+import asyncio
+import time
+from urllib.parse import urlencode
 from dataclasses import dataclass, asdict, field
-from typing import Any, Callable, Coroutine, Dict, List
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
 
 from okta.client import Client as OktaClient
 
+from . import metrics
+from .directory_store import DEFAULT_FILENAME, DirectoryStore, StoreView
+from .rate_limit import DEFAULT_MAX_CONCURRENCY, RateLimitScheduler
+
+# Upper bound on in-flight per-object requests (policy rules, group members).
+# It matches the rate-limit scheduler's own ceiling, so for clients from
+# get_okta_client the scheduler decides how many run at once within each
+# endpoint's budget (see rate_limit); for other clients this is the only cap.
+DEFAULT_CONCURRENCY = DEFAULT_MAX_CONCURRENCY
+
+# Page sizes for the paginated list endpoints; 200 is the Okta maximum for users.
+USER_PAGE_SIZE = 200
+GROUP_PAGE_SIZE = 500
+APP_PAGE_SIZE = 200
+# Okta pages with opaque cursors, so one listing can't be split by offset.
+# Listing each app status separately gives independent cursors to run at once.
+APP_STATUSES = ("ACTIVE", "INACTIVE")
+
+# Cached collections are refreshed once they are older than this (seconds).
+DEFAULT_CACHE_TTL = 24 * 60 * 60
+# Overlap delta queries with the previous fetch to absorb clock skew.
+DELTA_SKEW = 5 * 60
+# Delta queries never see objects deleted outright, so collections kept fresh
+# by deltas are still refetched in full once their last full fetch is this old.
+DEFAULT_FULL_REFRESH_AGE = 7 * 24 * 60 * 60
+
+PageLoader = Callable[[], AsyncIterator[List[Any]]]
+# Takes an Okta timestamp and yields pages of objects updated after it.
+DeltaLoader = Callable[[str], AsyncIterator[List[Any]]]
+
+
+class OktaRequestError(RuntimeError):
+    """Raised when the Okta SDK reports an error for a list request."""
+
 
 @dataclass
 class Credentials:
@@ -37,82 +73,337 @@ class PolicyBundle:
 class OktaCache:
     client: OktaClient
     cache_dir: str = "."
-    groups: Dict[str, Any] = field(default_factory=dict)
-    networks: Dict[str, Any] = field(default_factory=dict)
-    users: Dict[str, Any] = field(default_factory=dict)
-    user_types: Dict[str, Any] = field(default_factory=dict)
-
-    async def _load_cached(self, filename: str, loader: Callable[[], Coroutine[Any, Any, List[Any]]]) -> Dict[str, Any]:
-        path = os.path.join(self.cache_dir, filename)
-        if os.path.exists(path):
-            items = pickle.load(open(path, "rb"))
+    ttl: Optional[float] = DEFAULT_CACHE_TTL
+    full_refresh_age: Optional[float] = DEFAULT_FULL_REFRESH_AGE
+    groups: Mapping[str, Any] = field(default_factory=dict)
+    networks: Mapping[str, Any] = field(default_factory=dict)
+    users: Mapping[str, Any] = field(default_factory=dict)
+    user_types: Mapping[str, Any] = field(default_factory=dict)
+    apps: Mapping[str, Any] = field(default_factory=dict)
+    group_members: Mapping[str, Any] = field(default_factory=dict)
+    _inflight: Dict[str, asyncio.Future] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _store: Optional[DirectoryStore] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def store(self) -> DirectoryStore:
+        if self._store is None:
+            self._store = DirectoryStore.in_dir(self.cache_dir)
+        return self._store
+
+    async def _iter_cached(self, attr: str, loader: PageLoader, delta: Optional[DeltaLoader] = None) -> AsyncIterator[List[Any]]:
+        """Yield pages of a collection, reading from or writing to the store.
+
+        A fresh collection is read back from the store; otherwise pages are
+        written to it as they arrive and only swapped in once the last one
+        is in, so an abandoned iteration never leaves a partial collection
+        behind. A collection older than ``ttl`` is updated in place from a
+        ``lastUpdated`` delta query when it supports one, and refetched in
+        full otherwise, or once its last full fetch is older than
+        ``full_refresh_age`` so hard deletions are reconciled. Once loaded,
+        ``attr`` is a lazy id -> object view.
+        """
+        loaded = getattr(self, attr)
+        if loaded:
+            metrics.inc("okta_cache_lookups_total", collection=attr, result="memory")
+            # A store view is read back a page at a time; only a plain dict is already in memory.
+            pages = loaded.iter_pages() if isinstance(loaded, StoreView) else [list(loaded.values())]
+            for page in pages:
+                yield page
+            return
+
+        store = self.store
+        fetched_at = store.fetched_at(attr)
+        replaced_at = store.replaced_at(attr)
+        patchable = delta is not None and replaced_at is not None and not cache_expired(replaced_at, self.full_refresh_age)
+        if fetched_at is not None and (patchable or not cache_expired(fetched_at, self.ttl)):
+            expired = cache_expired(fetched_at, self.ttl)
+            metrics.inc("okta_cache_lookups_total", collection=attr, result="delta" if expired else "hit")
+            if expired:
+                started = time.time()
+                async for page in delta(okta_timestamp(fetched_at - DELTA_SKEW)):
+                    store.upsert(attr, *split_delta(page))
+                store.mark_fetched(attr, started)
+            setattr(self, attr, store.view(attr))
+            for page in store.iter_pages(attr):
+                yield page
+            return
+
+        metrics.inc("okta_cache_lookups_total", collection=attr, result="miss")
+        with store.replace(attr) as writer:
+            async for page in loader():
+                writer.write(page)
+                yield page
+        setattr(self, attr, store.view(attr))
+
+    async def _load_cached(self, attr: str, pages: PageLoader) -> Mapping[str, Any]:
+        """Load a collection once, sharing a single in-flight fetch between awaiters."""
+        if getattr(self, attr):
+            metrics.inc("okta_cache_lookups_total", collection=attr, result="memory")
+            return getattr(self, attr)
+        task = self._inflight.get(attr)
+        if task is None:
+            task = asyncio.ensure_future(self._drain(attr, pages))
+            self._inflight[attr] = task
+            task.add_done_callback(lambda _: self._inflight.pop(attr, None))
+        # Shield so one cancelled caller doesn't cancel the fetch for the others.
+        return await asyncio.shield(task)
+
+    async def _drain(self, attr: str, pages: PageLoader) -> Mapping[str, Any]:
+        started = time.perf_counter()
+        async for _ in pages():
+            pass
+        metrics.observe("okta_cache_load_seconds", time.perf_counter() - started, collection=attr)
+        return getattr(self, attr)
+
+    async def prefetch(self) -> None:
+        """Warm every collection concurrently."""
+        await asyncio.gather(self.get_networks(), self.get_user_types(), self.get_groups(), self.get_users())
+
+    def iter_groups(self) -> AsyncIterator[List[Any]]:
+        return self._iter_cached(
+            "groups", lambda: iter_groups(self.client), lambda since: iter_groups(self.client, since=since)
+        )
+
+    def iter_networks(self) -> AsyncIterator[List[Any]]:
+        return self._iter_cached("networks", lambda: iter_pages(self.client.list_network_zones))
+
+    def iter_users(self) -> AsyncIterator[List[Any]]:
+        return self._iter_cached(
+            "users", lambda: iter_users(self.client), lambda since: iter_users(self.client, since=since)
+        )
+
+    def iter_user_types(self) -> AsyncIterator[List[Any]]:
+        return self._iter_cached("user_types", lambda: iter_pages(self.client.list_user_types))
+
+    def iter_apps(self) -> AsyncIterator[List[Any]]:
+        return self._iter_cached("apps", lambda: iter_apps(self.client))
+
+    def iter_group_members(self) -> AsyncIterator[List[Any]]:
+        async def loader() -> AsyncIterator[List[Any]]:
+            groups = await self.get_groups()
+            async for page in iter_group_members(self.client, list(groups)):
+                yield page
+
+        return self._iter_cached("group_members", loader)
+
+    async def get_groups(self) -> Mapping[str, Any]:
+        return await self._load_cached("groups", self.iter_groups)
+
+    async def get_networks(self) -> Mapping[str, Any]:
+        return await self._load_cached("networks", self.iter_networks)
+
+    async def get_users(self) -> Mapping[str, Any]:
+        return await self._load_cached("users", self.iter_users)
+
+    async def get_user_types(self) -> Mapping[str, Any]:
+        return await self._load_cached("user_types", self.iter_user_types)
+
+    async def get_apps(self) -> Mapping[str, Any]:
+        """Applications as raw JSON dicts keyed by id.
+
+        The SDK's application models don't round-trip every app type, so these
+        are read through the client's request executor instead, sharing its
+        HTTP session rather than opening a connection of their own.
+        """
+        return await self._load_cached("apps", self.iter_apps)
+
+    async def get_group_members(self) -> Mapping[str, Any]:
+        """``{"id": group_id, "members": [user_id, ...]}`` records keyed by group id."""
+        return await self._load_cached("group_members", self.iter_group_members)
+
+
+def cache_expired(fetched_at: float, ttl: Optional[float]) -> bool:
+    return ttl is not None and time.time() - fetched_at > ttl
+
+
+def okta_timestamp(epoch: float) -> str:
+    """Format an epoch time the way Okta filter expressions expect it."""
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(epoch))
+
+
+def split_delta(page: Iterable[Any]) -> Tuple[List[Any], List[str]]:
+    """Split a page of updated objects into upserts and ids to delete.
+
+    Deprovisioned users are dropped. Objects deleted outright never show up in
+    a delta query and only disappear on the periodic full refetch (see
+    ``DEFAULT_FULL_REFRESH_AGE``).
+    """
+    updated: List[Any] = []
+    deleted: List[str] = []
+    for item in page:
+        if getattr(item, "status", None) == "DEPROVISIONED":
+            deleted.append(item.id)
         else:
-            items = await loader()
-            pickle.dump(items, open(path, "wb"))
-        return {item.id: item for item in items}
+            updated.append(item)
+    return updated, deleted
+
+
+async def iter_pages(first_page: Callable[[], Awaitable[Tuple[List[Any], Any, Any]]]) -> AsyncIterator[List[Any]]:
+    """Yield each page of an Okta list call, following ``resp.has_next()``."""
+    items, resp, err = await first_page()
+    if err:
+        raise OktaRequestError(getattr(err, "message", str(err)))
+    yield items
+    while resp.has_next():
+        items, err = await resp.next()
+        if err:
+            raise OktaRequestError(getattr(err, "message", str(err)))
+        yield items
+
+
+async def list_all(first_page: Callable[[], Awaitable[Tuple[List[Any], Any, Any]]]) -> List[Any]:
+    """Every item of an Okta list call, across all its pages."""
+    items: List[Any] = []
+    async for page in iter_pages(first_page):
+        items.extend(page)
+    return items
+
+
+async def list_raw(client: OktaClient, path: str, query: Dict[str, Any]) -> Tuple[Any, Any, Any]:
+    """GET an Okta list endpoint as raw JSON, returning ``(items, resp, err)`` like the SDK."""
+    executor = client.get_request_executor()
+    request, err = await executor.create_request(method="GET", url=f"{path}?{urlencode(query)}", body={}, headers={}, oauth=False)
+    if err:
+        return None, None, err
+    response, err = await executor.execute(request)
+    if err:
+        return None, response, err
+    return response.get_body(), response, None
+
+
+async def merge_pages(*sources: AsyncIterator[List[Any]]) -> AsyncIterator[List[Any]]:
+    """Drain several page iterators concurrently, yielding pages as they arrive."""
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump(source: AsyncIterator[List[Any]]) -> None:
+        try:
+            async for page in source:
+                await queue.put((page, None))
+            await queue.put((done, None))
+        except Exception as exc:
+            await queue.put((done, exc))
+
+    tasks = [asyncio.ensure_future(pump(source)) for source in sources]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            page, exc = await queue.get()
+            if exc is not None:
+                raise exc
+            if page is done:
+                remaining -= 1
+            else:
+                yield page
+    finally:
+        for task in tasks:
+            task.cancel()
 
-    async def get_groups(self) -> Dict[str, Any]:
-        if not self.groups:
-            async def loader():
-                return await fetch_groups(self.client)
 
-            self.groups = await self._load_cached("okta_groups.pickle", loader)
-        return self.groups
+def _list_query(page_size: int, since: Optional[str]) -> Dict[str, Any]:
+    query: Dict[str, Any] = {"limit": page_size}
+    if since:
+        query["filter"] = f'lastUpdated gt "{since}"'
+    return query
 
-    async def get_networks(self) -> Dict[str, Any]:
-        if not self.networks:
-            async def loader():
-                networks, _, _ = await self.client.list_network_zones()
-                return networks
 
-            self.networks = await self._load_cached("okta_networks.pickle", loader)
-        return self.networks
+def iter_groups(client: OktaClient, page_size: int = GROUP_PAGE_SIZE, since: Optional[str] = None) -> AsyncIterator[List[Any]]:
+    return iter_pages(lambda: client.list_groups(_list_query(page_size, since)))
 
-    async def get_users(self) -> Dict[str, Any]:
-        if not self.users:
-            async def loader():
-                users, _, _ = await self.client.list_users()
-                return users
 
-            self.users = await self._load_cached("okta_users.pickle", loader)
-        return self.users
+def iter_users(client: OktaClient, page_size: int = USER_PAGE_SIZE, since: Optional[str] = None) -> AsyncIterator[List[Any]]:
+    return iter_pages(lambda: client.list_users(_list_query(page_size, since)))
 
-    async def get_user_types(self) -> Dict[str, Any]:
-        if not self.user_types:
-            async def loader():
-                types, _, _ = await self.client.list_user_types()
-                return types
 
-            self.user_types = await self._load_cached("okta_user_types.pickle", loader)
-        return self.user_types
+def iter_apps(client: OktaClient, page_size: int = APP_PAGE_SIZE) -> AsyncIterator[List[Any]]:
+    return merge_pages(*(
+        iter_pages(lambda status=status: list_raw(client, "/api/v1/apps", {"limit": page_size, "filter": f'status eq "{status}"'}))
+        for status in APP_STATUSES
+    ))
+
+
+async def iter_group_members(client: OktaClient, group_ids: List[str], concurrency: int = DEFAULT_CONCURRENCY) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Yield a ``{"id": group_id, "members": [...]}`` record per group as each completes."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(group_id: str) -> Dict[str, Any]:
+        async with semaphore:
+            members: List[str] = []
+            async for page in iter_pages(lambda: client.list_group_users(group_id, {"limit": USER_PAGE_SIZE})):
+                members.extend(user.id for user in page)
+        return {"id": group_id, "members": members}
+
+    tasks = [asyncio.ensure_future(fetch(group_id)) for group_id in group_ids]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield [await done]
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 async def fetch_groups(client: OktaClient) -> List[Any]:
-    query_parameters = {"limit": 500}
-    output_groups, resp, err = await client.list_groups(query_parameters)
-    while resp.has_next():
-        groups, err = await resp.next()
+    output_groups: List[Any] = []
+    async for groups in iter_groups(client):
         output_groups += groups
     return output_groups
 
 
-async def get_okta_policies(client: OktaClient, policy_type: str) -> Dict[str, PolicyBundle]:
-    cache_file = f"okta_{policy_type.lower()}.pickle"
-    if os.path.exists(cache_file):
-        raw = pickle.load(open(cache_file, "rb"))
-        return {
-            pid: PolicyBundle(policy=entry["Policy"], rules=entry["Rules"]) for pid, entry in raw.items()
-        }
+async def fetch_policy_rules(client: OktaClient, policies: List[Any], concurrency: int = DEFAULT_CONCURRENCY) -> List[List[Any]]:
+    """Fetch the rules of every policy concurrently, returned in policy order."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(policy: Any) -> List[Any]:
+        async with semaphore:
+            return await list_all(lambda: client.list_policy_rules(policy.id))
+
+    return await asyncio.gather(*(fetch(policy) for policy in policies))
 
-    policies, _, _ = await client.list_policies({"type": policy_type})
-    bundles: Dict[str, PolicyBundle] = {}
-    for policy in policies:
-        rules, _, _ = await client.list_policy_rules(policy.id)
-        bundles[policy.id] = PolicyBundle(policy=policy, rules=rules)
-    pickle.dump({pid: {"Policy": pb.policy, "Rules": pb.rules} for pid, pb in bundles.items()}, open(cache_file, "wb"))
+
+def policy_collection(policy_type: str) -> str:
+    return f"policies:{policy_type}"
+
+
+def load_policy_snapshot(cache_dir: str, policy_type: str) -> Optional[Dict[str, PolicyBundle]]:
+    """The ``get_okta_policies`` snapshot cached in ``cache_dir``, however old, or None."""
+    if not os.path.exists(os.path.join(cache_dir, DEFAULT_FILENAME)):
+        return None
+    collection = policy_collection(policy_type)
+    with DirectoryStore.in_dir(cache_dir) as store:
+        if store.fetched_at(collection) is None:
+            return None
+        return {bundle.policy.id: bundle for page in store.iter_pages(collection) for bundle in page}
+
+
+async def get_okta_policies(
+    client: OktaClient,
+    policy_type: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    ttl: Optional[float] = DEFAULT_CACHE_TTL,
+    cache_dir: str = ".",
+) -> Dict[str, PolicyBundle]:
+    # Policies have no lastUpdated filter and rule edits don't show up on the
+    # policy itself, so an expired snapshot is refetched in full.
+    collection = policy_collection(policy_type)
+    with DirectoryStore.in_dir(cache_dir) as store:
+        fetched_at = store.fetched_at(collection)
+        if fetched_at is not None and not cache_expired(fetched_at, ttl):
+            metrics.inc("okta_cache_lookups_total", collection=collection, result="hit")
+            return {bundle.policy.id: bundle for page in store.iter_pages(collection) for bundle in page}
+        metrics.inc("okta_cache_lookups_total", collection=collection, result="miss")
+
+        started = time.time()
+        policies = await list_all(lambda: client.list_policies({"type": policy_type}))
+        all_rules = await fetch_policy_rules(client, policies, concurrency)
+        bundles: Dict[str, PolicyBundle] = {
+            policy.id: PolicyBundle(policy=policy, rules=rules) for policy, rules in zip(policies, all_rules)
+        }
+        with store.replace(collection, fetched_at=started, key=lambda bundle: bundle.policy.id) as writer:
+            writer.write(bundles.values())
     return bundles
 
 
 def get_okta_client() -> OktaClient:
+    """Client for the configured org whose requests keep within Okta's rate limits."""
     creds = Credentials.from_file("okta")
-    return OktaClient(creds.to_dict())
+    return RateLimitScheduler().attach(OktaClient(creds.to_dict()))
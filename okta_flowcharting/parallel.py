@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Any, Callable, Optional, Sequence
+
+
+class InlineExecutor(Executor):
+    """Executor that runs each call immediately in the calling process."""
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as exc:
+            future.set_exception(exc)
+        return future
+
+
+def process_pool(
+    processes: Optional[int] = None,
+    initializer: Optional[Callable[..., None]] = None,
+    initargs: Sequence[Any] = (),
+) -> Executor:
+    """Return a process pool, or an inline executor when ``processes`` is 1 or less.
+
+    Workers are forked where the platform allows it, so ``initargs`` reach
+    them without being pickled. That lets policy models carrying lambda
+    conditions be shipped once per worker rather than once per task.
+    """
+    processes = processes or os.cpu_count() or 1
+    if processes <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return InlineExecutor()
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    return ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=initializer, initargs=tuple(initargs))
@@ -0,0 +1,231 @@
+"""What changed between two ``get_okta_policies`` snapshots.
+
+A policy whose own and rules' ``lastUpdated`` stamps all match is skipped
+outright. Otherwise policies and rules are compared by content hash, so a
+policy whose hash is unchanged is skipped without looking at its rules,
+and only rules whose hashes differ are compared field by field.
+Timestamps and links are left out of the hashes: a rule saved without
+edits isn't a change.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import asdict, dataclass, field
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
+
+from .content_hash import canonical
+from .policy_translation import translate_actions
+
+# Fields that change without the policy or rule changing, in SDK (as_dict) and attribute spelling.
+VOLATILE_FIELDS = frozenset({"created", "lastUpdated", "last_updated", "_links", "links"})
+# Order is tracked by position, so a rule's priority isn't compared as content.
+RULE_ORDER_FIELDS = frozenset({"priority"})
+
+
+def _fields(obj: Any, skip: frozenset) -> Dict[str, Any]:
+    data = canonical(obj)
+    if not isinstance(data, dict):
+        return {"value": data}
+    return {key: value for key, value in data.items() if key not in skip}
+
+
+def _digest(data: Any) -> str:
+    # ``data`` is already canonical, so content_hash's second pass over it can be skipped.
+    return hashlib.sha256(json.dumps(data, separators=(",", ":"), default=str).encode()).hexdigest()
+
+
+def rule_fields(rule: Any) -> Dict[str, Any]:
+    """A rule's canonical content: everything but timestamps, links and priority."""
+    return _fields(rule, VOLATILE_FIELDS | RULE_ORDER_FIELDS)
+
+
+@dataclass(frozen=True)
+class RuleFingerprint:
+    id: str
+    name: str
+    digest: str
+    rule: Any = field(compare=False, repr=False)
+
+
+@dataclass(frozen=True)
+class PolicyFingerprint:
+    id: str
+    name: str
+    digest: str
+    policy_digest: str
+    rules: Tuple[RuleFingerprint, ...]
+
+
+def fingerprint_policy(bundle: Any) -> PolicyFingerprint:
+    policy_digest = _digest(_fields(bundle.policy, VOLATILE_FIELDS))
+    rules = tuple(RuleFingerprint(rule.id, rule.name, _digest(rule_fields(rule)), rule) for rule in bundle.rules)
+    return PolicyFingerprint(
+        id=bundle.policy.id,
+        name=bundle.policy.name,
+        digest=_digest([policy_digest] + [rule.digest for rule in rules]),
+        policy_digest=policy_digest,
+        rules=rules,
+    )
+
+
+@dataclass
+class RuleChange:
+    """One rule ``added``, ``removed``, ``moved`` or ``modified`` (or both of the last two).
+
+    ``fields`` names the parts of a modified rule that changed, such as
+    ``conditions`` or ``actions``; ``action`` is ``[old, new]`` when the
+    rule's outcome flipped.
+    """
+
+    rule_id: str
+    rule_name: str
+    changes: List[str]
+    old_position: Optional[int] = None
+    new_position: Optional[int] = None
+    fields: List[str] = field(default_factory=list)
+    action: Optional[List[str]] = None
+
+
+@dataclass
+class PolicyChange:
+    """One policy ``added``, ``removed`` or ``modified``, with its rule changes."""
+
+    policy_type: str
+    policy_id: str
+    policy_name: str
+    change: str
+    policy_modified: bool = False
+    rules: List[RuleChange] = field(default_factory=list)
+
+
+@dataclass
+class ChangeSet:
+    """Every policy that differs between two snapshots, in new-snapshot order."""
+
+    policies: List[PolicyChange] = field(default_factory=list)
+    unchanged: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.policies)
+
+    def affected(self, policy_type: Optional[str] = None) -> Set[str]:
+        """Ids of the policies that were added or modified (removed ones can't be drawn)."""
+        return {
+            change.policy_id for change in self.policies
+            if change.change != "removed" and (policy_type is None or change.policy_type == policy_type)
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"unchanged": self.unchanged, "policies": [asdict(change) for change in self.policies]}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+
+def _describe(rule: Any) -> str:
+    """A rule's outcome, e.g. ``ALLOW+2FA`` or ``DENY``."""
+    action, steps = translate_actions(rule)
+    return "+".join([action] + steps)
+
+
+def _moved(old: List[str], new: List[str]) -> Set[str]:
+    """Rules whose order relative to the other common rules changed."""
+    kept = set()
+    for block in SequenceMatcher(None, old, new, autojunk=False).get_matching_blocks():
+        kept.update(new[block.b:block.b + block.size])
+    return set(new) - kept
+
+
+def diff_rules(old: PolicyFingerprint, new: PolicyFingerprint) -> List[RuleChange]:
+    old_rules = {rule.id: (position, rule) for position, rule in enumerate(old.rules)}
+    new_rules = {rule.id: (position, rule) for position, rule in enumerate(new.rules)}
+    common_old = [rule.id for rule in old.rules if rule.id in new_rules]
+    common_new = [rule.id for rule in new.rules if rule.id in old_rules]
+    moved = _moved(common_old, common_new)
+
+    changes = []
+    for position, rule in enumerate(new.rules):
+        if rule.id not in old_rules:
+            changes.append(RuleChange(rule.id, rule.name, ["added"], new_position=position))
+            continue
+        old_position, before = old_rules[rule.id]
+        change = RuleChange(rule.id, rule.name, [], old_position=old_position, new_position=position)
+        if rule.id in moved:
+            change.changes.append("moved")
+        if before.digest != rule.digest:
+            change.changes.append("modified")
+            # Only rules that changed are taken apart field by field.
+            old_fields, new_fields = rule_fields(before.rule), rule_fields(rule.rule)
+            change.fields = sorted(name for name in old_fields.keys() | new_fields.keys() if old_fields.get(name) != new_fields.get(name))
+            old_action, new_action = _describe(before.rule), _describe(rule.rule)
+            if old_action != new_action:
+                change.action = [old_action, new_action]
+        if change.changes:
+            changes.append(change)
+    for position, rule in enumerate(old.rules):
+        if rule.id not in new_rules:
+            changes.append(RuleChange(rule.id, rule.name, ["removed"], old_position=position))
+    return changes
+
+
+def _stamp(obj: Any, skip: frozenset) -> Any:
+    stamp = getattr(obj, "last_updated", None)
+    return stamp if stamp is not None else _digest(_fields(obj, skip))
+
+
+def rule_version(rule: Any) -> Any:
+    """A rule's lastUpdated stamp, or a hash of its content when it has none."""
+    return _stamp(rule, VOLATILE_FIELDS | RULE_ORDER_FIELDS)
+
+
+def policy_version(bundle: Any) -> Tuple[Any, ...]:
+    """Changes whenever a policy, or any of its rules or their order, does.
+
+    Built from lastUpdated stamps, which Okta moves on every edit; a policy
+    or rule without one contributes its content hash instead.
+    """
+    policy = bundle.policy
+    return (
+        (policy.id, policy.name, _stamp(policy, VOLATILE_FIELDS)),
+        tuple((rule.id, rule_version(rule)) for rule in bundle.rules),
+    )
+
+
+def diff_snapshots(old: Mapping[str, Any], new: Mapping[str, Any], policy_type: str = "") -> ChangeSet:
+    """Changes from ``old`` to ``new``, each ``{policy id: PolicyBundle}`` as ``get_okta_policies`` returns."""
+    changes = ChangeSet()
+    for policy_id, bundle in new.items():
+        if policy_id not in old:
+            change = PolicyChange(policy_type, policy_id, bundle.policy.name, "added")
+            change.rules = [
+                RuleChange(rule.id, rule.name, ["added"], new_position=position) for position, rule in enumerate(bundle.rules)
+            ]
+            changes.policies.append(change)
+            continue
+        # Okta stamps every edit, so matching stamps mean nothing to hash.
+        if policy_version(bundle) == policy_version(old[policy_id]):
+            changes.unchanged += 1
+            continue
+        before, after = fingerprint_policy(old[policy_id]), fingerprint_policy(bundle)
+        if before.digest == after.digest:
+            changes.unchanged += 1
+            continue
+        changes.policies.append(PolicyChange(
+            policy_type, policy_id, after.name, "modified",
+            policy_modified=before.policy_digest != after.policy_digest,
+            rules=diff_rules(before, after),
+        ))
+    for policy_id, bundle in old.items():
+        if policy_id not in new:
+            changes.policies.append(PolicyChange(policy_type, policy_id, bundle.policy.name, "removed"))
+    return changes
+
+
+def merge(*change_sets: ChangeSet) -> ChangeSet:
+    merged = ChangeSet()
+    for change_set in change_sets:
+        merged.policies.extend(change_set.policies)
+        merged.unchanged += change_set.unchanged
+    return merged
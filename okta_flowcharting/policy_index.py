@@ -0,0 +1,148 @@
+"""Which policies and rules reference a group, user, zone, user type or platform.
+
+:class:`PolicyIndex` is built once from ``get_okta_policies`` snapshots and
+answers "what breaks if this object goes away?" with a dictionary lookup
+instead of a walk over every rule. Re-indexing one policy after its rules
+are refreshed touches only that policy's entries.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
+
+from .policy_diff import policy_version
+from .policy_translation import ALL_ZONES, translate_conditions
+
+# Condition types whose values are ids (or platform names) of objects.
+REFERENCE_KINDS = ("group", "user", "user_type", "zone", "platform")
+
+# (kind, object id)
+ObjectKey = Tuple[str, str]
+
+
+@dataclass(frozen=True)
+class Reference:
+    """One policy, or one of its rules, including or excluding an object.
+
+    ``rule_id`` is None, and ``position`` -1, for the policy's own
+    conditions (a global session policy's groups).
+    """
+
+    policy_type: str
+    policy_id: str
+    policy_name: str
+    rule_id: Optional[str]
+    rule_name: Optional[str]
+    position: int
+    operator: str
+
+    def sort_key(self) -> Tuple[str, str, int, str]:
+        return (self.policy_type, self.policy_id, self.position, self.operator)
+
+
+def object_references(obj: Any) -> Iterator[Tuple[str, str, str]]:
+    """``(kind, operator, object id)`` for each object a rule's or policy's conditions name.
+
+    Conditions are read as :func:`~okta_flowcharting.policy_translation.translate_conditions`
+    reads them; "all zones" names no zone.
+    """
+    for condition in translate_conditions(obj):
+        if condition.condition_type not in REFERENCE_KINDS:
+            continue
+        for value in condition.values:
+            if value != ALL_ZONES:
+                yield condition.condition_type, condition.operator, value
+
+
+class PolicyIndex:
+    """Reverse index from referenced objects to the policies and rules that name them.
+
+    Every rule is indexed, inactive ones included, since deleting an object
+    they name still breaks them.
+    """
+
+    def __init__(self) -> None:
+        self._by_object: Dict[ObjectKey, Set[Reference]] = {}
+        # (policy type, policy id) -> (version, indexed entries), for incremental updates.
+        self._by_policy: Dict[Tuple[str, str], Tuple[Tuple[Any, ...], List[Tuple[ObjectKey, Reference]]]] = {}
+
+    @classmethod
+    def build(cls, snapshots: Mapping[str, Mapping[str, Any]]) -> "PolicyIndex":
+        """Index ``{policy type: get_okta_policies(...) snapshot}``."""
+        index = cls()
+        for policy_type, bundles in snapshots.items():
+            index.update_snapshot(policy_type, bundles)
+        return index
+
+    def update_policy(self, policy_type: str, bundle: Any) -> bool:
+        """(Re-)index one policy's :class:`~okta_flowcharting.okta_data.PolicyBundle`.
+
+        Returns False, and does nothing, when its rules haven't changed since
+        it was last indexed.
+        """
+        policy = bundle.policy
+        version = policy_version(bundle)
+        indexed = self._by_policy.get((policy_type, policy.id))
+        if indexed is not None and indexed[0] == version:
+            return False
+        self.remove_policy(policy_type, policy.id)
+        entries = []
+        owners: List[Tuple[Optional[Any], int]] = [(None, -1)] + [(rule, position) for position, rule in enumerate(bundle.rules)]
+        for rule, position in owners:
+            for kind, operator, object_id in object_references(rule if rule is not None else policy):
+                reference = Reference(
+                    policy_type=policy_type,
+                    policy_id=policy.id,
+                    policy_name=policy.name,
+                    rule_id=rule.id if rule is not None else None,
+                    rule_name=rule.name if rule is not None else None,
+                    position=position,
+                    operator=operator,
+                )
+                key = (kind, object_id)
+                self._by_object.setdefault(key, set()).add(reference)
+                entries.append((key, reference))
+        self._by_policy[(policy_type, policy.id)] = (version, entries)
+        return True
+
+    def remove_policy(self, policy_type: str, policy_id: str) -> None:
+        indexed = self._by_policy.pop((policy_type, policy_id), None)
+        if indexed is None:
+            return
+        for key, reference in indexed[1]:
+            references = self._by_object.get(key)
+            if references is None:
+                continue
+            references.discard(reference)
+            if not references:
+                del self._by_object[key]
+
+    def update_snapshot(self, policy_type: str, bundles: Mapping[str, Any]) -> int:
+        """Bring ``policy_type``'s policies in line with a fresh snapshot.
+
+        Only changed policies are re-indexed, and policies gone from the
+        snapshot are dropped. Returns how many policies were re-indexed.
+        """
+        gone = [policy_id for kind, policy_id in self._by_policy if kind == policy_type and policy_id not in bundles]
+        for policy_id in gone:
+            self.remove_policy(policy_type, policy_id)
+        return sum(self.update_policy(policy_type, bundle) for bundle in bundles.values())
+
+    def references(self, kind: str, object_id: str) -> List[Reference]:
+        """Every policy and rule that includes or excludes the object, in policy then rule order."""
+        return sorted(self._by_object.get((kind, object_id), ()), key=Reference.sort_key)
+
+    def is_referenced(self, kind: str, object_id: str) -> bool:
+        return (kind, object_id) in self._by_object
+
+    def policies(self, kind: str, object_id: str) -> List[str]:
+        """Ids of the policies that reference the object, in order."""
+        return list(dict.fromkeys(reference.policy_id for reference in self.references(kind, object_id)))
+
+    def referenced_ids(self, kind: str) -> Set[str]:
+        """Every id of ``kind`` some policy references, e.g. to find ones no longer in the directory."""
+        return {object_id for referenced_kind, object_id in self._by_object if referenced_kind == kind}
+
+    def unreferenced(self, kind: str, object_ids: Iterable[str]) -> List[str]:
+        """Those of ``object_ids`` that no policy references, so are safe to delete."""
+        return [object_id for object_id in object_ids if (kind, object_id) not in self._by_object]
@@ -1,7 +1,92 @@
 from __future__ import annotations
 
+from collections import OrderedDict
+from collections.abc import Set as AbstractSet
 from dataclasses import dataclass, field
-from typing import Callable, List, Any
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for vectorised batch evaluation
+    np = None
+
+
+SET_OPERATORS = ("include", "exclude")
+
+# UserContext field each condition type reads, used to build cache signatures.
+CONTEXT_FIELDS: Dict[str, str] = {
+    "group": "groups",
+    "user_type": "user_type",
+    "zone": "zones",
+    "user": "user_id",
+    "device_registered": "device_registered",
+    "device_managed": "device_managed",
+    "platform": "platform",
+    "risk": "risk_level",
+}
+
+# Condition types whose include/exclude semantics are built into ``test``.
+SET_CONDITIONS = ("group", "user_type", "zone", "user")
+
+# Journey of a user a policy isn't assigned to, e.g. a global session policy for other groups.
+NOT_ASSIGNED = "NOT_ASSIGNED"
+
+# Interned form of each context field on UserContext.
+_INTERNED_FIELDS: Dict[str, str] = {
+    "groups": "group_ids",
+    "user_type": "user_type_ids",
+    "zones": "zone_ids",
+}
+
+
+class Interner:
+    """Table mapping identifiers (groups, zones, user types) to small ints.
+
+    A single shared table, ``INTERNER``, lets contexts and conditions store
+    frozensets of ints instead of their own copies of identifier strings.
+    Ids are only meaningful inside the process that interned them.
+    """
+
+    __slots__ = ("_ids", "_names")
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+
+    def intern(self, name: str) -> int:
+        ident = self._ids.get(name)
+        if ident is None:
+            ident = self._ids[name] = len(self._names)
+            self._names.append(name)
+        return ident
+
+    def intern_all(self, names: Iterable[str]) -> FrozenSet[int]:
+        return frozenset(self.intern(name) for name in names)
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Return the id of ``name`` without interning it."""
+        return self._ids.get(name)
+
+    def name(self, ident: int) -> str:
+        return self._names[ident]
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+INTERNER = Interner()
+
+
+def context_ids(context: Any, field_name: str) -> FrozenSet[int]:
+    """Interned ids of a context field (``groups``, ``zones`` or ``user_type``).
+
+    UserContext keeps these precomputed; other objects are interned on the fly.
+    """
+    ids = getattr(context, _INTERNED_FIELDS[field_name], None)
+    if ids is None:
+        names = getattr(context, field_name, None) or ()
+        ids = INTERNER.intern_all([names] if isinstance(names, str) else names)
+    return ids
 
 
 @dataclass
@@ -11,14 +96,46 @@ class PolicyConditionModel:
     condition_type: str
     operator: str
     values: List[str]
+    _value_ids: Optional[FrozenSet[int]] = field(default=None, init=False, repr=False, compare=False)
 
-    def test(self, rule: Any) -> bool:
-        """Evaluate this condition against an Okta rule.
+    @property
+    def value_ids(self) -> FrozenSet[int]:
+        """``values`` interned into ``INTERNER``, computed on first use."""
+        if self._value_ids is None:
+            self._value_ids = INTERNER.intern_all(self.values)
+        return self._value_ids
 
-        The default implementation simply returns True. Custom logic can be
-        injected to check real Okta rule objects when available.
+    def __getstate__(self) -> Dict[str, Any]:
+        # Interned ids are process-local; re-intern after unpickling.
+        return {**vars(self), "_value_ids": None}
+
+    @property
+    def is_builtin(self) -> bool:
+        """True when the built-in ``test`` gives this condition real semantics."""
+        return self.condition_type in SET_CONDITIONS and self.operator in SET_OPERATORS
+
+    def test(self, context: Any) -> bool:
+        """Evaluate this condition against a user context.
+
+        Group, user type, zone and user ``include``/``exclude`` conditions
+        check the matching context field against interned ids; any other
+        condition returns True. Custom logic can be injected by assigning
+        ``test`` on the instance.
         """
-        return True
+        if not self.is_builtin:
+            return True
+        name = CONTEXT_FIELDS[self.condition_type]
+        if name in _INTERNED_FIELDS:
+            member = not self.value_ids.isdisjoint(context_ids(context, name))
+        else:
+            ids = self.value_ids  # interns our values first, so the lookup can find them
+            member = INTERNER.lookup(getattr(context, name, None)) in ids
+        return member if self.operator == "include" else not member
+
+    @property
+    def has_custom_test(self) -> bool:
+        """True when ``test`` was replaced on the instance or in a subclass."""
+        return "test" in vars(self) or type(self).test is not PolicyConditionModel.test
 
 
 @dataclass
@@ -55,23 +172,409 @@ class AssuranceLevel:
 
 @dataclass
 class AuthenticationPolicyModel:
-    """Collection of rules representing a complete policy."""
+    """Collection of rules representing a complete policy.
+
+    ``conditions`` are the policy's own, such as a global session policy's
+    group assignment. Users they reject never reach the rules, and get
+    ``[NOT_ASSIGNED]``.
+    """
 
     name: str
     rules: List[PolicyRuleModel] = field(default_factory=list)
     default_action: str = "DENY"
+    conditions: List[PolicyConditionModel] = field(default_factory=list)
+
+    def assigned(self, context: Any) -> bool:
+        return all(cond.test(context) for cond in self.conditions)
 
     def evaluate(self, context: Any) -> List[str]:
         """Evaluate the policy and return the user's journey steps."""
+        if not self.assigned(context):
+            return [NOT_ASSIGNED]
         for rule in self.rules:
             if all(cond.test(context) for cond in rule.conditions):
                 return rule.steps + [rule.action]
         return [self.default_action]
 
+    def compile(self) -> "CompiledPolicy":
+        """Build an indexed snapshot of this policy for repeated evaluation."""
+        return CompiledPolicy(self)
+
+    def evaluate_many(self, contexts: Sequence[Any]) -> List[List[str]]:
+        """Evaluate a batch of contexts, returning one journey per context."""
+        return self.compile().evaluate_many(contexts)
+
+
+class CompiledPolicy:
+    """Indexed form of an :class:`AuthenticationPolicyModel`.
+
+    Rule ``i`` is bit ``i`` of an integer mask. Built-in group include and
+    exclude conditions become maps from interned group id to the rules they
+    admit or reject, so evaluating a context is an OR per group, one AND and
+    a lowest-set-bit lookup. Conditions that can't be indexed (custom
+    ``test`` callables, user type and zone checks, or a rule's second group
+    include) are tested per context, and only for candidate rules ahead of
+    the first indexed match. Later edits to the policy are not seen; compile
+    again after changing it.
+    """
+
+    def __init__(self, policy: AuthenticationPolicyModel):
+        self.policy = policy
+        self.outcomes = [rule.steps + [rule.action] for rule in policy.rules]
+        self.default = [policy.default_action]
+        self.include: Dict[int, int] = {}
+        self.exclude: Dict[int, int] = {}
+        self.unconstrained = 0
+        self.residual: Dict[int, List[PolicyConditionModel]] = {}
+        self.residual_mask = 0
+
+        for index, rule in enumerate(policy.rules):
+            bit = 1 << index
+            included = False
+            residual: List[PolicyConditionModel] = []
+            for cond in rule.conditions:
+                if cond.has_custom_test:
+                    residual.append(cond)
+                elif not cond.is_builtin:
+                    continue
+                elif cond.condition_type != "group":
+                    residual.append(cond)
+                elif cond.operator == "exclude":
+                    for group in cond.value_ids:
+                        self.exclude[group] = self.exclude.get(group, 0) | bit
+                elif included:
+                    residual.append(cond)
+                else:
+                    included = True
+                    for group in cond.value_ids:
+                        self.include[group] = self.include.get(group, 0) | bit
+            if not included:
+                self.unconstrained |= bit
+            if residual:
+                self.residual[index] = residual
+                self.residual_mask |= bit
+
+    def evaluate(self, context: Any) -> List[str]:
+        """Return the same journey steps as ``AuthenticationPolicyModel.evaluate``."""
+        if not self.policy.assigned(context):
+            return [NOT_ASSIGNED]
+        candidates = self.candidates(context)
+        while candidates:
+            lowest = candidates & -candidates
+            index = lowest.bit_length() - 1
+            if not lowest & self.residual_mask or all(cond.test(context) for cond in self.residual[index]):
+                return list(self.outcomes[index])
+            candidates ^= lowest
+        return list(self.default)
+
+    def evaluate_many(self, contexts: Sequence[Any]) -> List[List[str]]:
+        """Evaluate a batch of contexts in one pass.
+
+        With NumPy available, group membership becomes a users x groups
+        boolean matrix and every rule's indexed conditions are resolved with
+        two matrix products. Residual conditions are then tested row by row
+        for just their rules, and only on rows no earlier rule has claimed,
+        before one ``argmax`` picks each user's first matching rule. Without
+        NumPy this falls back to ``evaluate`` per context. Contexts the
+        policy isn't assigned to are left out of the batch.
+        """
+        if self.policy.conditions:
+            assigned = [self.policy.assigned(context) for context in contexts]
+            journeys = iter(self._evaluate_many([context for context, ok in zip(contexts, assigned) if ok]))
+            return [next(journeys) if ok else [NOT_ASSIGNED] for ok in assigned]
+        return self._evaluate_many(contexts)
+
+    def _evaluate_many(self, contexts: Sequence[Any]) -> List[List[str]]:
+        if np is None or not contexts:
+            return [self.evaluate(context) for context in contexts]
+
+        rules = len(self.outcomes)
+        matches = np.empty((len(contexts), rules + 1), dtype=bool)
+        matches[:, :rules] = self._mask_bits(self.unconstrained, rules)
+        matches[:, rules] = True
+        if self.include or self.exclude:
+            columns = {group: column for column, group in enumerate({**self.include, **self.exclude})}
+            rows: List[int] = []
+            cols: List[int] = []
+            for row, context in enumerate(contexts):
+                for group in context_ids(context, "groups"):
+                    column = columns.get(group)
+                    if column is not None:
+                        rows.append(row)
+                        cols.append(column)
+            # float32 so the products below go through BLAS
+            membership = np.zeros((len(contexts), len(columns)), dtype=np.float32)
+            membership[rows, cols] = 1
+            admitted = membership @ self._group_matrix(self.include, columns, rules)
+            rejected = membership @ self._group_matrix(self.exclude, columns, rules)
+            matches[:, :rules] |= admitted > 0
+            matches[:, :rules] &= rejected == 0
+
+        claimed = np.zeros(len(contexts), dtype=bool)
+        for index in range(rules):
+            if index in self.residual:
+                conditions = self.residual[index]
+                for row in np.flatnonzero(matches[:, index] & ~claimed):
+                    if not all(cond.test(contexts[row]) for cond in conditions):
+                        matches[row, index] = False
+            claimed |= matches[:, index]
+
+        journeys = self.outcomes + [self.default]
+        return [list(journeys[index]) for index in matches.argmax(axis=1)]
+
+    @staticmethod
+    def _mask_bits(mask: int, width: int) -> "np.ndarray":
+        return np.array([bool(mask >> index & 1) for index in range(width)], dtype=bool)
+
+    @classmethod
+    def _group_matrix(cls, masks: Dict[int, int], columns: Dict[int, int], width: int) -> "np.ndarray":
+        """Groups x rules 0/1 matrix of a group -> rule-mask map."""
+        matrix = np.zeros((len(columns), width), dtype=np.float32)
+        for group, mask in masks.items():
+            matrix[columns[group]] = cls._mask_bits(mask, width)
+        return matrix
+
+    def candidates(self, context: Any) -> int:
+        """Mask of rules whose indexed group conditions ``context`` satisfies."""
+        if not self.include and not self.exclude:
+            return self.unconstrained
+        admitted = self.unconstrained
+        rejected = 0
+        for group in context_ids(context, "groups"):
+            admitted |= self.include.get(group, 0)
+            rejected |= self.exclude.get(group, 0)
+        return admitted & ~rejected
+
+
+class EvaluationCache:
+    """Bounded LRU memo of journeys for one policy.
+
+    Entries are keyed on a signature of just the context fields the policy's
+    conditions read (see ``CONTEXT_FIELDS``), so users sharing the same
+    relevant groups share one evaluation. Built-in group conditions only
+    contribute the groups they name, which keeps unrelated memberships out of
+    the key. A policy with a custom condition of unknown type can't be keyed
+    safely; every call is then evaluated directly and counted as a miss.
+    """
+
+    def __init__(self, policy: Union[AuthenticationPolicyModel, CompiledPolicy], maxsize: int = 4096):
+        self.compiled = policy if isinstance(policy, CompiledPolicy) else policy.compile()
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, List[str]]" = OrderedDict()
+        self._signature = _signature_builder(self.compiled.policy)
+
+    @property
+    def enabled(self) -> bool:
+        return self._signature is not None
+
+    def signature(self, context: Any) -> Optional[Hashable]:
+        return self._signature(context) if self._signature is not None else None
+
+    def evaluate(self, context: Any) -> List[str]:
+        return self.evaluate_many([context])[0]
+
+    def evaluate_many(self, contexts: Sequence[Any]) -> List[List[str]]:
+        """Evaluate a batch, running the policy once per uncached signature."""
+        if self._signature is None:
+            self.misses += len(contexts)
+            return self.compiled.evaluate_many(contexts)
+
+        keys = [self._signature(context) for context in contexts]
+        found: Dict[Hashable, List[str]] = {}
+        missing: Dict[Hashable, Any] = {}
+        for key, context in zip(keys, contexts):
+            if key in found or key in missing:
+                continue
+            steps = self._entries.get(key)
+            if steps is None:
+                missing[key] = context
+            else:
+                self._entries.move_to_end(key)
+                found[key] = steps
+        if missing:
+            for key, steps in zip(missing, self.compiled.evaluate_many(list(missing.values()))):
+                found[key] = steps
+                self._store(key, steps)
+        self.misses += len(missing)
+        self.hits += len(contexts) - len(missing)
+        return [list(found[key]) for key in keys]
+
+    def _store(self, key: Hashable, steps: List[str]) -> None:
+        self._entries[key] = steps
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def info(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+
+def _signature_builder(policy: AuthenticationPolicyModel) -> Optional[Callable[[Any], Hashable]]:
+    """Return a function mapping a context to its cache key, or None if unsafe."""
+    referenced: Dict[str, Set[int]] = {}
+    whole: Set[str] = set()
+    for conditions in [policy.conditions] + [rule.conditions for rule in policy.rules]:
+        for cond in conditions:
+            name = CONTEXT_FIELDS.get(cond.condition_type)
+            if name is None:
+                if cond.has_custom_test:
+                    return None
+                continue  # built-in test of an unknown type always passes
+            if cond.has_custom_test:
+                whole.add(name)
+            elif cond.is_builtin:
+                referenced.setdefault(name, set()).update(cond.value_ids)
+    names = sorted(whole | set(referenced))
+
+    def signature(context: Any) -> Hashable:
+        key: List[Hashable] = []
+        for name in names:
+            if name in _INTERNED_FIELDS:
+                ids = context_ids(context, name)
+                key.append(ids if name in whole else ids.intersection(referenced[name]))
+            elif name in whole:
+                key.append(getattr(context, name, None))
+            else:
+                ident = INTERNER.lookup(getattr(context, name, None))
+                key.append(ident if ident in referenced[name] else None)
+        return tuple(key)
+
+    return signature
+
+
+class NameSet(AbstractSet):
+    """Read-only set of identifier names backed by interned ids."""
+
+    __slots__ = ("ids",)
+
+    def __init__(self, ids: FrozenSet[int]):
+        self.ids = ids
+
+    def __contains__(self, name: object) -> bool:
+        return isinstance(name, str) and INTERNER.lookup(name) in self.ids
+
+    def __iter__(self) -> Iterator[str]:
+        return (INTERNER.name(ident) for ident in self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __repr__(self) -> str:
+        return f"NameSet({sorted(self)!r})"
+
 
-@dataclass
 class UserContext:
-    """Simple user representation for testing policy flows."""
+    """Compact user representation for evaluating policy flows.
+
+    Groups, zones and the user type are interned into ``INTERNER`` and kept
+    as frozensets of small ints, so contexts share identifier strings and
+    built-in conditions check membership with a single set operation.
+    ``groups`` and ``zones`` read back as set-like views of names. The
+    remaining fields describe the sign-in itself: the device's platform
+    (an Okta OS type such as ``IOS``), whether the device is registered or
+    managed, and the risk level Okta assigned.
+    """
+
+    __slots__ = (
+        "username",
+        "group_ids",
+        "zone_ids",
+        "user_type_ids",
+        "user_id",
+        "platform",
+        "device_registered",
+        "device_managed",
+        "risk_level",
+    )
+
+    def __init__(
+        self,
+        username: str,
+        groups: Iterable[str] = (),
+        zones: Iterable[str] = (),
+        user_type: Optional[str] = None,
+        user_id: Optional[str] = None,
+        platform: Optional[str] = None,
+        device_registered: bool = False,
+        device_managed: bool = False,
+        risk_level: Optional[str] = None,
+    ):
+        self.username = username
+        self.groups = groups
+        self.zones = zones
+        self.user_type = user_type
+        self.user_id = user_id
+        self.platform = platform
+        self.device_registered = device_registered
+        self.device_managed = device_managed
+        self.risk_level = risk_level
+
+    @property
+    def groups(self) -> NameSet:
+        return NameSet(self.group_ids)
+
+    @groups.setter
+    def groups(self, names: Iterable[str]) -> None:
+        self.group_ids = INTERNER.intern_all(names)
+
+    @property
+    def zones(self) -> NameSet:
+        return NameSet(self.zone_ids)
+
+    @zones.setter
+    def zones(self, names: Iterable[str]) -> None:
+        self.zone_ids = INTERNER.intern_all(names)
+
+    @property
+    def user_type(self) -> Optional[str]:
+        return next(iter(NameSet(self.user_type_ids)), None)
+
+    @user_type.setter
+    def user_type(self, name: Optional[str]) -> None:
+        self.user_type_ids = INTERNER.intern_all([name] if name is not None else [])
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, UserContext):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def _key(self) -> Tuple[Any, ...]:
+        return (
+            self.username,
+            self.group_ids,
+            self.zone_ids,
+            self.user_type_ids,
+            self.user_id,
+            self.platform,
+            self.device_registered,
+            self.device_managed,
+            self.risk_level,
+        )
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Interned ids are process-local, so pickle the names.
+        return (
+            UserContext,
+            (
+                self.username,
+                list(self.groups),
+                list(self.zones),
+                self.user_type,
+                self.user_id,
+                self.platform,
+                self.device_registered,
+                self.device_managed,
+                self.risk_level,
+            ),
+        )
 
-    username: str
-    groups: List[str] = field(default_factory=list)
+    def __repr__(self) -> str:
+        return f"UserContext(username={self.username!r}, groups={sorted(self.groups)!r})"
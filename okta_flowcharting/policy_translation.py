@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+from functools import partial
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+from .policy_models import (
+    SET_OPERATORS,
+    AuthenticationPolicyModel,
+    PolicyConditionModel,
+    PolicyRuleModel,
+    context_ids,
+)
+from .sdk_models import attr_path
+
+ALL_ZONES = "ALL_ZONES"
+ANY = "ANY"
+
+# Okta platform type of each OS type a UserContext.platform can hold.
+PLATFORM_TYPES: Dict[str, str] = {
+    "IOS": "MOBILE",
+    "ANDROID": "MOBILE",
+    "WINDOWS": "DESKTOP",
+    "MACOS": "DESKTOP",
+    "OSX": "DESKTOP",
+    "CHROMEOS": "DESKTOP",
+}
+
+# (policy id, rule id, rule version) - a rule's model is reused while this holds.
+RuleKey = Tuple[str, str, Any]
+
+
+# Predicates are module-level functions bound with ``partial`` rather than
+# closures, so translated policies still pickle for spawned worker pools.
+def _in_some_zone(expected: bool, context: Any) -> bool:
+    return bool(context_ids(context, "zones")) is expected
+
+
+def _flag_set(field_name: str, context: Any) -> bool:
+    return bool(getattr(context, field_name, False))
+
+
+def _platform_in(platforms: FrozenSet[str], include: bool, context: Any) -> bool:
+    platform = getattr(context, "platform", None)
+    matched = platform is not None and (
+        ANY in platforms or platform in platforms or PLATFORM_TYPES.get(platform) in platforms
+    )
+    return matched is include
+
+
+def _risk_is(level: str, context: Any) -> bool:
+    return getattr(context, "risk_level", None) == level
+
+
+def _predicate(condition_type: str, operator: str, values: List[str], test: Any) -> PolicyConditionModel:
+    cond = PolicyConditionModel(condition_type, operator, values)
+    cond.test = test
+    return cond
+
+
+def _set_conditions(condition_type: str, source: Any) -> List[PolicyConditionModel]:
+    conditions = []
+    for operator in SET_OPERATORS:
+        values = getattr(source, operator, None) if source is not None else None
+        if values:
+            conditions.append(PolicyConditionModel(condition_type, operator, list(values)))
+    return conditions
+
+
+def _zone_conditions(network: Any) -> List[PolicyConditionModel]:
+    conditions = []
+    # Exclusions first, matching the order extract_access_rule_conditions draws them.
+    for operator in reversed(SET_OPERATORS):
+        zones = getattr(network, operator, None) if network is not None else None
+        if not zones:
+            continue
+        if ALL_ZONES in zones:
+            conditions.append(_predicate("zone", operator, [ALL_ZONES], partial(_in_some_zone, operator == "include")))
+        else:
+            conditions.append(PolicyConditionModel("zone", operator, list(zones)))
+    return conditions
+
+
+def _platform_conditions(platform: Any) -> List[PolicyConditionModel]:
+    conditions = []
+    for operator in SET_OPERATORS:
+        entries = getattr(platform, operator, None) if platform is not None else None
+        if not entries:
+            continue
+        names = []
+        for entry in entries:
+            os_type = attr_path(entry, "os", "type")
+            names.append(os_type if os_type and os_type != ANY else attr_path(entry, "type") or ANY)
+        test = partial(_platform_in, frozenset(names), operator == "include")
+        conditions.append(_predicate("platform", operator, names, test))
+    return conditions
+
+
+def translate_conditions(rule: Any) -> List[PolicyConditionModel]:
+    """Compile the conditions of an SDK policy rule into condition models.
+
+    Groups, users, user types and named zones become built-in set conditions;
+    "any zone", device, platform and risk checks get predicates bound to the
+    rule's values. Custom expressions are kept as ``expression`` conditions
+    that always pass, since Okta expression language isn't evaluated here.
+    """
+    conds = attr_path(rule, "conditions")
+    conditions: List[PolicyConditionModel] = []
+    conditions += _set_conditions("user_type", attr_path(conds, "user_type"))
+    conditions += _set_conditions("group", attr_path(conds, "people", "groups"))
+    conditions += _set_conditions("user", attr_path(conds, "people", "users"))
+    if attr_path(conds, "device", "registered"):
+        conditions.append(_predicate("device_registered", "eq", ["true"], partial(_flag_set, "device_registered")))
+    if attr_path(conds, "device", "managed"):
+        conditions.append(_predicate("device_managed", "eq", ["true"], partial(_flag_set, "device_managed")))
+    conditions += _platform_conditions(attr_path(conds, "platform"))
+    conditions += _zone_conditions(attr_path(conds, "network"))
+    risk_level = attr_path(conds, "risk_score", "level")
+    if risk_level and risk_level != ANY:
+        conditions.append(_predicate("risk", "eq", [risk_level], partial(_risk_is, risk_level)))
+    expression = attr_path(conds, "el_condition", "condition")
+    if expression:
+        conditions.append(PolicyConditionModel("expression", "el", [expression]))
+    return conditions
+
+
+def translate_actions(rule: Any) -> Tuple[str, List[str]]:
+    """Return the ``(action, steps)`` of an access or global session policy rule."""
+    app_sign_on = attr_path(rule, "actions", "app_sign_on")
+    if app_sign_on is not None:
+        access = app_sign_on.access or "DENY"
+        factor_mode = attr_path(app_sign_on, "verification_method", "factor_mode")
+        return access, [factor_mode] if access == "ALLOW" and factor_mode else []
+    signon = attr_path(rule, "actions", "signon")
+    if signon is not None:
+        access = signon.access or "DENY"
+        return access, ["mfa"] if access == "ALLOW" and signon.require_factor else []
+    return "DENY", []
+
+
+def translate_rule(rule: Any) -> PolicyRuleModel:
+    action, steps = translate_actions(rule)
+    return PolicyRuleModel(id=rule.id, name=rule.name, conditions=translate_conditions(rule), action=action, steps=steps)
+
+
+def _active_rules(rules: Iterable[Any]) -> List[Any]:
+    return [rule for rule in rules if getattr(rule, "status", "ACTIVE") != "INACTIVE"]
+
+
+def translate_policy(bundle: Any) -> AuthenticationPolicyModel:
+    """Translate a :class:`~okta_flowcharting.okta_data.PolicyBundle`, skipping inactive rules.
+
+    The policy's own conditions (a global session policy's group
+    assignment) gate its rules.
+    """
+    return AuthenticationPolicyModel(
+        name=bundle.policy.name,
+        rules=[translate_rule(rule) for rule in _active_rules(bundle.rules)],
+        conditions=translate_conditions(bundle.policy),
+    )
+
+
+class PolicyTranslator:
+    """Translate policy snapshots once and reuse the models across refreshes.
+
+    Rule models are cached by policy id, rule id and the rule's
+    ``lastUpdated``, or its content hash when it has none, so a refreshed
+    snapshot only retranslates rules that changed, and a policy whose rules
+    are all unchanged gets back the same
+    :class:`AuthenticationPolicyModel` object. Calling :meth:`translate` again
+    with the same snapshot returns the cached result outright.
+    """
+
+    def __init__(self) -> None:
+        self.translated = 0
+        self._rules: Dict[RuleKey, PolicyRuleModel] = {}
+        self._policies: Dict[str, Tuple[Tuple[Any, ...], AuthenticationPolicyModel]] = {}
+        self._snapshot: Optional[Mapping[str, Any]] = None
+        self._models: Dict[str, AuthenticationPolicyModel] = {}
+
+    def _rule(self, policy_id: str, rule: Any) -> PolicyRuleModel:
+        # policy_diff imports this module, so its helpers are imported on use.
+        from .policy_diff import rule_version
+
+        key = (policy_id, rule.id, rule_version(rule))
+        model = self._rules.get(key)
+        if model is None:
+            model = self._rules[key] = translate_rule(rule)
+            self.translated += 1
+        return model
+
+    def translate_policy(self, bundle: Any) -> AuthenticationPolicyModel:
+        from .policy_diff import policy_version
+
+        policy = bundle.policy
+        rules = _active_rules(bundle.rules)
+        version = policy_version(bundle)
+        cached = self._policies.get(policy.id)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        model = AuthenticationPolicyModel(
+            name=policy.name,
+            rules=[self._rule(policy.id, rule) for rule in rules],
+            conditions=translate_conditions(policy),
+        )
+        self._policies[policy.id] = (version, model)
+        return model
+
+    def translate(self, bundles: Mapping[str, Any]) -> Dict[str, AuthenticationPolicyModel]:
+        """Translate a ``get_okta_policies`` snapshot, keyed by policy id."""
+        if bundles is self._snapshot:
+            return self._models
+        models = {policy_id: self.translate_policy(bundle) for policy_id, bundle in bundles.items()}
+        # Forget policies and rule versions that are no longer in the snapshot.
+        self._policies = {policy_id: self._policies[policy_id] for policy_id in models}
+        live = {(policy_id, *rule) for policy_id, ((*_, rules), _) in self._policies.items() for rule in rules}
+        self._rules = {key: rule for key, rule in self._rules.items() if key in live}
+        self._snapshot, self._models = bundles, models
+        return models
@@ -0,0 +1,206 @@
+"""Pace Okta API requests by the rate-limit headers each response carries.
+
+Okta limits requests per endpoint and reports the budget left in the
+current window on every response (``X-Rate-Limit-Limit``,
+``X-Rate-Limit-Remaining``, ``X-Rate-Limit-Reset``). :class:`RateLimitScheduler`
+tracks that budget per endpoint family, lets as many requests run at once
+as the budget allows, and holds requests back until the window resets
+when it runs out or Okta answers 429 - sleeping exactly that long, never a
+fixed backoff.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from . import metrics
+from .metrics import endpoint_family
+
+TOO_MANY_REQUESTS = 429
+
+# Share of each endpoint's limit left unused, for the org's own sign-in traffic.
+DEFAULT_HEADROOM = 0.1
+# Requests let through per endpoint before its first response reports a budget.
+DEFAULT_INITIAL_CONCURRENCY = 2
+DEFAULT_MAX_CONCURRENCY = 32
+# 429s retried here after the window resets, before the SDK sees one.
+DEFAULT_MAX_RETRIES = 3
+# Seconds to wait when Okta gives no reset time, and to trust an assumed new window.
+ROLLOVER_GRACE = 1.0
+
+
+@dataclass
+class Budget:
+    """What is known about one endpoint family's rate-limit window.
+
+    ``remaining`` counts down as requests are sent, and is corrected by
+    every response. ``window`` is the window's ``X-Rate-Limit-Reset``
+    epoch; the other times are :func:`time.monotonic` deadlines.
+    """
+
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    window: float = 0.0
+    reset_at: float = 0.0
+    blocked_until: float = 0.0
+    in_flight: int = 0
+    changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+
+def _header(headers: Any, name: str) -> Optional[str]:
+    if not headers:
+        return None
+    value = headers.get(name)
+    return value if value is not None else headers.get(name.lower())
+
+
+def _reset_delay(headers: Any, reset: str) -> float:
+    """Seconds until an ``X-Rate-Limit-Reset`` epoch, measured on Okta's clock when it says."""
+    date = _header(headers, "Date")
+    try:
+        now = parsedate_to_datetime(date).timestamp() if date else time.time()
+    except (TypeError, ValueError):
+        now = time.time()
+    return max(0.0, float(reset) - now)
+
+
+class RateLimitScheduler:
+    """Admit requests per endpoint family within the budget Okta reports.
+
+    Until an endpoint's first response arrives, ``initial_concurrency``
+    requests may run at once. After that, requests run as long as the
+    window has budget beyond a ``headroom`` share of the limit, up to
+    ``max_concurrency`` at once. Once the budget is spent, or Okta answers
+    429, the endpoint waits until the window resets; 429s are retried up to
+    ``max_retries`` times.
+    """
+
+    def __init__(
+        self,
+        headroom: float = DEFAULT_HEADROOM,
+        initial_concurrency: int = DEFAULT_INITIAL_CONCURRENCY,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
+        self.headroom = headroom
+        self.initial_concurrency = max(1, initial_concurrency)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.budgets: Dict[str, Budget] = {}
+
+    def budget(self, family: str) -> Budget:
+        budget = self.budgets.get(family)
+        if budget is None:
+            budget = self.budgets[family] = Budget()
+        return budget
+
+    def _allowed(self, budget: Budget, now: float) -> int:
+        """How many requests may be in flight for ``budget`` right now."""
+        if budget.remaining is None:
+            return self.initial_concurrency
+        rolled = budget.reset_at <= now and budget.limit is not None
+        if rolled:
+            # Assume a full new window until a response reports it.
+            budget.remaining = budget.limit
+            budget.reset_at = now + ROLLOVER_GRACE
+        reserve = int((budget.limit or 0) * self.headroom)
+        allowed = min(self.max_concurrency, budget.in_flight + max(0, budget.remaining - reserve))
+        # Let one request probe a new window even when no budget is spare.
+        return max(1, allowed) if rolled else allowed
+
+    async def acquire(self, family: str) -> None:
+        """Wait until a request to ``family`` fits its budget, then claim a slot."""
+        budget = self.budget(family)
+        waited = None
+        while True:
+            now = time.monotonic()
+            if budget.blocked_until > now:
+                waited = waited or now
+                await asyncio.sleep(budget.blocked_until - now)
+                continue
+            if budget.in_flight < self._allowed(budget, now):
+                break
+            waited = waited or now
+            budget.changed.clear()
+            # Out of budget: nothing changes before the reset. Otherwise a
+            # finished request may free a slot first.
+            spent = budget.remaining is not None and budget.in_flight == 0
+            timeout = max(0.0, budget.reset_at - now) if spent else None
+            try:
+                await asyncio.wait_for(budget.changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        budget.in_flight += 1
+        if budget.remaining is not None:
+            budget.remaining -= 1
+        if waited is not None:
+            metrics.observe("okta_rate_limit_wait_seconds", time.monotonic() - waited, endpoint=family)
+
+    def release(self, family: str, status: Optional[int], headers: Any) -> None:
+        """Free ``family``'s slot and update its budget from a response."""
+        budget = self.budget(family)
+        budget.in_flight -= 1
+        now = time.monotonic()
+        limit = _header(headers, "X-Rate-Limit-Limit")
+        remaining = _header(headers, "X-Rate-Limit-Remaining")
+        reset = _header(headers, "X-Rate-Limit-Reset")
+        window = float(reset) if reset is not None else budget.window
+        # Responses from a window that has since rolled over say nothing about this one.
+        if window >= budget.window:
+            if limit is not None:
+                budget.limit = int(limit)
+            if remaining is not None:
+                # Requests still in flight were sent after this response was counted.
+                reported = max(0, int(remaining) - budget.in_flight)
+                same = window == budget.window and budget.remaining is not None
+                budget.remaining = min(budget.remaining, reported) if same else reported
+            if reset is not None:
+                budget.window = window
+                budget.reset_at = now + _reset_delay(headers, reset)
+            if status == TOO_MANY_REQUESTS:
+                budget.remaining = 0
+                budget.blocked_until = budget.reset_at if budget.reset_at > now else now + ROLLOVER_GRACE
+        if status == TOO_MANY_REQUESTS:
+            metrics.inc("okta_throttled_total", endpoint=family)
+        budget.changed.set()
+
+    async def send(self, request: Dict[str, Any], send_request: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Any:
+        """Send ``request`` with ``send_request`` once its endpoint has budget.
+
+        ``send_request`` returns an SDK-style ``(request, response, body,
+        error)`` tuple; the response's status and headers update the budget.
+        """
+        family = endpoint_family(request["url"])
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(family)
+            response = None
+            try:
+                result = await send_request(request)
+                response = result[1]
+            finally:
+                self.release(family, getattr(response, "status", None), getattr(response, "headers", None))
+            if getattr(response, "status", None) != TOO_MANY_REQUESTS or attempt == self.max_retries:
+                return result
+            metrics.inc("okta_retries_total", endpoint=family)
+        return result
+
+    def attach(self, client: Any) -> Any:
+        """Route every HTTP request ``client`` sends through this scheduler; returns ``client``.
+
+        The unpaced sender stays reachable as ``_send_unpaced``, so
+        :func:`~okta_flowcharting.metrics.instrument_client` can time each
+        attempt without the time spent waiting for budget.
+        """
+        http = getattr(client.get_request_executor(), "_http_client", None)
+        if http is None or hasattr(http, "_send_unpaced"):
+            return client
+        http._send_unpaced = http.send_request
+
+        async def send_request(request: Dict[str, Any]) -> Any:
+            return await self.send(request, http._send_unpaced)
+
+        http.send_request = send_request
+        return client
@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+from typing import Any
+
+
+def attr_path(obj: Any, *path: str) -> Any:
+    """Follow ``path`` through SDK models, stopping at the first missing value."""
+    for name in path:
+        if obj is None:
+            return None
+        obj = getattr(obj, name, None)
+    return obj
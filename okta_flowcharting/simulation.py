@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from collections import Counter, defaultdict, deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Deque, Dict, IO, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .parallel import process_pool
+from .policy_models import NOT_ASSIGNED, AuthenticationPolicyModel, EvaluationCache, UserContext
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+    from .okta_data import OktaCache
+
+DEFAULT_SHARD_SIZE = 5000
+
+# One tuple of steps (ending in the action) per simulated policy or FirstAssigned group.
+Journey = Tuple[Tuple[str, ...], ...]
+# (username, groups[, user id[, user type id]]) - all a worker needs to rebuild a UserContext.
+UserRecord = Tuple[Any, ...]
+
+
+@dataclass
+class FirstAssigned:
+    """Policies in priority order, of which only the first assigned to a user applies.
+
+    Okta applies a user's highest-priority global session policy and skips
+    the rest, so such policies make up one step of a journey between them.
+    Users assigned to none of them get ``NOT_ASSIGNED``.
+    """
+
+    name: str
+    policies: List[AuthenticationPolicyModel]
+
+
+Simulated = Union[AuthenticationPolicyModel, FirstAssigned]
+
+
+@dataclass
+class JourneyReport:
+    """Number of users that end up on each journey."""
+
+    policies: List[str]
+    counts: Counter = field(default_factory=Counter)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def users_with_action(self, action: str) -> int:
+        """Users whose journey ends in ``action`` on any simulated policy (or group)."""
+        return sum(n for journey, n in self.counts.items() if any(steps[-1] == action for steps in journey))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "policies": self.policies,
+            "total": self.total,
+            "journeys": [
+                {"steps": [list(steps) for steps in journey], "users": users}
+                for journey, users in self.counts.most_common()
+            ],
+        }
+
+
+# Per-worker evaluation caches, one list per simulated policy or group, kept
+# across shards so common signatures stay hot.
+_evaluators: List[List[EvaluationCache]] = []
+
+
+def _init_worker(policies: Sequence[Simulated]) -> None:
+    global _evaluators
+    _evaluators = [
+        [EvaluationCache(member) for member in (policy.policies if isinstance(policy, FirstAssigned) else [policy])]
+        for policy in policies
+    ]
+
+
+def _evaluate_first_assigned(evaluators: List[EvaluationCache], contexts: List[UserContext]) -> List[List[str]]:
+    """Each context's journey on the first of ``evaluators`` it is assigned to."""
+    journeys: List[List[str]] = [[NOT_ASSIGNED]] * len(contexts)
+    pending = list(range(len(contexts)))
+    for evaluator in evaluators:
+        if not pending:
+            break
+        unassigned = []
+        for index, journey in zip(pending, evaluator.evaluate_many([contexts[index] for index in pending])):
+            if journey == [NOT_ASSIGNED]:
+                unassigned.append(index)
+            else:
+                journeys[index] = journey
+        pending = unassigned
+    return journeys
+
+
+def _context(username: str, groups: List[str], user_id: Optional[str] = None, user_type: Optional[str] = None) -> UserContext:
+    return UserContext(username=username, groups=groups, user_id=user_id, user_type=user_type)
+
+
+def _simulate_shard(shard: List[UserRecord], keep_rows: bool) -> Tuple[Counter, List[Tuple[str, Journey]]]:
+    contexts = [_context(*record) for record in shard]
+    per_policy = [_evaluate_first_assigned(evaluators, contexts) for evaluators in _evaluators]
+    counts: Counter = Counter()
+    rows: List[Tuple[str, Journey]] = []
+    for context, *steps in zip(contexts, *per_policy):
+        journey = tuple(tuple(policy_steps) for policy_steps in steps)
+        counts[journey] += 1
+        if keep_rows:
+            rows.append((context.username, journey))
+    return counts, rows
+
+
+def _shards(users: Iterable[UserRecord], size: int) -> Iterator[List[UserRecord]]:
+    shard: List[UserRecord] = []
+    for user in users:
+        shard.append(user)
+        if len(shard) == size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def simulate(
+    policies: Sequence[Simulated],
+    users: Iterable[UserRecord],
+    processes: Optional[int] = None,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    out: Optional[IO[str]] = None,
+) -> JourneyReport:
+    """Run every user through ``policies``, sharded across a process pool.
+
+    Each policy adds its outcome to every journey; a :class:`FirstAssigned`
+    group adds only the outcome of the first of its policies the user is
+    assigned to.
+
+    Shards are submitted lazily with at most two per worker in flight. Each
+    finished shard is merged into the report, and its per-user journeys are
+    written to ``out`` as JSON lines when given, before it is dropped. Memory
+    is therefore bounded by the in-flight shards rather than the org size.
+    """
+    report = JourneyReport([policy.name for policy in policies])
+    processes = processes or os.cpu_count() or 1
+    pending: Deque["Future"] = deque()
+
+    def collect(future: "Future") -> None:
+        counts, rows = future.result()
+        report.counts.update(counts)
+        for username, journey in rows:
+            out.write(json.dumps({"user": username, "journey": [list(steps) for steps in journey]}) + "\n")
+
+    with process_pool(processes, _init_worker, (list(policies),)) as pool:
+        for shard in _shards(users, shard_size):
+            pending.append(pool.submit(_simulate_shard, shard, out is not None))
+            if len(pending) >= 2 * processes:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+    return report
+
+
+async def load_user_records(cache: "OktaCache") -> Iterator[UserRecord]:
+    """Pair every Okta user's login with their group ids, user id and user type id.
+
+    Contexts carry ids, matching how Okta rules reference groups, users and
+    user types, so modelled policies should use ids in their conditions too
+    (policies from :mod:`okta_flowcharting.policy_translation` already do).
+    """
+    users, memberships = await asyncio.gather(cache.get_users(), cache.get_group_members())
+    groups_by_user: Dict[str, List[str]] = defaultdict(list)
+    for record in memberships.values():
+        for user_id in record["members"]:
+            groups_by_user[user_id].append(record["id"])
+    return (
+        (user.profile.login, groups_by_user.pop(user.id, []), user.id, getattr(getattr(user, "type", None), "id", None))
+        for user in users.values()
+    )
+
+
+async def simulate_org(
+    cache: "OktaCache",
+    policies: Sequence[Simulated],
+    processes: Optional[int] = None,
+    shard_size: int = DEFAULT_SHARD_SIZE,
+    out: Optional[IO[str]] = None,
+) -> JourneyReport:
+    """Simulate every user in ``cache`` through the modelled sign-on and access policies."""
+    return simulate(policies, await load_user_records(cache), processes, shard_size, out)
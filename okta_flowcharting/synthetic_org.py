@@ -0,0 +1,194 @@
+"""Deterministic synthetic Okta orgs for benchmarks and offline runs."""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from types import SimpleNamespace as NS
+from typing import Any, Dict, List
+
+from .fake_okta import FakeOrg
+
+ACCESS_POLICY = "ACCESS_POLICY"
+SIGNON_POLICY = "OKTA_SIGN_ON"
+LAST_UPDATED = "2024-01-01T00:00:00.000Z"
+
+PLATFORMS = (("MOBILE", "IOS"), ("MOBILE", "ANDROID"), ("DESKTOP", "WINDOWS"), ("DESKTOP", "MACOS"))
+RISK_LEVELS = ("ANY", "LOW", "MEDIUM", "HIGH")
+FACTOR_MODES = ("1FA", "2FA")
+
+
+@dataclass(frozen=True)
+class OrgScale:
+    """How big a synthetic org is."""
+
+    users: int = 1000
+    groups: int = 100
+    zones: int = 10
+    user_types: int = 3
+    access_policies: int = 20
+    signon_policies: int = 5
+    rules_per_policy: int = 5
+    apps_per_policy: int = 2
+    groups_per_user: int = 3
+
+
+SCALES: Dict[str, OrgScale] = {
+    "tiny": OrgScale(users=50, groups=10, zones=3, access_policies=3, signon_policies=2, rules_per_policy=3),
+    "small": OrgScale(),
+    "medium": OrgScale(users=20_000, groups=2_000, zones=50, access_policies=100, signon_policies=20, rules_per_policy=10),
+    "large": OrgScale(users=100_000, groups=10_000, zones=200, access_policies=500, signon_policies=50, rules_per_policy=20),
+}
+
+
+def _include_exclude(rnd: random.Random, ids: List[str], most: int = 3) -> Any:
+    """An include/exclude pair drawn from ``ids``, either side possibly empty."""
+    if not ids:
+        return None
+    include = rnd.sample(ids, rnd.randint(1, min(most, len(ids)))) if rnd.random() < 0.7 else None
+    exclude = rnd.sample(ids, 1) if rnd.random() < 0.3 else None
+    if include is None and exclude is None:
+        return None
+    return NS(include=include, exclude=exclude)
+
+
+def _network(rnd: random.Random, zone_ids: List[str]) -> Any:
+    roll = rnd.random()
+    if roll < 0.4 or not zone_ids:
+        return NS(connection="ANYWHERE", include=None, exclude=None)
+    if roll < 0.5:
+        return NS(connection="ZONE", include=["ALL_ZONES"], exclude=None)
+    zones = _include_exclude(rnd, zone_ids, 2) or NS(include=zone_ids[:1], exclude=None)
+    return NS(connection="ZONE", include=zones.include, exclude=zones.exclude)
+
+
+def _conditions(**values: Any) -> Any:
+    """Rule conditions with everything not given left unset."""
+    fields = ("user_type", "people", "device", "platform", "network", "risk_score",
+              "el_condition", "identity_provider", "auth_context", "risk")
+    return NS(**{name: values.get(name) for name in fields})
+
+
+def _access_rule(rnd: random.Random, rule_id: str, ids: Any, system: bool) -> Any:
+    access = "ALLOW" if system or rnd.random() < 0.8 else "DENY"
+    actions = NS(app_sign_on=NS(access=access, verification_method=NS(factor_mode=rnd.choice(FACTOR_MODES))), signon=None)
+    if system:
+        return _rule(rule_id, system, _conditions(), actions)
+    conditions = _conditions(
+        user_type=_include_exclude(rnd, ids.user_types, 1) if rnd.random() < 0.2 else None,
+        people=NS(
+            groups=_include_exclude(rnd, ids.groups),
+            users=NS(include=[rnd.choice(ids.users)], exclude=None) if ids.users and rnd.random() < 0.1 else None,
+        ),
+        device=NS(registered=True, managed=rnd.random() < 0.5) if rnd.random() < 0.3 else None,
+        platform=NS(
+            include=[NS(type=kind, os=NS(type=os_type)) for kind, os_type in rnd.sample(PLATFORMS, rnd.randint(1, 2))],
+            exclude=None,
+        ) if rnd.random() < 0.2 else None,
+        network=_network(rnd, ids.zones),
+        risk_score=NS(level=rnd.choice(RISK_LEVELS)),
+        el_condition=NS(condition="user.profile.department == \"Engineering\"") if rnd.random() < 0.05 else None,
+    )
+    return _rule(rule_id, system, conditions, actions)
+
+
+def _signon_rule(rnd: random.Random, rule_id: str, ids: Any, system: bool) -> Any:
+    conditions = _conditions(
+        network=None if system else _network(rnd, ids.zones),
+        risk_score=NS(level="ANY" if system else rnd.choice(RISK_LEVELS)),
+        identity_provider=NS(provider="ANY" if system or rnd.random() < 0.7 else "OKTA"),
+        auth_context=NS(auth_type="ANY" if system or rnd.random() < 0.8 else "RADIUS"),
+        risk=NS(behaviors=["New Device", "New City"] if not system and rnd.random() < 0.2 else None),
+    )
+    access = "ALLOW" if system or rnd.random() < 0.9 else "DENY"
+    actions = NS(app_sign_on=None, signon=NS(access=access, require_factor=not system and rnd.random() < 0.6))
+    return _rule(rule_id, system, conditions, actions)
+
+
+def _rule(rule_id: str, system: bool, conditions: Any, actions: Any) -> Any:
+    return NS(
+        id=rule_id,
+        name="Catch-all Rule" if system else f"Rule {rule_id}",
+        status="ACTIVE",
+        system=system,
+        priority=None,
+        last_updated=LAST_UPDATED,
+        conditions=conditions,
+        actions=actions,
+    )
+
+
+def _policies(rnd: random.Random, org: FakeOrg, policy_type: str, count: int, rules: int) -> None:
+    prefix = "acc" if policy_type == ACCESS_POLICY else "gsp"
+    make_rule = _access_rule if policy_type == ACCESS_POLICY else _signon_rule
+    ids = NS(
+        groups=[group.id for group in org.groups],
+        users=[user.id for user in org.users],
+        user_types=[user_type.id for user_type in org.user_types],
+        zones=[zone.id for zone in org.zones],
+    )
+    group_ids = ids.groups
+    policies = []
+    for index in range(count):
+        policy_id = f"{prefix}{index:05d}"
+        # The last global session policy is Okta's default, applying to Everyone.
+        if policy_type == SIGNON_POLICY and index < count - 1 and group_ids[1:]:
+            include = rnd.sample(group_ids[1:], rnd.randint(1, min(2, len(group_ids) - 1)))
+        else:
+            include = group_ids[:1]
+        policies.append(NS(
+            id=policy_id,
+            name=f"{'Access' if policy_type == ACCESS_POLICY else 'Session'} policy {index}",
+            type=policy_type,
+            status="ACTIVE",
+            last_updated=LAST_UPDATED,
+            conditions=NS(people=NS(groups=NS(include=include, exclude=None))),
+        ))
+        org.rules[policy_id] = [
+            make_rule(rnd, f"{policy_id}r{position:03d}", ids, system=position == rules - 1)
+            for position in range(rules)
+        ]
+    org.policies[policy_type] = policies
+
+
+def generate_org(scale: OrgScale = OrgScale(), seed: int = 0) -> FakeOrg:
+    """Build an org of ``scale`` whose rules reference its own groups, users and zones.
+
+    The same ``scale`` and ``seed`` always produce the same org. The first
+    group is "Everyone" and contains every user.
+    """
+    rnd = random.Random(seed)
+    org = FakeOrg()
+    org.user_types = [NS(id=f"oty{index:03d}", name=f"User type {index}") for index in range(max(1, scale.user_types))]
+    org.zones = [NS(id=f"nzo{index:05d}", name=f"Zone {index}", type="IP") for index in range(scale.zones)]
+    org.groups = [
+        NS(id=f"00g{index:05d}", last_updated=LAST_UPDATED, profile=NS(name=f"Group {index}" if index else "Everyone"))
+        for index in range(max(1, scale.groups))
+    ]
+    org.memberships = {group.id: [] for group in org.groups}
+    other_groups = [group.id for group in org.groups[1:]]
+    for index in range(scale.users):
+        user_id = f"00u{index:07d}"
+        user_type = rnd.choice(org.user_types)
+        org.users.append(NS(
+            id=user_id,
+            status="ACTIVE",
+            last_updated=LAST_UPDATED,
+            type=NS(id=user_type.id),
+            profile=NS(login=f"user{index}@example.com"),
+        ))
+        org.memberships[org.groups[0].id].append(user_id)
+        for group_id in rnd.sample(other_groups, min(scale.groups_per_user, len(other_groups))):
+            org.memberships[group_id].append(user_id)
+
+    _policies(rnd, org, ACCESS_POLICY, scale.access_policies, max(1, scale.rules_per_policy))
+    _policies(rnd, org, SIGNON_POLICY, scale.signon_policies, max(1, scale.rules_per_policy))
+    for policy in org.policies[ACCESS_POLICY]:
+        for index in range(scale.apps_per_policy):
+            org.apps.append({
+                "id": f"0oa{policy.id}{index:02d}",
+                "name": f"app_{policy.id}_{index}",
+                "label": f"App {policy.name} {index}",
+                "status": "ACTIVE" if index % 4 != 3 else "INACTIVE",
+                "_links": {"accessPolicy": {"href": f"https://example.okta.com/api/v1/policies/{policy.id}"}},
+            })
+    return org
@@ -0,0 +1,89 @@
+import copy
+import importlib.util
+import os
+import tempfile
+import unittest
+from dataclasses import dataclass
+from types import SimpleNamespace as NS
+
+from okta_flowcharting.content_hash import canonical, content_hash
+from okta_flowcharting.flowchart_graph import build_signon_graph
+
+from test_flowchart_graph import BUNDLES, make_names, make_rule
+
+HAS_SCHEMDRAW = importlib.util.find_spec("schemdraw") is not None
+
+
+@dataclass
+class Point:
+    x: int
+    y: int
+
+
+class ContentHashTests(unittest.TestCase):
+    def test_independent_of_mapping_order(self):
+        self.assertEqual(content_hash({"a": 1, "b": [1, 2]}), content_hash({"b": [1, 2], "a": 1}))
+        self.assertNotEqual(content_hash({"a": 1, "b": [1, 2]}), content_hash({"a": 1, "b": [2, 1]}))
+
+    def test_reduces_models_to_fields(self):
+        self.assertEqual(canonical(NS(id="x", tags={"b", "a"})), {"id": "x", "tags": ["a", "b"]})
+        self.assertEqual(canonical(Point(1, 2)), {"__type__": "Point", "x": 1, "y": 2})
+        self.assertEqual(canonical(NS(as_dict=lambda: {"id": "y"})), {"id": "y"})
+
+
+@unittest.skipUnless(HAS_SCHEMDRAW, "schemdraw not installed")
+class SaveIncrementalTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.out = os.path.join(tmp.name, "chart.svg")
+        self.fragments = os.path.join(tmp.name, "fragments")
+
+    def save(self, bundles):
+        from okta_flowcharting.chart_cache import save_incremental
+
+        return save_incremental(build_signon_graph(bundles, make_names()), self.out, self.fragments)
+
+    def test_only_changed_sections_are_rendered(self):
+        first = self.save(BUNDLES)
+        self.assertEqual((first.rendered, first.reused), (3, 0))
+        with open(self.out, "rb") as fh:
+            original = fh.read()
+
+        again = self.save(BUNDLES)
+        self.assertEqual((again.rendered, again.reused), (0, 3))
+        with open(self.out, "rb") as fh:
+            self.assertEqual(fh.read(), original)
+
+        changed = copy.deepcopy(BUNDLES)
+        changed["p2"].rules[0] = make_rule("r3", zones=["office"], access="DENY")
+        stats = self.save(changed)
+        self.assertEqual((stats.rendered, stats.reused), (1, 2))
+        self.assertEqual(len(os.listdir(os.path.join(self.fragments, "signon"))), 3)
+
+    def test_fragments_stack_like_the_full_drawing(self):
+        import schemdraw
+        from schemdraw import flow
+
+        from okta_flowcharting.chart_cache import Fragment, FragmentCache, render_section, render_start
+        from okta_flowcharting.flowchart_render import render_graph
+
+        graph = build_signon_graph(BUNDLES, make_names())
+        d = schemdraw.Drawing()
+        d.add(flow.Start().label("Start Login"))
+        placed = render_graph(d, graph)
+
+        start, section = render_start(), render_section(graph, 0)
+        scale = 36.0
+        expected = placed[graph.sections[1].node.id].N
+        self.assertAlmostEqual(start.advance[1] + section.advance[1] + graph.sections[1].offset * scale, -expected.y * scale)
+
+        cache = FragmentCache(self.fragments)
+        cache.put("abc", section)
+        self.assertEqual(cache.get("abc").advance, section.advance)
+        self.assertIsNone(cache.get("missing"))
+        self.assertIsInstance(cache.get("abc"), Fragment)
+
+
+if __name__ == "__main__":
+    unittest.main()
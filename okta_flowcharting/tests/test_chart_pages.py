@@ -0,0 +1,45 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+from okta_flowcharting.flowchart_graph import build_access_graph, build_signon_graph
+
+from test_flowchart_graph import APPS, BUNDLES, make_names
+
+HAS_SCHEMDRAW = importlib.util.find_spec("schemdraw") is not None
+
+
+@unittest.skipUnless(HAS_SCHEMDRAW, "schemdraw not installed")
+class RenderPagesTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def render(self, graph, processes):
+        from okta_flowcharting.chart_pages import render_pages
+
+        return render_pages(graph, self.directory, processes)
+
+    def test_one_page_per_policy_with_index(self):
+        index = self.render(build_signon_graph(BUNDLES, make_names()), processes=2)
+        self.assertEqual(sorted(os.listdir(self.directory)), ["001-policy-p1.svg", "002-policy-p2.svg", "index.html"])
+        with open(index) as fh:
+            page = fh.read()
+        self.assertLess(page.index('href="001-policy-p1.svg"'), page.index('href="002-policy-p2.svg"'))
+        with open(os.path.join(self.directory, "001-policy-p1.svg")) as fh:
+            self.assertIn("Continue to Policy p2", fh.read())
+
+    def test_inline_matches_pool(self):
+        graph = build_access_graph(BUNDLES, {"p1": ["a1"], "p2": ["a2"]}, APPS, make_names())
+        self.render(graph, processes=1)
+        with open(os.path.join(self.directory, "002-policy-p2.svg"), "rb") as fh:
+            inline = fh.read()
+        self.render(graph, processes=2)
+        with open(os.path.join(self.directory, "002-policy-p2.svg"), "rb") as fh:
+            self.assertEqual(fh.read(), inline)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import asyncio
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace as NS
+
+from test_flowchart_graph import make_bundle, make_rule
+from test_okta_data import FakeClient, FakeExecutor
+
+HAS_OKTA = importlib.util.find_spec("okta") is not None
+
+if HAS_OKTA:
+    from okta_flowcharting import authentication_policy
+    from okta_flowcharting.cli import build_parser, run
+    from okta_flowcharting.okta_data import OktaCache
+
+
+class SessionClient(FakeClient):
+    """FakeClient that counts the sessions opened on it and the group listings."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sessions = 0
+        self.group_listings = 0
+
+    async def __aenter__(self):
+        self.sessions += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        return None
+
+    async def list_groups(self, query):
+        self.group_listings += 1
+        return await super().list_groups(query)
+
+
+def make_client(policy_ids=("p1",)):
+    bundles = [make_bundle(policy_id, [make_rule("r1", groups=["admins"]), make_rule("r2", system=True)]) for policy_id in policy_ids]
+    client = SessionClient(
+        policies=[bundle.policy for bundle in bundles],
+        rules={bundle.policy.id: bundle.rules for bundle in bundles},
+        groups=[NS(id="everyone", profile=NS(name="Everyone")), NS(id="admins", profile=NS(name="Admins"))],
+    )
+    client.executor = FakeExecutor([
+        {"id": f"a{index}", "name": f"App {index}", "status": "ACTIVE",
+         "_links": {"accessPolicy": {"href": f"https://org/api/v1/policies/{policy_id}"}}}
+        for index, policy_id in enumerate(policy_ids, 1)
+    ])
+    return client
+
+
+@unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+class CliTests(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_both_charts_share_one_session_and_fetch(self):
+        client = make_client()
+        args = build_parser().parse_args(["render", "--format", "json"])
+        outputs = asyncio.run(run(args, client))
+
+        self.assertEqual(outputs, {"access": "auth-flowchart.json", "signon": "out.json"})
+        self.assertEqual((client.sessions, client.group_listings), (1, 1))
+        with open("auth-flowchart.json") as fh:
+            self.assertEqual([section["policy_id"] for section in json.load(fh)["sections"]], ["p1"])
+
+    def test_fetch_reports_counts(self):
+        args = build_parser().parse_args(["--cache-dir", ".", "fetch"])
+        counts = asyncio.run(run(args, make_client()))
+        self.assertEqual((counts["groups"], counts["apps"], counts["access_policies"]), (2, 1, 1))
+
+    def test_references(self):
+        args = build_parser().parse_args(["references", "group", "admins", "nobody"])
+        found = asyncio.run(run(args, make_client()))
+        self.assertEqual(found["nobody"], [])
+        self.assertEqual([(ref["policy_type"], ref["policy_id"], ref["rule_id"]) for ref in found["admins"]],
+                         [("ACCESS_POLICY", "p1", "r1"), ("OKTA_SIGN_ON", "p1", "r1")])
+
+    def test_diff_against_older_cache(self):
+        asyncio.run(run(build_parser().parse_args(["--cache-dir", ".", "fetch"]), make_client()))
+        os.mkdir("new")
+        client = make_client()
+        client.rules["p1"][0].actions.app_sign_on.access = "DENY"
+        args = build_parser().parse_args(["--cache-dir", "new", "diff", ".", "--chart", "access", "--format", "json"])
+        result = asyncio.run(run(args, client))
+
+        self.assertEqual([(change["policy_type"], change["policy_id"]) for change in result["policies"]],
+                         [("OKTA_SIGN_ON", "p1"), ("ACCESS_POLICY", "p1")])
+        self.assertEqual(result["policies"][1]["rules"][0]["action"], ["ALLOW", "DENY"])
+        with open(result["chart"]) as fh:
+            self.assertEqual([section["policy_id"] for section in json.load(fh)["sections"]], ["p1"])
+
+    def test_diff_chart_leaves_out_unchanged_policies_with_apps(self):
+        asyncio.run(run(build_parser().parse_args(["--cache-dir", ".", "fetch"]), make_client(("p1", "p2"))))
+        os.mkdir("new")
+        client = make_client(("p1", "p2"))
+        client.rules["p2"][0].actions.app_sign_on.access = "DENY"
+        args = build_parser().parse_args(["--cache-dir", "new", "diff", ".", "--chart", "access", "--format", "json"])
+        result = asyncio.run(run(args, client))
+
+        with open(result["chart"]) as fh:
+            self.assertEqual([section["policy_id"] for section in json.load(fh)["sections"]], ["p2"])
+
+    def test_layout_logs_sections_instead_of_printing(self):
+        bundles = {"p1": make_bundle("p1", [make_rule("r1", groups=["admins"])])}
+        cache = OktaCache(make_client(), cache_dir=".")
+        self.addCleanup(lambda: cache._store.close())
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), self.assertLogs("okta_flowcharting.authentication_policy", "INFO") as logs:
+            asyncio.run(authentication_policy.layout_policies(bundles, cache))
+        # stdout is left to the JSON the CLI prints.
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertIn("INFO:okta_flowcharting.authentication_policy:\tr1 - Rule r1", logs.output)
+
+    def test_render_options(self):
+        args = build_parser().parse_args(["render-signon", "--format", "mermaid", "-o", "chart.mmd"])
+        self.assertEqual((args.command, args.format, args.output), ("render-signon", "mermaid", "chart.mmd"))
+        with self.assertRaises(SystemExit):
+            build_parser().parse_args(["render-access", "--format", "png"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import os
+import tempfile
+import time
+import unittest
+from collections import Counter
+
+from okta_flowcharting.compliance import ComplianceChecker, ComplianceMatrix, level_key, refresh_matrix
+from okta_flowcharting.policy_models import (
+    AssuranceLevel,
+    AssuranceRequirement,
+    AuthenticationPolicyModel,
+    PolicyConditionModel,
+    PolicyRuleModel,
+)
+
+CALLS = Counter()
+
+
+def slow_has_steps(rule):
+    CALLS["slow"] += 1
+    time.sleep(0.0005)
+    return bool(rule.steps)
+
+
+def requires_mfa(rule):
+    CALLS["mfa"] += 1
+    return "mfa" in rule.steps
+
+
+def allows(rule):
+    return rule.action == "ALLOW"
+
+
+def zone_bound(rule):
+    return any(condition.condition_type == "zone" for condition in rule.conditions)
+
+
+LEVELS = [
+    AssuranceLevel("basic", AssuranceRequirement("basic", tests=[allows])),
+    # Declared expensive-first, to see the checker reorder them.
+    AssuranceLevel("strong", AssuranceRequirement("strong", tests=[slow_has_steps, requires_mfa])),
+    AssuranceLevel("zoned", AssuranceRequirement("zoned", tests=[allows, zone_bound, requires_mfa])),
+]
+
+
+def make_rule(index, steps=(), zone=False):
+    conditions = [PolicyConditionModel("group", "include", [f"g{index}"])]
+    if zone:
+        conditions.append(PolicyConditionModel("zone", "include", ["office"]))
+    return PolicyRuleModel(id=f"r{index}", name=f"Rule {index}", conditions=conditions, action="ALLOW", steps=list(steps))
+
+
+def make_policies(count=200):
+    rules = [make_rule(index, ["password", "mfa"] if index % 10 == 0 else ["password"], zone=index % 3 == 0) for index in range(count)]
+    rules.append(PolicyRuleModel(id="deny", name="Catch-all", action="DENY"))
+    return [AuthenticationPolicyModel("Access", rules=rules)]
+
+
+class ComplianceTests(unittest.TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_matrix_matches_is_compliant(self):
+        policies = make_policies()
+        matrix = ComplianceChecker(LEVELS, processes=1).check(policies)
+
+        self.assertEqual(len(matrix.rows), 201)
+        for row, rule in zip(matrix.rows, policies[0].rules):
+            self.assertEqual(row.results, {level.name: rule.is_compliant(level.requirement) for level in LEVELS})
+        self.assertEqual(matrix.summary(), {"basic": 200, "strong": 20, "zoned": 7})
+        self.assertEqual([row.rule_id for row in matrix.failing("basic")], ["deny"])
+
+    def test_cheap_failing_tests_move_first(self):
+        checker = ComplianceChecker(LEVELS, processes=1)
+        checker.check(make_policies())
+
+        self.assertEqual(checker.order(LEVELS[1]), [1, 0])
+        # Only the first batch ran the slow test on every rule.
+        self.assertLess(CALLS["slow"], 100)
+
+    def test_results_are_memoised_by_rule_content(self):
+        checker = ComplianceChecker(LEVELS, processes=1)
+        policies = make_policies(20)
+        checker.check(policies)
+        self.assertEqual(checker.checked, 21)
+
+        # Renaming doesn't change a rule's content; editing its steps does.
+        policies[0].rules[0].name = "Renamed"
+        policies[0].rules[1].steps = ["password", "mfa"]
+        matrix = checker.check(policies)
+        self.assertEqual(checker.checked, 22)
+        self.assertTrue(matrix.rows[1].results["strong"])
+
+    def test_refresh_reuses_saved_matrix(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "compliance.json")
+            first = refresh_matrix(path, make_policies(20), LEVELS, processes=1)
+            checker = ComplianceChecker(LEVELS, processes=1)
+            checker.seed(ComplianceMatrix.load(path))
+            again = checker.check(make_policies(20))
+
+        self.assertEqual(checker.checked, 0)
+        self.assertEqual(again.to_dict(), first.to_dict())
+
+    def test_changed_level_invalidates_saved_results(self):
+        matrix = ComplianceChecker(LEVELS[:1], processes=1).check(make_policies(5))
+        stricter = AssuranceLevel("basic", AssuranceRequirement("basic", tests=[allows, requires_mfa]))
+        checker = ComplianceChecker([stricter], processes=1)
+        checker.seed(matrix)
+        self.assertEqual(checker.check(make_policies(5)).summary(), {"basic": 1})
+        self.assertEqual(checker.checked, 6)
+
+    def test_process_pool_gives_same_matrix(self):
+        policies = make_policies(60)
+        inline = ComplianceChecker(LEVELS, processes=1).check(policies)
+        pooled_checker = ComplianceChecker(LEVELS, processes=2, chunk_size=16)
+        pooled = pooled_checker.check(policies)
+        self.assertEqual(pooled.to_dict(), inline.to_dict())
+        self.assertGreater(sum(stats.calls for stats in pooled_checker.stats.values()), 0)
+
+    def test_process_pool_checks_rules_with_lambda_conditions(self):
+        policies = make_policies(40)
+        for rule in policies[0].rules[:-1]:
+            rule.conditions[0].test = lambda context: True
+        pooled = ComplianceChecker(LEVELS, processes=2, chunk_size=8).check(policies)
+        self.assertEqual(pooled.to_dict(), ComplianceChecker(LEVELS, processes=1).check(policies).to_dict())
+
+    def test_level_key_tells_tests_apart_by_code(self):
+        def key(*tests):
+            return level_key(AssuranceLevel("custom", AssuranceRequirement("custom", tests=list(tests))))
+
+        self.assertNotEqual(key(lambda rule: rule.action == "ALLOW"), key(lambda rule: rule.action == "DENY"))
+        self.assertNotEqual(key(lambda rule: bool(rule.steps)), key(lambda rule: bool(rule.conditions)))
+        self.assertEqual(key(lambda rule: bool(rule.steps)), key(lambda rule: bool(rule.steps)))
+
+        def with_steps(count):
+            return lambda rule: len(rule.steps) >= count
+
+        self.assertNotEqual(key(with_steps(1)), key(with_steps(2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from okta_flowcharting.directory_store import DirectoryStore
+
+
+class DirectoryStoreTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.store = DirectoryStore.in_dir(self._tmp.name)
+        self.groups = [SimpleNamespace(id=f"g{i}", name=f"group {i}") for i in range(1200)]
+        with self.store.replace("groups", fetched_at=100.0) as writer:
+            writer.write(self.groups[:600])
+            writer.write(self.groups[600:])
+
+    def tearDown(self):
+        self.store.close()
+        self._tmp.cleanup()
+
+    def test_point_and_batched_lookups(self):
+        self.assertEqual(self.store.get("groups", "g42").name, "group 42")
+        found = self.store.get_many("groups", ["g7", "missing", "g1100", "g7"])
+        self.assertEqual(list(found), ["g7", "g1100"])
+        with self.assertRaises(KeyError):
+            self.store.get("groups", "missing")
+
+    def test_view_is_a_mapping_in_insertion_order(self):
+        view = self.store.view("groups")
+        self.assertEqual(len(view), 1200)
+        self.assertIn("g3", view)
+        self.assertNotIn("g3", self.store.view("users"))
+        self.assertEqual(list(view)[:3], ["g0", "g1", "g2"])
+        self.assertEqual([g.id for g in view.values()], [g.id for g in self.groups])
+
+    def test_failed_replace_keeps_previous_snapshot(self):
+        with self.assertRaises(RuntimeError):
+            with self.store.replace("groups", fetched_at=200.0) as writer:
+                writer.write([SimpleNamespace(id="new", name="new")])
+                raise RuntimeError("connection dropped")
+        self.assertEqual(self.store.count("groups"), 1200)
+        self.assertEqual(self.store.fetched_at("groups"), 100.0)
+
+    def test_overlapping_replaces_keep_their_pages_apart(self):
+        first = self.store.replace("groups", fetched_at=200.0)
+        second = self.store.replace("groups", fetched_at=300.0)
+        with self.assertRaises(RuntimeError), first:
+            with second:
+                first.write([SimpleNamespace(id="a1", name="first")])
+                second.write([SimpleNamespace(id="b1", name="second")])
+                first.write([SimpleNamespace(id="a2", name="first")])
+                second.write([SimpleNamespace(id="b2", name="second")])
+            raise RuntimeError("first fetch failed")
+
+        # The second replace swapped in only its own pages, and the first one's abort left them alone.
+        self.assertEqual(self.store.ids("groups"), ["b1", "b2"])
+        self.assertEqual(self.store.fetched_at("groups"), 300.0)
+        self.assertEqual(self.store._conn.execute("SELECT COUNT(*) FROM objects").fetchone()[0], 2)
+
+    def test_upsert_and_delete(self):
+        self.store.upsert("groups", [SimpleNamespace(id="g1", name="renamed")], deleted=["g2"])
+        self.assertEqual(self.store.get("groups", "g1").name, "renamed")
+        self.assertFalse(self.store.contains("groups", "g2"))
+        self.assertEqual(self.store.ids("groups")[:2], ["g0", "g1"])
+
+    def test_only_replace_moves_replaced_at(self):
+        self.store.upsert("groups", [SimpleNamespace(id="g1", name="renamed")])
+        self.store.mark_fetched("groups", 150.0)
+        self.assertEqual(self.store.fetched_at("groups"), 150.0)
+        self.assertEqual(self.store.replaced_at("groups"), 100.0)
+        self.assertIsNone(self.store.replaced_at("users"))
+
+    def test_reopened_store_keeps_collections(self):
+        self.store.close()
+        self.store = DirectoryStore(os.path.join(self._tmp.name, "okta_cache.sqlite3"))
+        self.assertEqual(self.store.fetched_at("groups"), 100.0)
+        self.assertEqual(self.store.count("groups"), 1200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import asyncio
+import importlib.util
+import tempfile
+import unittest
+
+from okta_flowcharting.fake_okta import FakeOktaClient
+from okta_flowcharting.synthetic_org import ACCESS_POLICY, SCALES, SIGNON_POLICY, OrgScale, generate_org
+
+HAS_OKTA = importlib.util.find_spec("okta") is not None
+HAS_SCHEMDRAW = importlib.util.find_spec("schemdraw") is not None
+
+if HAS_OKTA:
+    from okta_flowcharting.benchmarks import bench_synthetic
+    from okta_flowcharting.okta_data import OktaCache, okta_timestamp
+
+
+async def drain(first_page):
+    items, response, _ = await first_page
+    pages = [items]
+    while response.has_next():
+        items, _ = await response.next()
+        pages.append(items)
+    return pages
+
+
+class SyntheticOrgTests(unittest.TestCase):
+    def test_deterministic_and_self_consistent(self):
+        scale = OrgScale(users=40, groups=8, zones=3, access_policies=4, signon_policies=2, rules_per_policy=4)
+        org = generate_org(scale, seed=7)
+        self.assertEqual(generate_org(scale, seed=7).counts(), org.counts())
+        self.assertEqual(org.counts()["rules"], 6 * 4)
+        group_ids = {group.id for group in org.groups}
+        zone_ids = {zone.id for zone in org.zones} | {"ALL_ZONES"}
+        for rules in org.rules.values():
+            self.assertTrue(rules[-1].system)
+            for rule in rules:
+                groups = rule.conditions.people.groups if rule.conditions.people else None
+                for operator in ("include", "exclude"):
+                    self.assertLessEqual(set(getattr(groups, operator, None) or ()), group_ids)
+                    self.assertLessEqual(set(getattr(rule.conditions.network, operator, None) or ()), zone_ids)
+        self.assertEqual(len(org.memberships[org.groups[0].id]), 40)
+        self.assertEqual(org.policies[SIGNON_POLICY][-1].conditions.people.groups.include, [org.groups[0].id])
+
+    def test_large_preset_matches_requested_scale(self):
+        large = SCALES["large"]
+        self.assertEqual((large.users, large.groups, large.access_policies, large.rules_per_policy), (100_000, 10_000, 500, 20))
+
+
+class FakeOktaClientTests(unittest.TestCase):
+    def setUp(self):
+        self.org = generate_org(SCALES["tiny"])
+        self.client = FakeOktaClient(self.org, page_sizes={"users": 20})
+
+    def test_paginates_and_caps_page_size(self):
+        pages = asyncio.run(drain(self.client.list_users({"limit": 200})))
+        self.assertEqual([len(page) for page in pages], [20, 20, 10])
+        self.assertEqual(self.client.requests["users"], 3)
+
+    def test_delta_filter(self):
+        self.org.users[3].last_updated = "2030-01-01T00:00:00.000Z"
+        pages = asyncio.run(drain(self.client.list_users({"limit": 20, "filter": 'lastUpdated gt "2029-01-01T00:00:00.000Z"'})))
+        self.assertEqual([user.id for page in pages for user in page], [self.org.users[3].id])
+
+    def test_policies_by_type(self):
+        policies, _, _ = asyncio.run(self.client.list_policies({"type": ACCESS_POLICY}))
+        rules, _, _ = asyncio.run(self.client.list_policy_rules(policies[0].id))
+        self.assertEqual(len(policies), 3)
+        self.assertEqual(len(rules), 3)
+
+
+@unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+class FakeOrgThroughCacheTests(unittest.TestCase):
+    def test_cache_loads_and_refreshes_from_fake(self):
+        org = generate_org(SCALES["tiny"])
+        client = FakeOktaClient(org)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = OktaCache(client, cache_dir=cache_dir)
+            asyncio.run(cache.prefetch())
+            apps = asyncio.run(cache.get_apps())
+            self.assertEqual(len(cache.users), 50)
+            self.assertEqual(set(apps), {app["id"] for app in org.apps})
+
+            org.users[0].profile.login = "renamed@example.com"
+            org.users[0].last_updated = okta_timestamp(2_000_000_000)
+            refreshed = OktaCache(client, cache_dir=cache_dir, ttl=0)
+            users = asyncio.run(refreshed.get_users())
+            self.assertEqual(users[org.users[0].id].profile.login, "renamed@example.com")
+            self.assertEqual(client.requests["users"], 2)
+            cache.store.close()
+            refreshed.store.close()
+
+    def test_bench_reports_every_phase(self):
+        report = asyncio.run(bench_synthetic("tiny", svg=HAS_SCHEMDRAW, processes=1))
+        phases = ["fetch", "cache_load", "extract", "layout", "render_dot", "render_mermaid", "render_json", "translate", "evaluate"]
+        self.assertLessEqual(set(phases), set(report.timings))
+        self.assertEqual("render_svg" in report.timings, HAS_SCHEMDRAW)
+        self.assertEqual((report.counts["users"], report.counts["rules"]), (50, 15))
+
+
+if __name__ == "__main__":
+    unittest.main()
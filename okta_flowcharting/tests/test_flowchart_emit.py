@@ -0,0 +1,62 @@
+import io
+import json
+import subprocess
+import sys
+import unittest
+
+from okta_flowcharting.flowchart_emit import emit
+from okta_flowcharting.flowchart_graph import build_signon_graph, iter_signon_sections, signon_tail
+
+from test_flowchart_graph import BUNDLES, make_names
+
+
+def emitted(fmt):
+    out = io.StringIO()
+    emit(fmt, out, "signon", iter_signon_sections(BUNDLES, make_names()), tail=signon_tail)
+    return out.getvalue()
+
+
+class EmitTests(unittest.TestCase):
+    def test_dot(self):
+        dot = emitted("dot")
+        self.assertTrue(dot.startswith("digraph signon {\n"))
+        self.assertTrue(dot.endswith("}\n"))
+        self.assertIn('"start" -> "policy:p1";', dot)
+        self.assertIn('"policy:p1" -> "policy:p2" [label="NO"];', dot)
+        self.assertIn('"policy:p2" -> "end:denied" [label="NO"];', dot)
+        self.assertIn('"policy:p1" -> "rule:r1" [label="YES"];', dot)
+
+    def test_mermaid(self):
+        mermaid = emitted("mermaid").splitlines()
+        self.assertEqual(mermaid[0], "flowchart TD")
+        self.assertIn("  policy_p1 -->|NO| policy_p2", mermaid)
+        self.assertIn('  end_denied["Access is denied."]', mermaid)
+
+    def test_json_matches_graph(self):
+        document = json.loads(emitted("json"))
+        graph = build_signon_graph(BUNDLES, make_names())
+        self.assertEqual(document["kind"], "signon")
+        self.assertEqual([section["policy_id"] for section in document["sections"]], ["p1", "p2"])
+        self.assertEqual(
+            [node["id"] for section in document["sections"] for node in section["nodes"]],
+            [node.id for section in graph.sections for node in section.nodes],
+        )
+        self.assertEqual([node["id"] for node in document["tail"]["nodes"]], ["end:denied"])
+
+    def test_empty_chart(self):
+        self.assertEqual(json.loads(self._emit_empty("json"))["sections"], [])
+        self.assertEqual(self._emit_empty("dot").count("->"), 0)
+
+    def _emit_empty(self, fmt):
+        out = io.StringIO()
+        emit(fmt, out, "signon", iter([]), tail=signon_tail)
+        return out.getvalue()
+
+    def test_does_not_import_schemdraw(self):
+        code = "import sys, okta_flowcharting.flowchart_emit; print('schemdraw' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+import importlib.util
+import unittest
+from collections import Counter
+from types import SimpleNamespace as NS
+
+from okta_flowcharting.flowchart_graph import (
+    DENIED_LABEL,
+    VALID_USER_LABEL,
+    DirectoryNames,
+    build_access_graph,
+    build_signon_graph,
+    label_format,
+    page_graph,
+)
+
+HAS_SCHEMDRAW = importlib.util.find_spec("schemdraw") is not None
+
+
+class CountingGroups(dict):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.lookups = Counter()
+
+    def __getitem__(self, key):
+        self.lookups[key] += 1
+        return super().__getitem__(key)
+
+
+def make_rule(rule_id, groups=None, zones=None, access="ALLOW", system=False):
+    conditions = NS(
+        user_type=None,
+        people=NS(groups=NS(include=groups, exclude=None) if groups else None, users=None),
+        device=None,
+        platform=None,
+        network=NS(include=zones, exclude=None),
+        risk_score=NS(level="ANY"),
+        el_condition=None,
+        identity_provider=None,
+        auth_context=None,
+        risk=None,
+    )
+    actions = NS(app_sign_on=NS(access=access), signon=NS(access=access))
+    return NS(id=rule_id, name=f"Rule {rule_id}", system=system, conditions=conditions, actions=actions)
+
+
+def make_bundle(policy_id, rules):
+    policy = NS(id=policy_id, name=f"Policy {policy_id}", conditions=NS(people=NS(groups=NS(include=["everyone"]))))
+    return NS(policy=policy, rules=rules)
+
+
+def make_names():
+    return DirectoryNames(
+        groups=CountingGroups({
+            "everyone": NS(profile=NS(name="Everyone")),
+            "admins": NS(profile=NS(name="Admins")),
+        }),
+        networks={"office": NS(name="Office")},
+    )
+
+
+BUNDLES = {
+    "p1": make_bundle("p1", [make_rule("r1", groups=["admins"], zones=["office"]), make_rule("r2", system=True)]),
+    "p2": make_bundle("p2", [make_rule("r3", groups=["admins"], access="DENY"), make_rule("r4", system=True)]),
+}
+APPS = {"a1": {"name": "App 1"}, "a2": {"name": "App 2"}}
+
+
+class AccessGraphTests(unittest.TestCase):
+    def setUp(self):
+        self.names = make_names()
+        self.graph = build_access_graph(BUNDLES, {"p1": ["a1"], "p2": ["a2"]}, APPS, self.names, unit=3.0)
+
+    def test_offsets_follow_previous_rule_count(self):
+        self.assertEqual([section.offset for section in self.graph.sections], [3.0, 3.0 / 2 * 2 + 4 * 2 + 1])
+
+    def test_conditions_extracted_once_per_rule(self):
+        self.assertEqual(self.names.groups.lookups["admins"], 2)
+
+    def test_rows_and_edges(self):
+        first, second = self.graph.sections
+        row = first.rows[0]
+        self.assertEqual(row.first.label, label_format("Is user in group Admins"))
+        self.assertEqual([edge.kind for edge in row.edges], ["wire", "arrow", "wire", "arrow"])
+        self.assertEqual(row.edges[0].dst, "rule:r2")
+        self.assertEqual(first.rows[1].first.label, VALID_USER_LABEL)
+        # The last rule of a policy with another policy below gets an access denied box.
+        self.assertEqual([node.label for node in first.rows[1].nodes], [DENIED_LABEL, "Access is Allowed."])
+        self.assertEqual(second.rows[0].nodes[-1].label, DENIED_LABEL)
+
+    def test_node_ids_are_unique_and_edges_resolve(self):
+        ids = [node.id for node in self.graph.nodes()]
+        self.assertEqual(len(ids), len(set(ids)))
+        for edge in self.graph.edges():
+            if edge.src is not None:
+                self.assertIn(edge.src[0], ids)
+            if edge.dst is not None:
+                self.assertIn(edge.dst, ids)
+
+
+class SignonGraphTests(unittest.TestCase):
+    def test_last_rules_fall_through_to_next_policy(self):
+        graph = build_signon_graph(BUNDLES, make_names())
+        self.assertEqual(graph.sections[0].node.label, "Is the user enrolled in Okta?")
+        self.assertEqual(graph.sections[1].offset, 3.0 / 2 * 1 + 4 * 2)
+        last_row = graph.sections[0].rows[-1]
+        self.assertEqual([edge.dst for edge in last_row.edges if edge.kind == "wire"], ["policy:p2"])
+        self.assertEqual(graph.tail[0].src, ("policy:p2", "S"))
+
+    def test_page_graph_stands_in_for_next_policy(self):
+        graph = build_signon_graph(BUNDLES, make_names())
+        first = page_graph(graph, 0)
+        self.assertEqual(first.sections[0].offset, graph.unit)
+        stand_in = first.sections[1]
+        self.assertEqual((stand_in.node.id, stand_in.node.kind, stand_in.rows), ("policy:p2", "box", []))
+        self.assertEqual(stand_in.offset, graph.sections[1].offset)
+        ids = {node.id for node in first.nodes()}
+        self.assertTrue(all(edge.dst in ids for edge in first.edges() if edge.dst is not None))
+
+        last = page_graph(graph, 1)
+        self.assertEqual([section.policy_id for section in last.sections], ["p2"])
+        self.assertEqual(last.tail, graph.tail)
+
+
+@unittest.skipUnless(HAS_SCHEMDRAW, "schemdraw not installed")
+class RenderGraphTests(unittest.TestCase):
+    def test_places_every_node(self):
+        import schemdraw
+
+        from okta_flowcharting.flowchart_render import render_graph
+
+        graph = build_signon_graph(BUNDLES, make_names())
+        placed = render_graph(schemdraw.Drawing(), graph)
+        self.assertEqual(set(placed), {node.id for node in graph.nodes()})
+
+
+if __name__ == "__main__":
+    unittest.main()
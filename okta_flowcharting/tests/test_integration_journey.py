@@ -60,6 +60,12 @@ class JourneyIntegrationTest(unittest.TestCase):
         steps = self.policy.evaluate(ctx)
         self.assertEqual(steps, ["DENY"])
 
+    def test_compiled_policy_matches_evaluate(self):
+        compiled = self.policy.compile()
+        for groups in (["guests"], ["admins"], ["employees"], ["unknown"], ["admins", "guests"], []):
+            ctx = UserContext(username="u", groups=groups)
+            self.assertEqual(compiled.evaluate(ctx), self.policy.evaluate(ctx))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import importlib.util
+import tempfile
+import unittest
+from types import SimpleNamespace as NS
+
+from okta_flowcharting import metrics
+from okta_flowcharting.fake_okta import FakeOktaClient
+from okta_flowcharting.synthetic_org import SCALES, generate_org
+
+HAS_OKTA = importlib.util.find_spec("okta") is not None
+
+if HAS_OKTA:
+    from okta_flowcharting.okta_data import OktaCache
+
+
+class FakeHTTPClient:
+    """Answers with the queued statuses, like the SDK's HTTP client."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+
+    async def send_request(self, request):
+        return request, NS(status=self.statuses.pop(0)), "[]", None
+
+
+class MetricsTests(unittest.TestCase):
+    def tearDown(self):
+        metrics.disable()
+
+    def test_disabled_records_nothing(self):
+        self.assertIsNone(metrics.active())
+        with metrics.span("anything"):
+            metrics.inc("calls")
+            metrics.observe("seconds", 1.0)
+        self.assertIs(metrics.span("a"), metrics.span("b"))
+        http = FakeHTTPClient(200)
+        client = NS(get_request_executor=lambda: NS(_http_client=http))
+        metrics.instrument_client(client)
+        self.assertNotIn("send_request", vars(http))
+
+    def test_counters_spans_and_export(self):
+        registry = metrics.enable()
+        metrics.inc("okta_requests_total", endpoint="users", status="200")
+        metrics.inc("okta_requests_total", endpoint="users", status="200")
+        with metrics.span("access.layout"):
+            pass
+        self.assertEqual(registry.counter("okta_requests_total", endpoint="users", status="200"), 2)
+        self.assertEqual(registry.summary("span_seconds", span="access.layout").count, 1)
+
+        text = registry.to_prometheus()
+        self.assertIn("# TYPE okta_requests_total counter\n", text)
+        self.assertIn('okta_requests_total{endpoint="users",status="200"} 2\n', text)
+        self.assertIn('span_seconds_count{span="access.layout"} 1\n', text)
+        document = registry.to_dict()
+        self.assertEqual(document["counters"][0]["labels"], {"endpoint": "users", "status": "200"})
+
+    def test_label_values_are_escaped(self):
+        registry = metrics.enable()
+        metrics.inc("hits", policy='say "hi"\n')
+        self.assertIn('hits{policy="say \\"hi\\"\\n"} 1', registry.to_prometheus())
+
+    def test_endpoint_family_drops_ids(self):
+        self.assertEqual(metrics.endpoint_family("https://x.okta.com/api/v1/policies/00p1ab2/rules?limit=20"), "policies/rules")
+        self.assertEqual(metrics.endpoint_family("https://x.okta.com/api/v1/meta/types/user"), "meta/types/user")
+
+    def test_instrumented_client_counts_retries(self):
+        registry = metrics.enable()
+        http = FakeHTTPClient(429, 200)
+        client = NS(get_request_executor=lambda: NS(_http_client=http))
+        metrics.instrument_client(client)
+        metrics.instrument_client(client)
+        request = {"url": "https://x.okta.com/api/v1/users?limit=200", "headers": {}}
+        asyncio.run(http.send_request(request))
+        request["headers"][metrics.RETRY_COUNT_HEADER] = "1"
+        asyncio.run(http.send_request(request))
+        self.assertEqual(registry.counter("okta_requests_total", endpoint="users", status="429"), 1)
+        self.assertEqual(registry.counter("okta_requests_total", endpoint="users", status="200"), 1)
+        self.assertEqual(registry.counter("okta_retries_total", endpoint="users"), 1)
+        self.assertEqual(registry.summary("okta_request_seconds", endpoint="users").count, 2)
+
+
+@unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+class CacheMetricsTests(unittest.TestCase):
+    def tearDown(self):
+        metrics.disable()
+
+    def test_hits_misses_and_load_time(self):
+        registry = metrics.enable()
+        client = FakeOktaClient(generate_org(SCALES["tiny"]))
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = OktaCache(client, cache_dir=cache_dir)
+            asyncio.run(cache.get_groups())
+            asyncio.run(cache.get_groups())
+            reloaded = OktaCache(client, cache_dir=cache_dir)
+            asyncio.run(reloaded.get_groups())
+            cache.store.close()
+            reloaded.store.close()
+        for result in ("miss", "memory", "hit"):
+            self.assertEqual(registry.counter("okta_cache_lookups_total", collection="groups", result=result), 1)
+        self.assertEqual(registry.summary("okta_cache_load_seconds", collection="groups").count, 2)
+        self.assertEqual(registry.counter("okta_requests_total", endpoint="groups", status="200"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
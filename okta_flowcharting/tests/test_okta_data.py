@@ -0,0 +1,304 @@
+import asyncio
+import importlib.util
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+HAS_OKTA = importlib.util.find_spec("okta") is not None
+
+if HAS_OKTA:
+    from okta_flowcharting.okta_data import OktaCache, OktaRequestError, get_okta_policies
+
+
+class FakeResponse:
+    """Serves the remaining pages of a list call like ``OktaAPIResponse``."""
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+
+    def has_next(self):
+        return bool(self.pages)
+
+    async def next(self):
+        return self.pages.pop(0), None
+
+
+def paged(items, page_size):
+    pages = [items[i:i + page_size] for i in range(0, len(items), page_size)] or [[]]
+    return pages[0], FakeResponse(pages[1:]), None
+
+
+class FakeExecutor:
+    """Request executor serving raw JSON app pages filtered by status."""
+
+    def __init__(self, apps):
+        self.apps = apps
+        self.urls = []
+
+    async def create_request(self, method, url, body, headers, oauth):
+        self.urls.append(url)
+        return {"method": method, "url": url}, None
+
+    async def execute(self, request):
+        query = parse_qs(urlparse(request["url"]).query)
+        status = query["filter"][0].split('"')[1]
+        items, response, _ = paged([a for a in self.apps if a["status"] == status], int(query["limit"][0]))
+        response.get_body = lambda: items
+        return response, None
+
+
+class FakeClient:
+    """Minimal stand-in for the parts of the Okta client used by okta_data."""
+
+    def __init__(self, policies=(), rules=None, users=(), groups=(), delay=0.0):
+        self.policies = list(policies)
+        self.rules = rules or {}
+        self.users = list(users)
+        self.groups = list(groups)
+        self.updated_users = []
+        self.executor = FakeExecutor([])
+        self.queries = []
+        self.calls = 0
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rule_page_size = 100
+        self.rule_errors = set()
+
+    async def list_policies(self, query):
+        return paged(self.policies, 100)
+
+    async def list_policy_rules(self, policy_id):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        if policy_id in self.rule_errors:
+            return None, None, SimpleNamespace(message=f"rules of {policy_id} unavailable")
+        return paged(self.rules[policy_id], self.rule_page_size)
+
+    async def list_users(self, query):
+        self.calls += 1
+        self.queries.append(query)
+        users = self.updated_users if "filter" in query else self.users
+        return paged(users, query["limit"])
+
+    async def list_groups(self, query):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return paged(self.groups, query["limit"])
+
+    async def list_group_users(self, group_id, query):
+        self.calls += 1
+        members = [u for u in self.users if group_id in getattr(u, "groups", ())]
+        return paged(members, query["limit"])
+
+    def get_request_executor(self):
+        return self.executor
+
+    async def list_network_zones(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return paged([SimpleNamespace(id="z1")], 100)
+
+    async def list_user_types(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return paged([SimpleNamespace(id="t1")], 100)
+
+
+@unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+class GetOktaPoliciesTests(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        os.chdir(self._tmp.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def test_rules_fetched_concurrently_in_policy_order(self):
+        policies = [SimpleNamespace(id=f"p{i}") for i in range(10)]
+        rules = {p.id: [SimpleNamespace(id=f"{p.id}-r")] for p in policies}
+        client = FakeClient(policies=policies, rules=rules, delay=0.01)
+
+        bundles = asyncio.run(get_okta_policies(client, "ACCESS_POLICY", concurrency=3))
+
+        self.assertEqual(list(bundles), [p.id for p in policies])
+        self.assertEqual(bundles["p4"].rules[0].id, "p4-r")
+        self.assertEqual(client.max_in_flight, 3)
+
+    def test_rules_follow_pagination(self):
+        policies = [SimpleNamespace(id="p1")]
+        client = FakeClient(policies=policies, rules={"p1": [SimpleNamespace(id=f"r{i}") for i in range(5)]})
+        client.rule_page_size = 2
+        bundles = asyncio.run(get_okta_policies(client, "ACCESS_POLICY"))
+        self.assertEqual([rule.id for rule in bundles["p1"].rules], ["r0", "r1", "r2", "r3", "r4"])
+
+    def test_failed_rule_request_raises_and_caches_nothing(self):
+        policies = [SimpleNamespace(id="p1"), SimpleNamespace(id="p2")]
+        client = FakeClient(policies=policies, rules={"p1": [], "p2": [SimpleNamespace(id="r")]})
+        client.rule_errors.add("p2")
+        with self.assertRaisesRegex(OktaRequestError, "rules of p2"):
+            asyncio.run(get_okta_policies(client, "ACCESS_POLICY"))
+
+        client.rule_errors.clear()
+        bundles = asyncio.run(get_okta_policies(client, "ACCESS_POLICY"))
+        self.assertEqual([rule.id for rule in bundles["p2"].rules], ["r"])
+
+
+@unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+class OktaCacheStreamingTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.users = [SimpleNamespace(id=f"u{i}") for i in range(450)]
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    async def _collect_pages(self, cache):
+        return [len(page) async for page in cache.iter_users()]
+
+    def test_iter_users_follows_pagination(self):
+        cache = OktaCache(FakeClient(users=self.users), cache_dir=self._tmp.name)
+        sizes = asyncio.run(self._collect_pages(cache))
+        self.assertEqual(sizes, [200, 200, 50])
+        self.assertEqual(len(cache.users), 450)
+
+    def test_loaded_collection_is_iterated_in_pages(self):
+        users = [SimpleNamespace(id=f"u{i}") for i in range(1200)]
+        cache = OktaCache(FakeClient(users=users), cache_dir=self._tmp.name)
+        asyncio.run(cache.get_users())
+        self.assertEqual(asyncio.run(self._collect_pages(cache)), [500, 500, 200])
+
+    def test_users_reloaded_from_cache_file(self):
+        asyncio.run(OktaCache(FakeClient(users=self.users), cache_dir=self._tmp.name).get_users())
+        client = FakeClient()
+        cache = OktaCache(client, cache_dir=self._tmp.name)
+        users = asyncio.run(cache.get_users())
+        self.assertEqual(client.calls, 0)
+        self.assertEqual(list(users), [u.id for u in self.users])
+
+    def test_abandoned_iteration_leaves_no_partial_cache(self):
+        async def first_page(cache):
+            pages = cache.iter_users()
+            page = await pages.__anext__()
+            await pages.aclose()
+            return page
+
+        cache = OktaCache(FakeClient(users=self.users), cache_dir=self._tmp.name)
+        asyncio.run(first_page(cache))
+        self.assertEqual(cache.users, {})
+        self.assertIsNone(cache.store.fetched_at("users"))
+        self.assertEqual(cache.store.count("users"), 0)
+
+
+@unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+class OktaCacheSingleFlightTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_concurrent_getters_share_one_fetch(self):
+        client = FakeClient(groups=[SimpleNamespace(id="g1")], delay=0.01)
+        cache = OktaCache(client, cache_dir=self._tmp.name)
+
+        async def run():
+            return await asyncio.gather(*(cache.get_groups() for _ in range(5)))
+
+        results = asyncio.run(run())
+        self.assertEqual(client.calls, 1)
+        self.assertTrue(all(r is results[0] for r in results))
+
+    def test_prefetch_loads_all_collections(self):
+        client = FakeClient(users=[SimpleNamespace(id="u1")], groups=[SimpleNamespace(id="g1")])
+        cache = OktaCache(client, cache_dir=self._tmp.name)
+        asyncio.run(cache.prefetch())
+        self.assertEqual(client.calls, 4)
+        self.assertEqual(set(cache.networks), {"z1"})
+        self.assertEqual(set(cache.user_types), {"t1"})
+        self.assertEqual(set(cache.groups), {"g1"})
+        self.assertEqual(set(cache.users), {"u1"})
+
+
+@unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+class OktaCacheRefreshTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        users = [SimpleNamespace(id=f"u{i}", status="ACTIVE", login=f"user{i}") for i in range(3)]
+        asyncio.run(OktaCache(FakeClient(users=users), cache_dir=self._tmp.name).get_users())
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_fresh_cache_is_trusted(self):
+        client = FakeClient()
+        users = asyncio.run(OktaCache(client, cache_dir=self._tmp.name).get_users())
+        self.assertEqual(client.calls, 0)
+        self.assertEqual(len(users), 3)
+
+    def test_expired_cache_merges_delta(self):
+        client = FakeClient()
+        client.updated_users = [
+            SimpleNamespace(id="u0", status="ACTIVE", login="renamed"),
+            SimpleNamespace(id="u1", status="DEPROVISIONED", login="user1"),
+            SimpleNamespace(id="u9", status="ACTIVE", login="user9"),
+        ]
+        users = asyncio.run(OktaCache(client, cache_dir=self._tmp.name, ttl=0).get_users())
+
+        self.assertEqual(client.calls, 1)
+        self.assertIn('lastUpdated gt "', client.queries[0]["filter"])
+        self.assertEqual(sorted(users), ["u0", "u2", "u9"])
+        self.assertEqual(users["u0"].login, "renamed")
+
+        # The merged snapshot is written back for the next run.
+        reloaded = asyncio.run(OktaCache(FakeClient(), cache_dir=self._tmp.name).get_users())
+        self.assertEqual(sorted(reloaded), ["u0", "u2", "u9"])
+
+    def test_old_full_fetch_is_redone_to_drop_deleted_objects(self):
+        # u1 was deleted outright, which no delta query would ever report.
+        client = FakeClient(users=[SimpleNamespace(id=f"u{i}", status="ACTIVE", login=f"user{i}") for i in (0, 2)])
+        users = asyncio.run(OktaCache(client, cache_dir=self._tmp.name, ttl=0, full_refresh_age=0).get_users())
+
+        self.assertEqual(client.calls, 1)
+        self.assertNotIn("filter", client.queries[0])
+        self.assertEqual(sorted(users), ["u0", "u2"])
+
+
+@unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+class OktaCacheAppsTests(unittest.TestCase):
+    def test_apps_listed_per_status_and_cached(self):
+        apps = [{"id": f"a{i}", "status": "ACTIVE" if i % 3 else "INACTIVE", "name": f"app{i}"} for i in range(500)]
+        client = FakeClient()
+        client.executor = FakeExecutor(apps)
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = OktaCache(client, cache_dir=tmp)
+            by_id = asyncio.run(cache.get_apps())
+            self.assertEqual(len(by_id), 500)
+            self.assertEqual(by_id["a7"]["name"], "app7")
+            self.assertEqual(len(client.executor.urls), 2)
+
+            reloaded = asyncio.run(OktaCache(FakeClient(), cache_dir=tmp).get_apps())
+            self.assertEqual(len(reloaded), 500)
+
+
+@unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+class OktaCacheGroupMembersTests(unittest.TestCase):
+    def test_members_fetched_per_group(self):
+        users = [SimpleNamespace(id=f"u{i}", groups=["g0"] if i % 2 else ["g0", "g1"]) for i in range(250)]
+        groups = [SimpleNamespace(id="g0"), SimpleNamespace(id="g1"), SimpleNamespace(id="g2")]
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = OktaCache(FakeClient(users=users, groups=groups), cache_dir=tmp)
+            members = asyncio.run(cache.get_group_members())
+            self.assertEqual(len(members["g0"]["members"]), 250)
+            self.assertEqual(len(members["g1"]["members"]), 125)
+            self.assertEqual(members["g2"]["members"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
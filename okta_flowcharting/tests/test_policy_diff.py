@@ -0,0 +1,90 @@
+import time
+import unittest
+
+from test_flowchart_graph import make_bundle, make_rule
+
+from okta_flowcharting.policy_diff import diff_snapshots, merge
+from okta_flowcharting.synthetic_org import ACCESS_POLICY
+
+
+def make_snapshot():
+    return {
+        "p1": make_bundle("p1", [make_rule("r1", groups=["admins"]), make_rule("r2", groups=["staff"]), make_rule("r3", system=True)]),
+        "p2": make_bundle("p2", [make_rule("r4", system=True)]),
+    }
+
+
+def rule_changes(changes, policy_id):
+    (policy,) = [policy for policy in changes.policies if policy.policy_id == policy_id]
+    return {rule.rule_id: rule for rule in policy.rules}
+
+
+class PolicyDiffTests(unittest.TestCase):
+    def test_identical_snapshots(self):
+        changes = diff_snapshots(make_snapshot(), make_snapshot())
+        self.assertFalse(changes)
+        self.assertEqual(changes.unchanged, 2)
+
+    def test_timestamps_alone_are_not_changes(self):
+        old, new = make_snapshot(), make_snapshot()
+        new["p1"].rules[0].last_updated = "2024-03-01T00:00:00.000Z"
+        self.assertFalse(diff_snapshots(old, new))
+
+    def test_added_removed_and_moved_rules(self):
+        old = {"p1": make_bundle("p1", [make_rule(rule_id) for rule_id in ("r1", "r2", "r3", "r4")])}
+        new = {"p1": make_bundle("p1", [make_rule(rule_id) for rule_id in ("r2", "r3", "r5", "r1")])}
+        rules = rule_changes(diff_snapshots(old, new), "p1")
+
+        self.assertEqual(sorted(rules), ["r1", "r4", "r5"])
+        self.assertEqual((rules["r1"].changes, rules["r1"].old_position, rules["r1"].new_position), (["moved"], 0, 3))
+        self.assertEqual((rules["r5"].changes, rules["r5"].new_position), (["added"], 2))
+        self.assertEqual(rules["r4"].changes, ["removed"])
+
+    def test_condition_edits_and_action_flips(self):
+        old, new = make_snapshot(), make_snapshot()
+        new["p1"].rules[0].conditions.people.groups.include = ["everyone"]
+        new["p1"].rules[1].actions.app_sign_on.access = "DENY"
+        del new["p1"].rules[2]
+        rules = rule_changes(diff_snapshots(old, new, ACCESS_POLICY), "p1")
+
+        self.assertEqual((rules["r1"].changes, rules["r1"].fields, rules["r1"].action), (["modified"], ["conditions"], None))
+        self.assertEqual((rules["r2"].fields, rules["r2"].action), (["actions"], ["ALLOW", "DENY"]))
+        self.assertEqual((rules["r3"].changes, rules["r3"].old_position), (["removed"], 2))
+
+    def test_policies_added_removed_and_affected(self):
+        old, new = make_snapshot(), make_snapshot()
+        del new["p2"]
+        new["p3"] = make_bundle("p3", [make_rule("r6", system=True)])
+        new["p1"].policy.name = "Renamed"
+        changes = diff_snapshots(old, new, ACCESS_POLICY)
+
+        self.assertEqual([(policy.policy_id, policy.change) for policy in changes.policies],
+                         [("p1", "modified"), ("p3", "added"), ("p2", "removed")])
+        self.assertTrue(changes.policies[0].policy_modified)
+        self.assertEqual(changes.affected(ACCESS_POLICY), {"p1", "p3"})
+        self.assertEqual(changes.affected("OKTA_SIGN_ON"), set())
+        document = merge(changes, diff_snapshots(old, old)).to_dict()
+        self.assertEqual((document["unchanged"], len(document["policies"])), (2, 3))
+
+    def test_large_snapshots_diff_quickly(self):
+        def snapshot():
+            bundles = {}
+            for index in range(500):
+                rules = [make_rule(f"p{index}r{position}", groups=["admins"], zones=["office"]) for position in range(20)]
+                for rule in rules:
+                    rule.last_updated = "2024-01-01T00:00:00.000Z"
+                bundles[f"p{index}"] = make_bundle(f"p{index}", rules)
+                bundles[f"p{index}"].policy.last_updated = "2024-01-01T00:00:00.000Z"
+            return bundles
+
+        old, new = snapshot(), snapshot()
+        new["p7"].rules[0].actions.app_sign_on.access = "DENY"
+        new["p7"].rules[0].last_updated = "2024-02-01T00:00:00.000Z"
+
+        started = time.perf_counter()
+        changes = diff_snapshots(old, new, ACCESS_POLICY)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertEqual((changes.unchanged, changes.affected()), (499, {"p7"}))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+from types import SimpleNamespace as NS
+
+from test_flowchart_graph import make_bundle, make_rule
+
+from okta_flowcharting.policy_index import PolicyIndex, object_references
+
+
+def make_snapshots():
+    platform_rule = make_rule("r5")
+    platform_rule.conditions.platform = NS(include=[NS(type="MOBILE", os=NS(type="IOS"))], exclude=None)
+    platform_rule.conditions.people.users = NS(include=None, exclude=["u1"])
+    signon = make_bundle("s1", [make_rule("r9", zones=["ALL_ZONES"]), make_rule("r10", system=True)])
+    signon.policy.conditions.people.groups = NS(include=["admins"], exclude=None)
+    return {
+        "ACCESS_POLICY": {
+            "p1": make_bundle("p1", [make_rule("r1", groups=["admins"], zones=["office"]), make_rule("r2", system=True)]),
+            "p2": make_bundle("p2", [make_rule("r3", groups=["admins", "staff"]), platform_rule]),
+        },
+        "OKTA_SIGN_ON": {"s1": signon},
+    }
+
+
+class PolicyIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.snapshots = make_snapshots()
+        self.index = PolicyIndex.build(self.snapshots)
+
+    def test_references_in_policy_and_rule_order(self):
+        found = [(ref.policy_id, ref.rule_id, ref.operator) for ref in self.index.references("group", "admins")]
+        self.assertEqual(found, [("p1", "r1", "include"), ("p2", "r3", "include"), ("s1", None, "include")])
+        self.assertEqual(self.index.policies("group", "admins"), ["p1", "p2", "s1"])
+
+    def test_every_kind_is_indexed(self):
+        self.assertEqual([ref.rule_id for ref in self.index.references("zone", "office")], ["r1"])
+        self.assertEqual([ref.operator for ref in self.index.references("user", "u1")], ["exclude"])
+        self.assertTrue(self.index.is_referenced("platform", "IOS"))
+        # "All zones" isn't a zone that can be deleted.
+        self.assertFalse(self.index.is_referenced("zone", "ALL_ZONES"))
+        self.assertEqual(self.index.referenced_ids("group"), {"admins", "everyone", "staff"})
+        self.assertEqual(self.index.unreferenced("group", ["admins", "contractors"]), ["contractors"])
+
+    def test_refreshing_one_policy_reindexes_only_it(self):
+        access = dict(self.snapshots["ACCESS_POLICY"])
+        access["p2"] = make_bundle("p2", [make_rule("r3", groups=["staff"]), make_rule("r4", system=True)])
+        access["p2"].rules[0].last_updated = "2024-02-01T00:00:00.000Z"
+
+        self.assertEqual(self.index.update_snapshot("ACCESS_POLICY", access), 1)
+        self.assertEqual(self.index.policies("group", "admins"), ["p1", "s1"])
+        self.assertEqual(self.index.policies("group", "staff"), ["p2"])
+        self.assertFalse(self.index.is_referenced("platform", "IOS"))
+        self.assertFalse(self.index.update_policy("ACCESS_POLICY", access["p2"]))
+
+    def test_rules_without_last_updated_are_compared_by_content(self):
+        bundle = make_bundle("p3", [make_rule("r6", groups=["admins"])])
+        bundle.rules[0].last_updated = None
+        self.assertTrue(self.index.update_policy("ACCESS_POLICY", bundle))
+        self.assertFalse(self.index.update_policy("ACCESS_POLICY", make_bundle("p3", [make_rule("r6", groups=["admins"])])))
+
+        bundle.rules[0].conditions.people.groups = NS(include=["staff"], exclude=None)
+        self.assertTrue(self.index.update_policy("ACCESS_POLICY", bundle))
+        self.assertEqual([ref.rule_id for ref in self.index.references("group", "staff")], ["r3", "r6"])
+        self.assertNotIn("p3", self.index.policies("group", "admins"))
+
+    def test_policies_gone_from_a_snapshot_are_dropped(self):
+        self.index.update_snapshot("ACCESS_POLICY", {})
+        self.assertEqual(self.index.policies("group", "admins"), ["s1"])
+        self.assertFalse(self.index.is_referenced("zone", "office"))
+
+    def test_object_references(self):
+        rule = make_rule("r1", groups=["admins"], zones=["ALL_ZONES"])
+        self.assertEqual(list(object_references(rule)), [("group", "include", "admins")])
+
+
+if __name__ == "__main__":
+    unittest.main()
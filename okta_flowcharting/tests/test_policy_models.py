@@ -1,3 +1,5 @@
+import pickle
+import random
 import unittest
 from okta_flowcharting.policy_models import (
     PolicyConditionModel,
@@ -5,6 +7,9 @@ from okta_flowcharting.policy_models import (
     AssuranceRequirement,
     AssuranceLevel,
     AuthenticationPolicyModel,
+    EvaluationCache,
+    INTERNER,
+    NOT_ASSIGNED,
     UserContext,
 )
 
@@ -14,11 +19,53 @@ class PolicyModelTests(unittest.TestCase):
         cond = PolicyConditionModel("group", "in", ["admins"])
         self.assertTrue(cond.test(None))
 
+    def test_group_condition_checks_membership(self):
+        ctx = UserContext(username="alice", groups=["admins"])
+        self.assertTrue(PolicyConditionModel("group", "include", ["admins", "ops"]).test(ctx))
+        self.assertFalse(PolicyConditionModel("group", "exclude", ["admins"]).test(ctx))
+
     def test_rule_compliance(self):
         rule = PolicyRuleModel(id="1", name="r1")
         req = AssuranceRequirement(name="anything", tests=[lambda r: True])
         self.assertTrue(rule.is_compliant(req))
 
+    def test_zone_and_user_type_conditions(self):
+        ctx = UserContext(username="alice", zones=["office"], user_type="employee")
+        self.assertTrue(PolicyConditionModel("zone", "include", ["office", "vpn"]).test(ctx))
+        self.assertFalse(PolicyConditionModel("zone", "exclude", ["office"]).test(ctx))
+        self.assertTrue(PolicyConditionModel("user_type", "include", ["employee"]).test(ctx))
+        self.assertFalse(PolicyConditionModel("user_type", "include", ["contractor"]).test(UserContext(username="bob")))
+
+    def test_user_condition_with_never_interned_id(self):
+        for operator, expected in (("include", True), ("exclude", False)):
+            user_id = f"00uFresh{operator}"
+            self.assertIsNone(INTERNER.lookup(user_id))
+            cond = PolicyConditionModel("user", operator, [user_id])
+            ctx = UserContext(username="bob", user_id=user_id)
+            self.assertEqual([cond.test(ctx), cond.test(ctx)], [expected, expected])
+
+
+class UserContextTests(unittest.TestCase):
+    def test_contexts_share_interned_ids(self):
+        a = UserContext(username="a", groups=["admins", "staff"])
+        b = UserContext(username="b", groups=["staff"])
+        self.assertEqual(a.group_ids & b.group_ids, {INTERNER.lookup("staff")})
+        self.assertIn("admins", a.groups)
+        self.assertNotIn("never-interned", a.groups)
+        self.assertEqual(set(a.groups), {"admins", "staff"})
+
+    def test_groups_can_be_reassigned(self):
+        ctx = UserContext(username="a")
+        ctx.groups = ["admins"]
+        self.assertEqual(set(ctx.groups), {"admins"})
+
+    def test_pickles_by_name(self):
+        ctx = UserContext(username="a", groups=["admins"], zones=["office"], user_type="employee")
+        self.assertEqual(pickle.loads(pickle.dumps(ctx)), ctx)
+        cond = PolicyConditionModel("group", "include", ["admins"])
+        cond.test(ctx)
+        self.assertIsNone(pickle.loads(pickle.dumps(cond))._value_ids)
+
 
 class AuthenticationPolicyTests(unittest.TestCase):
     def test_evaluate_policy(self):
@@ -40,5 +87,109 @@ class AuthenticationPolicyTests(unittest.TestCase):
         self.assertEqual(steps, ["enter password", "verify factor", "ALLOW"])
 
 
+class CompiledPolicyTests(unittest.TestCase):
+    def setUp(self):
+        contractors = PolicyConditionModel("group", "include", ["contractors"])
+        not_suspended = PolicyConditionModel("group", "exclude", ["suspended"])
+        on_call = PolicyConditionModel("custom", "eq", ["on-call"])
+        on_call.test = lambda ctx: ctx.username.startswith("oncall-")
+        self.policy = AuthenticationPolicyModel(
+            name="Mixed",
+            rules=[
+                PolicyRuleModel(id="1", name="Suspended", conditions=[PolicyConditionModel("group", "include", ["suspended"])], action="DENY"),
+                PolicyRuleModel(id="2", name="OnCall", conditions=[on_call, not_suspended], action="ALLOW", steps=["password"]),
+                PolicyRuleModel(
+                    id="3",
+                    name="ContractorAdmins",
+                    conditions=[contractors, PolicyConditionModel("group", "include", ["admins"])],
+                    action="ALLOW",
+                    steps=["password", "factor"],
+                ),
+                PolicyRuleModel(id="4", name="Staff", conditions=[PolicyConditionModel("group", "include", ["staff", "contractors"])], action="ALLOW", steps=["factor"]),
+            ],
+        )
+        self.compiled = self.policy.compile()
+
+    def test_matches_linear_evaluation(self):
+        cases = [
+            ("alice", []),
+            ("alice", ["suspended", "staff"]),
+            ("oncall-bob", ["staff"]),
+            ("oncall-bob", ["suspended"]),
+            ("carol", ["contractors"]),
+            ("carol", ["contractors", "admins"]),
+            ("dave", ["staff"]),
+        ]
+        for username, groups in cases:
+            ctx = UserContext(username=username, groups=groups)
+            self.assertEqual(self.compiled.evaluate(ctx), self.policy.evaluate(ctx), (username, groups))
+
+    def test_evaluate_many_matches_evaluate(self):
+        rng = random.Random(7)
+        names = ["alice", "oncall-bob", "carol"]
+        groups = ["suspended", "contractors", "admins", "staff", "unrelated"]
+        contexts = [
+            UserContext(username=rng.choice(names), groups=rng.sample(groups, rng.randint(0, 3)))
+            for _ in range(300)
+        ]
+        expected = [self.policy.evaluate(ctx) for ctx in contexts]
+        self.assertEqual(self.policy.evaluate_many(contexts), expected)
+        self.assertEqual(self.policy.evaluate_many([]), [])
+
+    def test_policy_conditions_gate_every_path(self):
+        self.policy.conditions = [PolicyConditionModel("group", "exclude", ["unrelated"])]
+        rng = random.Random(11)
+        groups = ["suspended", "contractors", "admins", "staff", "unrelated"]
+        contexts = [UserContext(username="carol", groups=rng.sample(groups, rng.randint(0, 3))) for _ in range(100)]
+        expected = [self.policy.evaluate(ctx) for ctx in contexts]
+        self.assertIn([NOT_ASSIGNED], expected)
+        self.assertEqual(self.policy.compile().evaluate_many(contexts), expected)
+        self.assertEqual([self.policy.compile().evaluate(ctx) for ctx in contexts], expected)
+        self.assertEqual(EvaluationCache(self.policy).evaluate_many(contexts), expected)
+
+    def test_only_custom_and_extra_includes_are_residual(self):
+        self.assertEqual(sorted(self.compiled.residual), [1, 2])
+        self.assertEqual(self.compiled.include[INTERNER.lookup("contractors")], 0b1100)
+        self.assertEqual(self.compiled.exclude[INTERNER.lookup("suspended")], 0b0010)
+
+
+class EvaluationCacheTests(unittest.TestCase):
+    def make_policy(self, *conditions):
+        rules = [PolicyRuleModel(id=str(i), name=str(i), conditions=[c], action="ALLOW", steps=[str(i)]) for i, c in enumerate(conditions)]
+        return AuthenticationPolicyModel(name="Cached", rules=rules)
+
+    def test_signature_ignores_unreferenced_groups(self):
+        policy = self.make_policy(
+            PolicyConditionModel("group", "include", ["admins"]),
+            PolicyConditionModel("group", "exclude", ["contractors"]),
+        )
+        cache = EvaluationCache(policy, maxsize=8)
+        contexts = [
+            UserContext(username="a", groups=["admins", "team-a"]),
+            UserContext(username="b", groups=["team-b", "admins"]),
+            UserContext(username="c", groups=["contractors"]),
+            UserContext(username="d", groups=[]),
+        ]
+        self.assertEqual(cache.evaluate_many(contexts), [policy.evaluate(ctx) for ctx in contexts])
+        self.assertEqual(cache.info()["misses"], 3)
+        self.assertEqual(cache.evaluate(UserContext(username="e", groups=["admins"])), ["0", "ALLOW"])
+        self.assertEqual(cache.hits, 2)
+
+    def test_lru_eviction(self):
+        policy = self.make_policy(*(PolicyConditionModel("group", "include", [f"g{i}"]) for i in range(3)))
+        cache = EvaluationCache(policy, maxsize=2)
+        for group in ("g0", "g1", "g2", "g0"):
+            cache.evaluate(UserContext(username="u", groups=[group]))
+        self.assertEqual(cache.info(), {"hits": 0, "misses": 4, "size": 2, "maxsize": 2})
+
+    def test_custom_condition_of_unknown_type_disables_cache(self):
+        cond = PolicyConditionModel("custom", "eq", ["x"])
+        cond.test = lambda ctx: ctx.username == "x"
+        cache = EvaluationCache(self.make_policy(cond))
+        self.assertFalse(cache.enabled)
+        self.assertEqual(cache.evaluate(UserContext(username="x")), ["0", "ALLOW"])
+        self.assertEqual(cache.evaluate(UserContext(username="y")), ["DENY"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,155 @@
+import pickle
+import unittest
+from types import SimpleNamespace
+
+from okta_flowcharting.policy_models import NOT_ASSIGNED, EvaluationCache, UserContext
+from okta_flowcharting.policy_translation import PolicyTranslator, translate_policy, translate_rule
+
+
+def include_exclude(include=(), exclude=()):
+    return SimpleNamespace(include=list(include), exclude=list(exclude))
+
+
+def make_rule(rule_id, last_updated="t0", access="ALLOW", factor_mode=None, status="ACTIVE", **conditions):
+    people = SimpleNamespace(groups=conditions.pop("groups", None), users=conditions.pop("users", None))
+    conds = SimpleNamespace(
+        people=people,
+        user_type=conditions.pop("user_type", None),
+        network=conditions.pop("network", None),
+        device=conditions.pop("device", None),
+        platform=conditions.pop("platform", None),
+        risk_score=conditions.pop("risk_score", None),
+        el_condition=conditions.pop("el_condition", None),
+    )
+    sign_on = SimpleNamespace(access=access, verification_method=SimpleNamespace(factor_mode=factor_mode))
+    return SimpleNamespace(
+        id=rule_id,
+        name=f"Rule {rule_id}",
+        status=status,
+        last_updated=last_updated,
+        conditions=conds,
+        actions=SimpleNamespace(app_sign_on=sign_on),
+    )
+
+
+def make_bundle(policy_id, rules):
+    return SimpleNamespace(policy=SimpleNamespace(id=policy_id, name=f"Policy {policy_id}"), rules=rules)
+
+
+class TranslateRuleTests(unittest.TestCase):
+    def test_people_and_user_type_conditions(self):
+        rule = translate_rule(
+            make_rule(
+                "r1",
+                groups=include_exclude(["g-admins"], ["g-suspended"]),
+                users=include_exclude(exclude=["u-breakglass"]),
+                user_type=include_exclude(["t-employee"]),
+                factor_mode="2FA",
+            )
+        )
+        self.assertEqual(rule.steps, ["2FA"])
+        admin = UserContext(username="a", groups=["g-admins"], user_id="u-1", user_type="t-employee")
+        self.assertTrue(all(cond.test(admin) for cond in rule.conditions))
+        for context in (
+            UserContext(username="b", groups=["g-admins", "g-suspended"], user_id="u-2", user_type="t-employee"),
+            UserContext(username="c", groups=["g-admins"], user_id="u-breakglass", user_type="t-employee"),
+            UserContext(username="d", groups=["g-admins"], user_id="u-3", user_type="t-contractor"),
+        ):
+            self.assertFalse(all(cond.test(context) for cond in rule.conditions), context.username)
+
+    def test_zones_device_platform_and_risk(self):
+        rule = translate_rule(
+            make_rule(
+                "r1",
+                network=include_exclude(["ALL_ZONES"], ["z-blocked"]),
+                device=SimpleNamespace(registered=True, managed=False),
+                platform=include_exclude([SimpleNamespace(type="MOBILE", os=SimpleNamespace(type="ANY"))]),
+                risk_score=SimpleNamespace(level="LOW"),
+            )
+        )
+        self.assertEqual(
+            [cond.condition_type for cond in rule.conditions],
+            ["device_registered", "platform", "zone", "zone", "risk"],
+        )
+        ok = UserContext(username="a", zones=["z-office"], platform="IOS", device_registered=True, risk_level="LOW")
+        self.assertTrue(all(cond.test(ok) for cond in rule.conditions))
+        for changes in (
+            {"zones": []},
+            {"zones": ["z-blocked"]},
+            {"platform": "WINDOWS"},
+            {"device_registered": False},
+            {"risk_level": "HIGH"},
+        ):
+            context = UserContext(**{**dict(username="b", zones=["z-office"], platform="IOS", device_registered=True, risk_level="LOW"), **changes})
+            self.assertFalse(all(cond.test(context) for cond in rule.conditions), changes)
+
+    def test_default_conditions_are_dropped(self):
+        rule = translate_rule(make_rule("r1", risk_score=SimpleNamespace(level="ANY"), device=SimpleNamespace(registered=False, managed=False)))
+        self.assertEqual(rule.conditions, [])
+
+    def test_translated_policy_pickles_and_caches(self):
+        policy = translate_policy(
+            make_bundle(
+                "p1",
+                [
+                    make_rule("r1", access="DENY", network=include_exclude(exclude=["ALL_ZONES"])),
+                    make_rule("r2", status="INACTIVE"),
+                    make_rule("r3", platform=include_exclude([SimpleNamespace(type="DESKTOP", os=SimpleNamespace(type="MACOS"))])),
+                ],
+            )
+        )
+        self.assertEqual([rule.id for rule in policy.rules], ["r1", "r3"])
+        restored = pickle.loads(pickle.dumps(policy))
+        mac = UserContext(username="m", zones=["z-office"], platform="MACOS")
+        self.assertEqual(restored.evaluate(mac), ["ALLOW"])
+        self.assertEqual(restored.evaluate(UserContext(username="n")), ["DENY"])
+        self.assertTrue(EvaluationCache(policy).enabled)
+
+    def test_policy_group_assignment_gates_rules(self):
+        bundle = make_bundle("gsp", [make_rule("r1")])
+        bundle.policy.conditions = SimpleNamespace(people=SimpleNamespace(groups=include_exclude(["g-admins"])))
+        assigned, other = UserContext(username="a", groups=["g-admins"]), UserContext(username="b", groups=["g-staff"])
+        for policy in (translate_policy(bundle), PolicyTranslator().translate({"gsp": bundle})["gsp"]):
+            self.assertEqual(policy.evaluate(assigned), ["ALLOW"])
+            self.assertEqual(policy.evaluate(other), [NOT_ASSIGNED])
+            self.assertEqual(EvaluationCache(policy).evaluate_many([other, assigned]), [[NOT_ASSIGNED], ["ALLOW"]])
+
+
+class PolicyTranslatorTests(unittest.TestCase):
+    def test_reuses_unchanged_rules_and_policies(self):
+        translator = PolicyTranslator()
+        first = {
+            "p1": make_bundle("p1", [make_rule("r1"), make_rule("r2")]),
+            "p2": make_bundle("p2", [make_rule("r3")]),
+        }
+        models = translator.translate(first)
+        self.assertIs(translator.translate(first), models)
+        self.assertEqual(translator.translated, 3)
+
+        second = {
+            "p1": make_bundle("p1", [make_rule("r1"), make_rule("r2", last_updated="t1")]),
+            "p2": make_bundle("p2", [make_rule("r3")]),
+        }
+        refreshed = translator.translate(second)
+        self.assertEqual(translator.translated, 4)
+        self.assertIs(refreshed["p2"], models["p2"])
+        self.assertIsNot(refreshed["p1"], models["p1"])
+        self.assertIs(refreshed["p1"].rules[0], models["p1"].rules[0])
+        self.assertEqual(len(translator._rules), 3)
+
+    def test_rules_without_last_updated_are_retranslated_when_edited(self):
+        translator = PolicyTranslator()
+        user = UserContext(username="a", user_id="u1")
+        denied = translator.translate({"p1": make_bundle("p1", [make_rule("r1", last_updated=None, access="DENY")])})
+        self.assertEqual(denied["p1"].evaluate(user), ["DENY"])
+        unchanged = translator.translate({"p1": make_bundle("p1", [make_rule("r1", last_updated=None, access="DENY")])})
+        self.assertIs(unchanged["p1"], denied["p1"])
+
+        allowed = translator.translate({"p1": make_bundle("p1", [make_rule("r1", last_updated=None, access="ALLOW")])})
+        self.assertEqual(allowed["p1"].evaluate(user), ["ALLOW"])
+        self.assertEqual(translator.translated, 2)
+        self.assertEqual(len(translator._rules), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
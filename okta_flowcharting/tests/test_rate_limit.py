@@ -0,0 +1,127 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace as NS
+
+from okta_flowcharting import metrics
+from okta_flowcharting.rate_limit import RateLimitScheduler
+
+
+class WindowedHTTPClient:
+    """Allows ``limit`` requests per endpoint per ``window`` seconds, then answers 429."""
+
+    def __init__(self, limit, window, latency=0.01):
+        self.limit = limit
+        self.window = window
+        self.latency = latency
+        self.window_start = time.time()
+        self.used = {}
+        self.statuses = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def send_request(self, request):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        now = time.time()
+        if now >= self.window_start + self.window:
+            self.window_start += self.window * ((now - self.window_start) // self.window)
+            self.used = {}
+        path = request["url"].split("?")[0]
+        used = self.used[path] = self.used.get(path, 0) + 1
+        status = 200 if used <= self.limit else 429
+        self.statuses.append(status)
+        headers = {
+            "X-Rate-Limit-Limit": str(self.limit),
+            "X-Rate-Limit-Remaining": str(max(0, self.limit - used)),
+            "X-Rate-Limit-Reset": str(self.window_start + self.window),
+        }
+        return request, NS(status=status, headers=headers), "[]", None
+
+
+def attached(http, **options):
+    client = NS(get_request_executor=lambda: NS(_http_client=http))
+    return RateLimitScheduler(**options).attach(client)
+
+
+async def send_all(http, urls):
+    return await asyncio.gather(*(http.send_request({"url": url}) for url in urls))
+
+
+class RateLimitSchedulerTests(unittest.TestCase):
+    def tearDown(self):
+        metrics.disable()
+
+    def test_stays_within_budget_across_windows(self):
+        http = WindowedHTTPClient(limit=10, window=0.3)
+        attached(http, headroom=0.2)
+        started = time.monotonic()
+        results = asyncio.run(send_all(http, ["https://x/api/v1/users"] * 24))
+        elapsed = time.monotonic() - started
+
+        self.assertEqual([result[1].status for result in results], [200] * 24)
+        self.assertNotIn(429, http.statuses)
+        # 8 usable requests per window: three windows, no fixed backoff on top.
+        self.assertLess(elapsed, 1.2)
+
+    def test_concurrency_grows_with_budget_and_is_capped(self):
+        http = WindowedHTTPClient(limit=1000, window=60, latency=0.02)
+        attached(http, initial_concurrency=1, max_concurrency=6)
+        asyncio.run(send_all(http, ["https://x/api/v1/groups"] * 40))
+        self.assertEqual(http.peak, 6)
+
+    def test_endpoint_families_have_separate_budgets(self):
+        http = WindowedHTTPClient(limit=3, window=60)
+        scheduler = RateLimitScheduler(headroom=0)
+        scheduler.attach(NS(get_request_executor=lambda: NS(_http_client=http)))
+
+        async def run():
+            await send_all(http, ["https://x/api/v1/users"] * 3)
+            # Users are spent for a minute; policy rules still go straight out.
+            return await asyncio.wait_for(send_all(http, ["https://x/api/v1/policies/rst1/rules"] * 3), 1)
+
+        results = asyncio.run(run())
+        self.assertEqual([result[1].status for result in results], [200] * 3)
+        self.assertEqual(scheduler.budgets["users"].remaining, 0)
+        self.assertEqual(scheduler.budgets["policies/rules"].limit, 3)
+
+    def test_429_waits_for_reset_then_retries(self):
+        registry = metrics.enable()
+        http = WindowedHTTPClient(limit=2, window=0.3)
+        # Another client already spent this window's budget.
+        http.used["https://x/api/v1/zones"] = 2
+        metrics.instrument_client(attached(http))
+        started = time.monotonic()
+        (result,) = asyncio.run(send_all(http, ["https://x/api/v1/zones"]))
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(result[1].status, 200)
+        self.assertEqual(http.statuses, [429, 200])
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(registry.counter("okta_throttled_total", endpoint="zones"), 1)
+        self.assertEqual(registry.counter("okta_retries_total", endpoint="zones"), 1)
+        # Each attempt is counted, and the wait for the reset isn't timed as a request.
+        self.assertEqual(registry.counter("okta_requests_total", endpoint="zones", status="429"), 1)
+        self.assertEqual(registry.counter("okta_requests_total", endpoint="zones", status="200"), 1)
+        self.assertLess(registry.summary("okta_request_seconds", endpoint="zones").max, 0.1)
+        self.assertEqual(registry.summary("okta_rate_limit_wait_seconds", endpoint="zones").count, 1)
+
+    def test_gives_up_after_max_retries(self):
+        http = WindowedHTTPClient(limit=0, window=0.05)
+        attached(http, max_retries=1)
+        (result,) = asyncio.run(send_all(http, ["https://x/api/v1/apps"]))
+        self.assertEqual(result[1].status, 429)
+        self.assertEqual(http.statuses, [429, 429])
+
+    def test_attach_is_idempotent(self):
+        http = WindowedHTTPClient(limit=5, window=60)
+        attached(http)
+        send = http.send_request
+        attached(http)
+        self.assertIs(http.send_request, send)
+
+
+if __name__ == "__main__":
+    unittest.main()
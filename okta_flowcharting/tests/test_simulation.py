@@ -0,0 +1,108 @@
+import asyncio
+import io
+import json
+import unittest
+from types import SimpleNamespace
+
+from okta_flowcharting.policy_models import (
+    NOT_ASSIGNED,
+    AuthenticationPolicyModel,
+    PolicyConditionModel,
+    PolicyRuleModel,
+)
+from okta_flowcharting.simulation import FirstAssigned, simulate, simulate_org
+
+
+def make_policies():
+    vip = PolicyConditionModel("custom", "eq", ["vip"])
+    vip.test = lambda ctx: ctx.username.startswith("vip")
+    signon = AuthenticationPolicyModel(
+        name="Sign-on",
+        rules=[
+            PolicyRuleModel(id="1", name="Guests", conditions=[PolicyConditionModel("group", "include", ["guests"])], action="DENY"),
+            PolicyRuleModel(id="2", name="Everyone", action="ALLOW", steps=["password"]),
+        ],
+    )
+    access = AuthenticationPolicyModel(
+        name="Access",
+        rules=[
+            PolicyRuleModel(id="3", name="VIP", conditions=[vip], action="ALLOW"),
+            PolicyRuleModel(id="4", name="Admins", conditions=[PolicyConditionModel("group", "include", ["admins"])], action="ALLOW", steps=["factor"]),
+        ],
+    )
+    return [signon, access]
+
+
+USERS = [("vip-1", ["admins"]), ("guest-1", ["guests"]), ("admin-1", ["admins"]), ("nobody", [])] * 25
+
+
+class SimulateTests(unittest.TestCase):
+    def test_counts_users_per_journey(self):
+        report = simulate(make_policies(), USERS, processes=1, shard_size=7)
+        self.assertEqual(report.total, 100)
+        self.assertEqual(report.counts[(("password", "ALLOW"), ("ALLOW",))], 25)
+        self.assertEqual(report.counts[(("DENY",), ("DENY",))], 25)
+        self.assertEqual(report.users_with_action("DENY"), 50)
+
+    def test_process_pool_matches_inline(self):
+        inline = simulate(make_policies(), USERS, processes=1, shard_size=10)
+        pooled = simulate(make_policies(), USERS, processes=2, shard_size=10)
+        self.assertEqual(pooled.counts, inline.counts)
+
+    def test_per_user_journeys_streamed_in_order(self):
+        out = io.StringIO()
+        simulate(make_policies(), USERS[:4], processes=1, shard_size=3, out=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row["user"] for row in rows], ["vip-1", "guest-1", "admin-1", "nobody"])
+        self.assertEqual(rows[2]["journey"], [["password", "ALLOW"], ["factor", "ALLOW"]])
+
+    def test_only_the_first_assigned_policy_of_a_group_applies(self):
+        admins = AuthenticationPolicyModel(
+            name="Admins",
+            rules=[PolicyRuleModel(id="1", name="MFA", action="ALLOW", steps=["factor"])],
+            conditions=[PolicyConditionModel("group", "include", ["admins"])],
+        )
+        default = AuthenticationPolicyModel(
+            name="Default",
+            rules=[PolicyRuleModel(id="2", name="Guests", conditions=[PolicyConditionModel("group", "include", ["guests"])], action="DENY"),
+                   PolicyRuleModel(id="3", name="Everyone", action="ALLOW", steps=["password"])],
+            conditions=[PolicyConditionModel("group", "exclude", ["nobodies"])],
+        )
+        users = USERS[:4] + [("outsider", ["nobodies"])]
+        for processes in (1, 2):
+            report = simulate([FirstAssigned("Global session", [admins, default])], users, processes=processes, shard_size=2)
+            self.assertEqual(report.policies, ["Global session"])
+            self.assertEqual(report.counts, {
+                (("factor", "ALLOW"),): 2,
+                (("DENY",),): 1,
+                (("password", "ALLOW"),): 1,
+                ((NOT_ASSIGNED,),): 1,
+            })
+            # Admins never reach the default policy, so only the guest is denied.
+            self.assertEqual(report.users_with_action("DENY"), 1)
+
+
+class FakeCache:
+    async def get_users(self):
+        return {
+            "u1": SimpleNamespace(id="u1", profile=SimpleNamespace(login="admin@example.com")),
+            "u2": SimpleNamespace(id="u2", profile=SimpleNamespace(login="guest@example.com")),
+        }
+
+    async def get_group_members(self):
+        return {
+            "admins": {"id": "admins", "members": ["u1"]},
+            "guests": {"id": "guests", "members": ["u2"]},
+        }
+
+
+class SimulateOrgTests(unittest.TestCase):
+    def test_contexts_built_from_group_memberships(self):
+        report = asyncio.run(simulate_org(FakeCache(), make_policies(), processes=1))
+        self.assertEqual(report.total, 2)
+        self.assertEqual(report.counts[(("password", "ALLOW"), ("factor", "ALLOW"))], 1)
+        self.assertEqual(report.counts[(("DENY",), ("DENY",))], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
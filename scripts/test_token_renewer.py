@@ -0,0 +1,198 @@
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from collections import Counter
+from types import SimpleNamespace
+
+from test_vault_sync import HAS_OKTA, run_script, write_okta_cache
+from token_renewer import RenewalScheduler, VaultRenewer
+from vault_sync import FileStore, token_hash
+
+
+class FakeRenewer:
+    """Issues tokens that live ``ttl`` seconds, recording when each renewal ran."""
+
+    def __init__(self, ttl=0.3, latency=0.005, failing=(), leases=None):
+        self.ttl = ttl
+        self.latency = latency
+        self.failing = set(failing)
+        self.leases = leases or {}
+        self.lookups = []
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def lookup(self, user_id):
+        self.lookups.append(user_id)
+        return self.leases.get(user_id)
+
+    async def renew(self, user_id):
+        self.calls.append((user_id, time.time()))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+            if user_id in self.failing:
+                self.failing.discard(user_id)
+                raise RuntimeError("vault sealed")
+            return time.time() + self.ttl
+        finally:
+            self.in_flight -= 1
+
+
+class RecordingStore(FileStore):
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.written = []
+
+    def write(self, user_id, token, digest, exists):
+        self.written.append(token)
+        super().write(user_id, token, digest, exists)
+
+
+async def run_for(scheduler, seconds):
+    stop = asyncio.Event()
+    asyncio.get_running_loop().call_later(seconds, stop.set)
+    await scheduler.run(stop)
+
+
+class RenewalSchedulerTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.state = os.path.join(self._tmp.name, "renewals.json")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_tokens_issued_together_are_spread_over_the_lead_window(self):
+        expires_at = 1_000_000.0
+        scheduler = RenewalScheduler(FakeRenewer(), min_lead=60, max_lead=300, clock=lambda: expires_at - 3600, rng=random.Random(7))
+        for index in range(2000):
+            scheduler.add(f"00u{index}", expires_at)
+
+        leads = [expires_at - state.renew_at for state in scheduler.tokens.values()]
+        self.assertTrue(all(60 <= lead <= 300 for lead in leads))
+        per_bin = Counter(int((lead - 60) // 24) for lead in leads)
+        self.assertEqual(len(per_bin), 10)
+        self.assertLess(max(per_bin.values()) / min(per_bin.values()), 1.5)
+
+    def test_renews_only_tokens_close_to_expiry_within_the_cap(self):
+        renewer = FakeRenewer()
+        scheduler = RenewalScheduler(renewer, self.state, min_lead=0.05, max_lead=0.1, concurrency=3)
+        now = time.time()
+        for index in range(20):
+            scheduler.add(f"soon{index}", now + 0.15)
+        for index in range(5):
+            scheduler.add(f"later{index}", now + 3600)
+
+        asyncio.run(run_for(scheduler, 0.3))
+
+        renewed = {user_id for user_id, _ in renewer.calls}
+        self.assertEqual(renewed, {f"soon{index}" for index in range(20)})
+        self.assertTrue(all(at >= now + 0.15 - 0.1 for _, at in renewer.calls))
+        self.assertLessEqual(renewer.peak, 3)
+        # The renewed tokens' next renewals were pushed out to their new expiry.
+        self.assertTrue(all(scheduler.tokens[user_id].renew_at > now + 0.15 for user_id in renewed))
+
+    def test_schedule_survives_restart(self):
+        scheduler = RenewalScheduler(FakeRenewer(ttl=60), self.state, min_lead=0.01, max_lead=0.02)
+        for index in range(5):
+            scheduler.add(f"00u{index}", time.time())
+        asyncio.run(run_for(scheduler, 0.1))
+        self.assertEqual(scheduler.renewed, 5)
+
+        restarted_renewer = FakeRenewer()
+        restarted = RenewalScheduler(restarted_renewer, self.state, min_lead=0.01, max_lead=0.02)
+        restarted.add("00u0")
+        self.assertEqual(restarted.tokens, scheduler.tokens)
+        asyncio.run(run_for(restarted, 0.05))
+        self.assertEqual(restarted_renewer.calls, [])
+
+    def test_failed_renewal_is_retried(self):
+        renewer = FakeRenewer(failing={"00u1"})
+        scheduler = RenewalScheduler(renewer, min_lead=0.01, max_lead=0.02, retry_delay=0.02)
+        scheduler.add("00u1", time.time())
+        asyncio.run(run_for(scheduler, 0.15))
+
+        self.assertEqual([user_id for user_id, _ in renewer.calls][:2], ["00u1", "00u1"])
+        self.assertEqual(scheduler.renewed, 1)
+        self.assertEqual(scheduler.tokens["00u1"].failures, 0)
+
+    def test_short_leases_are_not_renewed_in_a_loop(self):
+        renewer = FakeRenewer(ttl=0.02)
+        scheduler = RenewalScheduler(renewer, min_lead=0.05, max_lead=0.1)
+        scheduler.add("00u1", time.time())
+        asyncio.run(run_for(scheduler, 0.2))
+        # Each renewal waits for half of the 20ms lease: about a dozen, not thousands.
+        self.assertLess(len(renewer.calls), 25)
+
+    def test_unknown_expiry_is_looked_up_before_renewing(self):
+        now = time.time()
+        renewer = FakeRenewer(leases={"fresh": now + 3600, "expiring": now + 0.05})
+        scheduler = RenewalScheduler(renewer, min_lead=0.05, max_lead=0.1)
+        for user_id in ("fresh", "expiring", "no-lease"):
+            scheduler.add(user_id)
+        asyncio.run(run_for(scheduler, 0.15))
+
+        self.assertEqual(sorted(renewer.lookups), ["expiring", "fresh", "no-lease"])
+        self.assertEqual(sorted({user_id for user_id, _ in renewer.calls}), ["expiring", "no-lease"])
+        self.assertEqual(scheduler.tokens["fresh"].expires_at, now + 3600)
+        self.assertGreater(scheduler.tokens["fresh"].renew_at, now + 3600 - 0.1 - 0.001)
+
+    def test_imports_from_any_working_directory(self):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "token_renewer.py")
+        code = (
+            "import importlib.util, sys; spec = importlib.util.spec_from_file_location('renewer', sys.argv[1]); "
+            "module = sys.modules['renewer'] = importlib.util.module_from_spec(spec); spec.loader.exec_module(module)"
+        )
+        env = {key: value for key, value in os.environ.items() if key != "PYTHONPATH"}
+        subprocess.run([sys.executable, "-c", code, path], cwd=self._tmp.name, env=env, check=True, capture_output=True)
+
+    @unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+    def test_okta_flag_runs_from_any_working_directory(self):
+        # With no active users there is nothing to renew, which the script reports once it has read the cache.
+        write_okta_cache(self._tmp.name, [SimpleNamespace(id="00u1", status="DEPROVISIONED")])
+        result = run_script("token_renewer.py", "--okta", "--state", self.state, cwd=self._tmp.name)
+        self.assertNotIn("ModuleNotFoundError", result.stderr)
+        self.assertEqual(result.returncode, 2, result.stderr)
+        self.assertIn("no user IDs given", result.stderr)
+
+    def test_vault_renewer_looks_up_lease_ttls(self):
+        def run(argv):
+            if argv[4] == "list":
+                if argv[-1].endswith("/nobody"):
+                    raise subprocess.CalledProcessError(2, argv, stderr="No value found at sys/leases/lookup/buildkite/creds/nobody")
+                return json.dumps(["a1", "b2"])
+            return json.dumps({"data": {"ttl": {"buildkite/creds/00u1/a1": 120, "buildkite/creds/00u1/b2": 600}[argv[-1]]}})
+
+        renewer = VaultRenewer(RecordingStore(os.path.join(self._tmp.name, "items")), run=run)
+        self.assertAlmostEqual(asyncio.run(renewer.lookup("00u1")), time.time() + 600, delta=5)
+        self.assertIsNone(asyncio.run(renewer.lookup("nobody")))
+
+    def test_vault_renewer_writes_only_new_tokens(self):
+        issued = iter(["t1", "t1", "t2"])
+        calls = []
+
+        def run(argv):
+            calls.append(argv)
+            return json.dumps({"lease_duration": 900, "data": {"token": next(issued)}})
+
+        store = RecordingStore(os.path.join(self._tmp.name, "items"))
+        renewer = VaultRenewer(store, run=run)
+
+        for _ in range(3):
+            expires_at = asyncio.run(renewer.renew("00u1"))
+        self.assertAlmostEqual(expires_at, time.time() + 900, delta=5)
+        self.assertEqual(store.written, ["t1", "t2"])
+        self.assertEqual(store.stored_hash("00u1"), token_hash("t2"))
+        self.assertEqual(calls[0][-1], "buildkite/creds/00u1")
+
+
+if __name__ == "__main__":
+    unittest.main()
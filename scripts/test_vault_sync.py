@@ -0,0 +1,171 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+
+from vault_sync import HASH_FIELD, REPO_ROOT, FileStore, FileVault, OnePasswordCLI, VaultCLI, main, sync, token_hash
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+HAS_OKTA = importlib.util.find_spec("okta") is not None
+
+
+def write_okta_cache(directory, users):
+    """Credentials and a freshly cached user collection, so ``--okta`` needs no network."""
+    if REPO_ROOT not in sys.path:
+        sys.path.append(REPO_ROOT)
+    from okta_flowcharting.directory_store import DirectoryStore
+
+    with open(os.path.join(directory, "okta.creds"), "w") as fh:
+        json.dump({"orgUrl": "https://example.okta.com", "token": "not-a-real-token"}, fh)
+    with DirectoryStore.in_dir(directory) as store, store.replace("users") as writer:
+        writer.write(users)
+
+
+def run_script(name, *args, cwd):
+    """Run a script the way the docs do, from a directory other than the checkout."""
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONPATH"}
+    return subprocess.run(
+        [sys.executable, os.path.join(SCRIPTS, name), *args], cwd=cwd, env=env, capture_output=True, text=True, timeout=60,
+    )
+
+
+class SlowVault(FileVault):
+    """FileVault that records how many reads overlap."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def read_token(self, user_id):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        if user_id == "broken":
+            raise RuntimeError("vault unavailable")
+        return super().read_token(user_id)
+
+
+class FakeOp:
+    """Answers ``op`` commands from a dict of items, recording each call."""
+
+    def __init__(self, items=None, errors=None):
+        self.items = items or {}
+        self.errors = errors or {}
+        self.calls = []
+
+    def __call__(self, argv):
+        self.calls.append(list(argv))
+        for target, stderr in self.errors.items():
+            if target in argv[-1] or target in argv[3:4]:
+                raise subprocess.CalledProcessError(1, argv, stderr=stderr)
+        if argv[:3] == ["op", "item", "get"]:
+            if argv[3] not in self.items:
+                raise subprocess.CalledProcessError(1, argv, stderr=f'[ERROR] "{argv[3]}" isn\'t an item in any vault.')
+            return json.dumps({"fields": [{"label": HASH_FIELD, "value": self.items[argv[3]]}]})
+        if argv[:3] == ["op", "plugin", "run"]:
+            return json.dumps({"data": {"token": "t-" + argv[-1].rsplit("/", 1)[1]}, "metadata": {}})
+        return ""
+
+
+class VaultSyncTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tokens_path = os.path.join(self._tmp.name, "tokens.json")
+        self.write_tokens({f"00u{index}": f"token-{index}" for index in range(20)})
+        self.store = FileStore(os.path.join(self._tmp.name, "items"))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write_tokens(self, tokens):
+        with open(self.tokens_path, "w") as fh:
+            json.dump(tokens, fh)
+
+    def test_unchanged_tokens_are_skipped(self):
+        ids = [f"00u{index}" for index in range(20)]
+        self.assertEqual(sync(ids, FileVault(self.tokens_path), self.store).counts(), {"created": 20})
+        self.assertEqual(sync(ids, FileVault(self.tokens_path), self.store).counts(), {"unchanged": 20})
+
+        self.write_tokens({**{f"00u{index}": f"token-{index}" for index in range(20)}, "00u3": "rotated"})
+        report = sync(ids, FileVault(self.tokens_path), self.store)
+        self.assertEqual(report.counts(), {"unchanged": 19, "updated": 1})
+        self.assertEqual(self.store.stored_hash("00u3"), token_hash("rotated"))
+
+    def test_bounded_pool_and_per_user_failures(self):
+        vault = SlowVault(self.tokens_path)
+        report = sync(["00u1", "00u2", "nobody", "broken"] + [f"00u{index}" for index in range(5, 20)], vault, self.store, workers=4)
+
+        self.assertEqual(vault.peak, 4)
+        self.assertEqual(report.outcomes["nobody"], "missing")
+        self.assertEqual(report.outcomes["broken"], "failed")
+        self.assertEqual(report.errors, {"broken": "vault unavailable"})
+        self.assertEqual(report.counts()["created"], 17)
+
+    def test_dry_run_writes_nothing(self):
+        report = sync(["00u1"], FileVault(self.tokens_path), self.store, dry_run=True)
+        self.assertEqual(report.outcomes, {"00u1": "created"})
+        self.assertIsNone(self.store.stored_hash("00u1"))
+
+    def test_cli_backends_commands(self):
+        op = FakeOp({"buildkite-00u2": token_hash("t-00u2"), "buildkite-00u3": "stale"})
+        report = sync(["00u1", "00u2", "00u3"], VaultCLI(run=op), OnePasswordCLI(vault="Engineering", run=op), workers=1)
+
+        self.assertEqual(report.outcomes, {"00u1": "created", "00u2": "unchanged", "00u3": "updated"})
+        writes = [call for call in op.calls if call[2] in ("create", "edit")]
+        self.assertEqual(sorted(call[2] for call in writes), ["create", "edit"])
+        self.assertIn("--title=buildkite-00u1", writes[0] if writes[0][2] == "create" else writes[1])
+        self.assertTrue(all(call[-2:] == ["--vault", "Engineering"] for call in op.calls if call[1] == "item"))
+        self.assertIn(["op", "plugin", "run", "hashicorp-vault", "read", "-field=data", "secret/data/buildkite/00u1"], op.calls)
+
+    def test_cli_errors_other_than_not_found_fail_the_user(self):
+        op = FakeOp(errors={
+            "secret/data/buildkite/00u1": "Error reading secret/data/buildkite/00u1: Code: 403. permission denied",
+            "buildkite-00u2": "[ERROR] couldn't connect to the 1Password app",
+            "secret/data/buildkite/00u3": "No value found at secret/data/buildkite/00u3",
+        })
+        report = sync(["00u1", "00u2", "00u3"], VaultCLI(run=op), OnePasswordCLI(run=op), workers=1)
+
+        self.assertEqual(report.outcomes, {"00u1": "failed", "00u2": "failed", "00u3": "missing"})
+        self.assertIn("permission denied", report.errors["00u1"])
+        self.assertFalse([call for call in op.calls if call[2:3] == ["create"]])
+
+    def test_main_reads_ids_file(self):
+        ids_path = os.path.join(self._tmp.name, "ids.txt")
+        with open(ids_path, "w") as fh:
+            fh.write("# engineering\n00u1\n00u2\n\n")
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = main(["--vault-file", self.tokens_path, "--store-dir", self.store.directory, "--ids-file", ids_path])
+        self.assertEqual(status, 0)
+        self.assertEqual(json.loads(output.getvalue())["counts"], {"created": 2})
+        self.assertEqual(sorted(os.listdir(self.store.directory)), ["buildkite-00u1.json", "buildkite-00u2.json"])
+
+    @unittest.skipUnless(HAS_OKTA, "okta SDK not installed")
+    def test_okta_flag_runs_from_any_working_directory(self):
+        write_okta_cache(self._tmp.name, [
+            SimpleNamespace(id="00u1", status="ACTIVE"),
+            SimpleNamespace(id="00u2", status="SUSPENDED"),
+        ])
+        result = run_script(
+            "vault_sync.py", "--okta", "--vault-file", self.tokens_path, "--store-dir", self.store.directory, cwd=self._tmp.name,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout)["counts"], {"created": 1})
+        self.assertEqual(os.listdir(self.store.directory), ["buildkite-00u1.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""Renew short-lived Buildkite tokens shortly before they expire, with jitter.
+
+Running ``vault_sync.sh`` from cron renews every token at the same instant.
+This scheduler keeps each token's expiry in a min-heap keyed by when it
+should next be renewed: a random lead of ``--min-lead`` to ``--max-lead``
+seconds before expiry, and never before half of a short lease has passed.
+Renewals of tokens issued together are therefore spread across that
+window, and no token is renewed before it is within ``--max-lead`` of
+expiring. At most ``--concurrency`` renewals run at once.
+The schedule is saved after every renewal and reloaded on restart, so a
+restart neither renews everything again nor forgets what is due.
+
+    python scripts/token_renewer.py --state renewals.json 00u1abcd 00u2efgh
+    python scripts/token_renewer.py --state renewals.json --okta --concurrency 8
+
+Users with no saved expiry have their current lease looked up first, and
+are only renewed once that lease is close to expiring (or when they have
+none).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Protocol, Sequence, Tuple
+
+# vault_sync.py sits next to this script; make it importable however we are run.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from vault_sync import (  # noqa: E402
+    ItemStore,
+    OnePasswordCLI,
+    Runner,
+    is_not_found,
+    okta_user_ids,
+    read_ids,
+    run_command,
+    token_hash,
+)
+
+# Vault path that issues a fresh token for a user, with a lease.
+RENEW_PATH = "buildkite/creds/{user_id}"
+DEFAULT_MIN_LEAD = 60.0
+DEFAULT_MAX_LEAD = 300.0
+DEFAULT_CONCURRENCY = 4
+# First retry delay after a failed renewal; doubles per consecutive failure.
+RETRY_DELAY = 5.0
+# Never renew before this share of a lease has passed, however short the lease.
+MIN_LEASE_FRACTION = 0.5
+
+VAULT = ["op", "plugin", "run", "hashicorp-vault"]
+
+logger = logging.getLogger("token_renewer")
+
+
+class Renewer(Protocol):
+    async def lookup(self, user_id: str) -> Optional[float]:
+        """When the user's current token expires (epoch seconds), or None when they have none."""
+
+    async def renew(self, user_id: str) -> float:
+        """Renew the user's token and return when the new one expires (epoch seconds)."""
+
+
+class VaultRenewer:
+    """Issues a new token from Vault through the 1Password shell plugin and stores it in 1Password.
+
+    The item is only rewritten when the token changed, as in ``vault_sync.py``.
+    """
+
+    def __init__(self, store: ItemStore, path: str = RENEW_PATH, run: Runner = run_command):
+        self.store = store
+        self.path = path
+        self.run = run
+
+    def _lookup(self, user_id: str) -> Optional[float]:
+        prefix = self.path.format(user_id=user_id)
+        try:
+            leases = json.loads(self.run(VAULT + ["list", "-format=json", f"sys/leases/lookup/{prefix}"]))
+        except subprocess.CalledProcessError as exc:
+            if is_not_found(exc):
+                return None
+            raise
+        ttls = [
+            json.loads(self.run(VAULT + ["lease", "lookup", "-format=json", f"{prefix}/{lease}"]))["data"]["ttl"]
+            for lease in leases or ()
+        ]
+        return time.time() + max(ttls) if ttls else None
+
+    async def lookup(self, user_id: str) -> Optional[float]:
+        return await asyncio.to_thread(self._lookup, user_id)
+
+    def _renew(self, user_id: str) -> float:
+        argv = VAULT + ["read", "-format=json", self.path.format(user_id=user_id)]
+        secret = json.loads(self.run(argv))
+        token, digest = secret["data"]["token"], token_hash(secret["data"]["token"])
+        stored = self.store.stored_hash(user_id)
+        if stored != digest:
+            self.store.write(user_id, token, digest, exists=stored is not None)
+        return time.time() + float(secret["lease_duration"])
+
+    async def renew(self, user_id: str) -> float:
+        return await asyncio.to_thread(self._renew, user_id)
+
+
+@dataclass
+class TokenState:
+    """When a user's token expires and when it is next due for renewal (epoch seconds).
+
+    ``expires_at`` is None until the token's lease has been looked up.
+    """
+
+    expires_at: Optional[float]
+    renew_at: float
+    failures: int = 0
+
+
+class RenewalScheduler:
+    """Min-heap of ``(renew_at, user_id)`` drained by :meth:`run`.
+
+    The heap may hold stale entries for a rescheduled user; only the one
+    matching ``tokens[user_id].renew_at`` is acted on.
+    """
+
+    def __init__(
+        self,
+        renewer: Renewer,
+        state_path: Optional[str] = None,
+        min_lead: float = DEFAULT_MIN_LEAD,
+        max_lead: float = DEFAULT_MAX_LEAD,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        retry_delay: float = RETRY_DELAY,
+        clock: Callable[[], float] = time.time,
+        rng: Optional[random.Random] = None,
+    ):
+        if not 0 <= min_lead <= max_lead:
+            raise ValueError("need 0 <= min_lead <= max_lead")
+        self.renewer = renewer
+        self.state_path = state_path
+        self.min_lead = min_lead
+        self.max_lead = max_lead
+        self.concurrency = max(1, concurrency)
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.tokens: Dict[str, TokenState] = {}
+        self.renewed = 0
+        self._heap: List[Tuple[float, str]] = []
+        self._changed = asyncio.Event()
+        if state_path and os.path.exists(state_path):
+            self.load(state_path)
+
+    def renew_time(self, expires_at: float) -> float:
+        """A uniformly jittered time between ``max_lead`` and ``min_lead`` before ``expires_at``.
+
+        A lease shorter than the leads would put that in the past and renew
+        the token again straight away, so renewal waits for at least
+        ``MIN_LEASE_FRACTION`` of what is left of the lease.
+        """
+        now = self.clock()
+        earliest = now + MIN_LEASE_FRACTION * max(0.0, expires_at - now)
+        return max(expires_at - self.rng.uniform(self.min_lead, self.max_lead), earliest)
+
+    def _schedule(self, user_id: str, state: TokenState) -> None:
+        self.tokens[user_id] = state
+        heapq.heappush(self._heap, (state.renew_at, user_id))
+        self._changed.set()
+
+    def add(self, user_id: str, expires_at: Optional[float] = None) -> None:
+        """Track a user; without a known expiry its lease is looked up as soon as :meth:`run` can.
+
+        Users already tracked keep their schedule.
+        """
+        if user_id in self.tokens:
+            return
+        renew_at = self.clock() if expires_at is None else self.renew_time(expires_at)
+        self._schedule(user_id, TokenState(expires_at, renew_at))
+
+    def remove(self, user_id: str) -> None:
+        self.tokens.pop(user_id, None)
+
+    def _pop_due(self) -> Tuple[Optional[str], Optional[float]]:
+        """The next due user, or None and the seconds until one is due (None for never)."""
+        while self._heap:
+            renew_at, user_id = self._heap[0]
+            state = self.tokens.get(user_id)
+            if state is None or state.renew_at != renew_at:
+                heapq.heappop(self._heap)  # stale: rescheduled or removed
+                continue
+            delay = renew_at - self.clock()
+            if delay > 0:
+                return None, delay
+            heapq.heappop(self._heap)
+            return user_id, None
+        return None, None
+
+    async def _renew(self, user_id: str, slots: asyncio.Semaphore) -> None:
+        try:
+            state = self.tokens.get(user_id)
+            if state is None:  # removed while queued
+                return
+            try:
+                # An unknown expiry is looked up first; the token is only renewed if that lease is due.
+                expires_at = await self.renewer.lookup(user_id) if state.expires_at is None else None
+                renew_at = self.renew_time(expires_at) if expires_at is not None else None
+                renewed = renew_at is None or renew_at <= self.clock()
+                if renewed:
+                    expires_at = await self.renewer.renew(user_id)
+                    renew_at = self.renew_time(expires_at)
+            except Exception as exc:  # one user's failure mustn't stop the others
+                state = self.tokens.get(user_id)
+                if state is None:
+                    return
+                state.failures += 1
+                # Back off, but never past max_lead, so a token still gets retried before it lapses.
+                delay = min(self.retry_delay * 2 ** (state.failures - 1), max(self.retry_delay, self.max_lead))
+                retry_at = self.clock() + self.rng.uniform(0.5, 1.0) * delay
+                logger.warning("renewing %s failed (%s); retrying in %.0fs", user_id, exc, retry_at - self.clock())
+                self._schedule(user_id, TokenState(state.expires_at, retry_at, state.failures))
+            else:
+                if user_id not in self.tokens:
+                    return
+                self.renewed += renewed
+                self._schedule(user_id, TokenState(expires_at, renew_at))
+            if self.state_path:
+                self.save(self.state_path)
+        finally:
+            slots.release()
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        """Renew tokens as they fall due until ``stop`` is set, then wait for renewals in flight."""
+        stop = stop or asyncio.Event()
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        stopping = asyncio.ensure_future(stop.wait())
+        try:
+            while not stop.is_set():
+                user_id, delay = self._pop_due()
+                if user_id is None:
+                    # Sleep until the next renewal is due, something is scheduled, or we're stopped.
+                    self._changed.clear()
+                    changed = asyncio.ensure_future(self._changed.wait())
+                    await asyncio.wait({changed, stopping}, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                    changed.cancel()
+                    continue
+                await slots.acquire()
+                task = asyncio.ensure_future(self._renew(user_id, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            stopping.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def save(self, path: str) -> None:
+        with open(path + ".tmp", "w") as fh:
+            json.dump({user_id: asdict(state) for user_id, state in self.tokens.items()}, fh, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def load(self, path: str) -> None:
+        """Restore a saved schedule, keeping each token's renewal time."""
+        with open(path) as fh:
+            saved = json.load(fh)
+        for user_id, state in saved.items():
+            self._schedule(user_id, TokenState(**state))
+
+
+async def serve(scheduler: RenewalScheduler, user_ids: Iterable[str]) -> None:
+    for user_id in user_ids:
+        scheduler.add(user_id)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    await scheduler.run(stop)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("user_ids", nargs="*", metavar="OKTA_USER_ID")
+    parser.add_argument("--ids-file", metavar="FILE", help="read user IDs, one per line, from FILE ('-' for stdin)")
+    parser.add_argument("--okta", action="store_true", help="renew tokens of every active user in the Okta cache")
+    parser.add_argument("--cache-dir", default=".", help="Okta cache directory for --okta")
+    parser.add_argument("--state", required=True, metavar="FILE", help="where to keep the schedule across restarts")
+    parser.add_argument("--min-lead", type=float, default=DEFAULT_MIN_LEAD, help="renew at least this many seconds before expiry (default: %(default)s)")
+    parser.add_argument("--max-lead", type=float, default=DEFAULT_MAX_LEAD, help="renew at most this many seconds before expiry (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="renewals in flight at once (default: %(default)s)")
+    parser.add_argument("--renew-path", default=RENEW_PATH, help="Vault path that issues a user's token (default: %(default)s)")
+    parser.add_argument("--op-vault", metavar="NAME", help="1Password vault to keep the items in")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    user_ids = list(args.user_ids)
+    if args.ids_file:
+        user_ids += read_ids(args.ids_file)
+    if args.okta:
+        user_ids += okta_user_ids(args.cache_dir)
+
+    renewer = VaultRenewer(OnePasswordCLI(vault=args.op_vault), args.renew_path)
+    scheduler = RenewalScheduler(renewer, args.state, args.min_lead, args.max_lead, args.concurrency)
+    if not user_ids and not scheduler.tokens:
+        build_parser().error("no user IDs given (pass them as arguments, --ids-file or --okta)")
+    asyncio.run(serve(scheduler, user_ids))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
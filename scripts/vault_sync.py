@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""Synchronise Buildkite tokens from HashiCorp Vault into 1Password for many users.
+
+The batch counterpart of ``vault_sync.sh``: it takes a list of Okta user
+IDs, reads and writes through a bounded pool of workers, and only writes a
+1Password item when the token's SHA-256 differs from the one recorded on
+the item. Vault and 1Password are reached through backends, so the same
+sync runs against the ``op`` CLI, Vault's HTTP API, or local files:
+
+    python scripts/vault_sync.py 00u1abcd 00u2efgh
+    python scripts/vault_sync.py --ids-file users.txt --workers 16
+    python scripts/vault_sync.py --okta            # every active Okta user
+    python scripts/vault_sync.py --vault-file tokens.json --store-dir items/ 00u1abcd
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Protocol, Sequence
+
+VAULT_PATH = "secret/data/buildkite/{user_id}"
+ITEM_TITLE = "buildkite-{user_id}"
+TOKEN_FIELD = "BK_TOKEN"
+# Text field on each item holding the SHA-256 of the token it was last written with.
+HASH_FIELD = "token_sha256"
+DEFAULT_WORKERS = 8
+# The checkout holding okta_flowcharting, which the scripts import without it being installed.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs a command and returns its stdout; raises CalledProcessError on failure.
+Runner = Callable[[Sequence[str]], str]
+
+
+def run_command(argv: Sequence[str]) -> str:
+    return subprocess.run(argv, check=True, capture_output=True, text=True).stdout
+
+
+# What ``vault`` and ``op`` print when the secret or item doesn't exist.
+NOT_FOUND_MESSAGES = ("No value found at", "Code: 404", "isn't an item")
+
+
+def is_not_found(exc: subprocess.CalledProcessError) -> bool:
+    """True when a failed ``vault``/``op`` command failed only because its target doesn't exist.
+
+    Anything else - no permission, expired login, network trouble - is a real failure.
+    """
+    output = f"{exc.stderr or ''}\n{exc.output or ''}"
+    return any(message in output for message in NOT_FOUND_MESSAGES)
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenSource(Protocol):
+    """Where tokens are read from (Vault)."""
+
+    def read_token(self, user_id: str) -> Optional[str]:
+        """The user's token, or None when they have none."""
+
+
+class ItemStore(Protocol):
+    """Where tokens are written to (1Password)."""
+
+    def stored_hash(self, user_id: str) -> Optional[str]:
+        """The token hash recorded on the user's item, "" if it has none, or None for no item."""
+
+    def write(self, user_id: str, token: str, digest: str, exists: bool) -> None:
+        """Create (or, if ``exists``, update) the user's item with ``token`` and its ``digest``."""
+
+
+class VaultCLI:
+    """Reads tokens with ``vault read`` through the 1Password shell plugin, as ``vault_sync.sh`` does."""
+
+    def __init__(self, path: str = VAULT_PATH, run: Runner = run_command):
+        self.path = path
+        self.run = run
+
+    def read_token(self, user_id: str) -> Optional[str]:
+        argv = ["op", "plugin", "run", "hashicorp-vault", "read", "-field=data", self.path.format(user_id=user_id)]
+        try:
+            output = self.run(argv)
+        except subprocess.CalledProcessError as exc:
+            if is_not_found(exc):
+                return None
+            raise
+        return json.loads(output)["data"].get("token")
+
+
+class VaultHTTP:
+    """Reads tokens from Vault's KV v2 HTTP API with ``VAULT_ADDR`` and ``VAULT_TOKEN``; no processes."""
+
+    def __init__(self, address: str, token: str, path: str = VAULT_PATH, timeout: float = 10.0):
+        self.address = address.rstrip("/")
+        self.token = token
+        self.path = path
+        self.timeout = timeout
+
+    def read_token(self, user_id: str) -> Optional[str]:
+        request = urllib.request.Request(
+            f"{self.address}/v1/{self.path.format(user_id=user_id)}",
+            headers={"X-Vault-Token": self.token},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)["data"]["data"].get("token")
+        except urllib.error.HTTPError as exc:
+            if exc.code == 404:
+                return None
+            raise
+
+
+class FileVault:
+    """Stand-in for Vault: a JSON file mapping user IDs to tokens."""
+
+    def __init__(self, path: str):
+        with open(path) as fh:
+            self.tokens: Dict[str, str] = json.load(fh)
+
+    def read_token(self, user_id: str) -> Optional[str]:
+        return self.tokens.get(user_id)
+
+
+class OnePasswordCLI:
+    """Stores tokens as 1Password credential items with the ``op`` CLI."""
+
+    def __init__(self, title: str = ITEM_TITLE, vault: Optional[str] = None, run: Runner = run_command):
+        self.title = title
+        self.vault = vault
+        self.run = run
+
+    def _argv(self, *args: str) -> List[str]:
+        return ["op", "item", *args] + (["--vault", self.vault] if self.vault else [])
+
+    def stored_hash(self, user_id: str) -> Optional[str]:
+        try:
+            output = self.run(self._argv("get", self.title.format(user_id=user_id), "--format", "json"))
+        except subprocess.CalledProcessError as exc:
+            # Only a missing item may be created; guessing on other errors would duplicate it.
+            if is_not_found(exc):
+                return None
+            raise
+        for item_field in json.loads(output).get("fields", []):
+            if item_field.get("label") == HASH_FIELD:
+                return item_field.get("value") or ""
+        return ""
+
+    def write(self, user_id: str, token: str, digest: str, exists: bool) -> None:
+        title = self.title.format(user_id=user_id)
+        assignments = [f"{TOKEN_FIELD}={token}", f"{HASH_FIELD}[text]={digest}"]
+        if exists:
+            self.run(self._argv("edit", title, *assignments))
+        else:
+            self.run(self._argv("create", "--category=credential", f"--title={title}", *assignments))
+
+
+class FileStore:
+    """Stand-in for 1Password: one JSON file per item in ``directory``."""
+
+    def __init__(self, directory: str, title: str = ITEM_TITLE):
+        self.directory = directory
+        self.title = title
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.directory, self.title.format(user_id=user_id) + ".json")
+
+    def stored_hash(self, user_id: str) -> Optional[str]:
+        try:
+            with open(self._path(user_id)) as fh:
+                return json.load(fh).get(HASH_FIELD, "")
+        except FileNotFoundError:
+            return None
+
+    def write(self, user_id: str, token: str, digest: str, exists: bool) -> None:
+        path = self._path(user_id)
+        with open(path + ".tmp", "w") as fh:
+            json.dump({"title": self.title.format(user_id=user_id), TOKEN_FIELD: token, HASH_FIELD: digest}, fh)
+        os.replace(path + ".tmp", path)
+
+
+@dataclass
+class SyncReport:
+    """What happened to each user: ``created``, ``updated``, ``unchanged``, ``missing`` or ``failed``."""
+
+    outcomes: Dict[str, str] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def counts(self) -> Dict[str, int]:
+        return dict(Counter(self.outcomes.values()))
+
+    def to_dict(self) -> dict:
+        return {"counts": self.counts(), "errors": self.errors}
+
+
+def sync_user(user_id: str, vault: TokenSource, store: ItemStore, dry_run: bool = False) -> str:
+    token = vault.read_token(user_id)
+    if not token:
+        return "missing"
+    digest = token_hash(token)
+    stored = store.stored_hash(user_id)
+    if stored == digest:
+        return "unchanged"
+    if not dry_run:
+        store.write(user_id, token, digest, exists=stored is not None)
+    return "created" if stored is None else "updated"
+
+
+def sync(user_ids: Iterable[str], vault: TokenSource, store: ItemStore, workers: int = DEFAULT_WORKERS, dry_run: bool = False) -> SyncReport:
+    """Sync every user's token with at most ``workers`` reads or writes in flight.
+
+    A failure for one user is recorded in the report and doesn't stop the others.
+    """
+    report = SyncReport()
+    lock = threading.Lock()
+
+    def run(user_id: str) -> None:
+        try:
+            outcome, error = sync_user(user_id, vault, store, dry_run), None
+        except subprocess.CalledProcessError as exc:
+            outcome, error = "failed", (exc.stderr or "").strip() or str(exc)
+        except Exception as exc:  # one user's failure shouldn't abort the batch
+            outcome, error = "failed", str(exc) or type(exc).__name__
+        with lock:
+            report.outcomes[user_id] = outcome
+            if error is not None:
+                report.errors[user_id] = error
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        list(pool.map(run, dict.fromkeys(user_ids)))
+    return report
+
+
+def okta_user_ids(cache_dir: str = ".") -> List[str]:
+    """IDs of every active user in the Okta cache, fetching it if needed."""
+    import asyncio
+
+    # Run as ``python scripts/vault_sync.py`` only scripts/ is on the path.
+    if REPO_ROOT not in sys.path:
+        sys.path.append(REPO_ROOT)
+    from okta_flowcharting.cli import okta_session
+
+    async def load() -> List[str]:
+        async with okta_session(cache_dir) as cache:
+            users = await cache.get_users()
+            return [user_id for user_id, user in users.items() if getattr(user, "status", "ACTIVE") == "ACTIVE"]
+
+    return asyncio.run(load())
+
+
+def read_ids(path: str) -> List[str]:
+    fh = sys.stdin if path == "-" else open(path)
+    try:
+        return [line.strip() for line in fh if line.strip() and not line.startswith("#")]
+    finally:
+        if fh is not sys.stdin:
+            fh.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("user_ids", nargs="*", metavar="OKTA_USER_ID")
+    parser.add_argument("--ids-file", metavar="FILE", help="read user IDs, one per line, from FILE ('-' for stdin)")
+    parser.add_argument("--okta", action="store_true", help="sync every active user in the Okta cache")
+    parser.add_argument("--cache-dir", default=".", help="Okta cache directory for --okta")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent reads and writes (default: %(default)s)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    parser.add_argument("--vault-path", default=VAULT_PATH, help="Vault path template (default: %(default)s)")
+    parser.add_argument("--vault-http", action="store_true", help="read Vault's HTTP API using VAULT_ADDR and VAULT_TOKEN")
+    parser.add_argument("--vault-file", metavar="FILE", help="read tokens from a JSON file of {user_id: token} instead of Vault")
+    parser.add_argument("--op-vault", metavar="NAME", help="1Password vault to keep the items in")
+    parser.add_argument("--store-dir", metavar="DIR", help="write items as JSON files in DIR instead of 1Password")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    user_ids = list(args.user_ids)
+    if args.ids_file:
+        user_ids += read_ids(args.ids_file)
+    if args.okta:
+        user_ids += okta_user_ids(args.cache_dir)
+    if not user_ids:
+        build_parser().error("no user IDs given (pass them as arguments, --ids-file or --okta)")
+
+    if args.vault_file:
+        vault = FileVault(args.vault_file)
+    elif args.vault_http:
+        vault = VaultHTTP(os.environ["VAULT_ADDR"], os.environ["VAULT_TOKEN"], args.vault_path)
+    else:
+        vault = VaultCLI(args.vault_path)
+    store = FileStore(args.store_dir) if args.store_dir else OnePasswordCLI(vault=args.op_vault)
+
+    report = sync(user_ids, vault, store, args.workers, args.dry_run)
+    json.dump(report.to_dict(), sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 1 if report.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())